@@ -1,9 +1,66 @@
 #!/usr/bin/env python3
 import os
+import re
 import sys
 import pandas as pd
 from tkinter import Tk, filedialog, messagebox
 
+EXCEL_MAX_ROWS = 1048576  # Excel's row limit, including the header row
+
+# _excel_sheet_name and write_xlsx_streaming are kept identical to the copies in
+# Windows/digital_asset_metadata_sheet_generator_windows.py; each script ships on its own
+def _excel_sheet_name(label, used):
+    """Valid, unique sheet name (max 31 chars, no []:*?/\\)."""
+    clean = re.sub(r"[\[\]:*?/\\]", "_", str(label)).strip("'")[:31] or "Sheet"
+    name, n = clean, 2
+    while name.lower() in used:
+        suffix = f" ({n})"
+        name = clean[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(name.lower())
+    return name
+
+def write_xlsx_streaming(path, df, split_column=None, max_rows=EXCEL_MAX_ROWS, sheet="inventory"):
+    """Write df to an .xlsx file row by row without building the workbook in memory.
+
+    With split_column, each value gets its own sheet, otherwise everything goes
+    on sheet; any sheet that reaches max_rows continues on a new sheet.
+    Returns the sheet names written.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def cell(v):
+        if v is None or (not isinstance(v, str) and pd.isna(v)):
+            return None
+        return ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v
+
+    if split_column in df.columns and df[split_column].nunique(dropna=False) > 1:
+        groups = [
+            ("(blank)" if pd.isna(key) else key, group)
+            for key, group in df.groupby(split_column, sort=True, dropna=False)
+        ]
+    else:
+        groups = [(sheet, df)]
+
+    wb = Workbook(write_only=True)
+    header = [str(c) for c in df.columns]
+    used, sheet_names = set(), []
+    for label, group in groups:
+        ws = None
+        for i, row in enumerate(group.itertuples(index=False, name=None)):
+            if i % (max_rows - 1) == 0:
+                ws = wb.create_sheet(_excel_sheet_name(label, used))
+                sheet_names.append(ws.title)
+                ws.append(header)
+            ws.append([cell(v) for v in row])
+        if ws is None:
+            ws = wb.create_sheet(_excel_sheet_name(label, used))
+            sheet_names.append(ws.title)
+            ws.append(header)
+    wb.save(path)
+    return sheet_names
+
 # Create the root window
 root = Tk()
 root.withdraw()  # Hide the main window
@@ -59,7 +116,7 @@ if not data:
 df = pd.DataFrame(data)
 output_path = os.path.join(main_folder, "tiff_files_list.xlsx")
 try:
-    df.to_excel(output_path, index=False)
+    write_xlsx_streaming(output_path, df, sheet="TIFF files")
     messagebox.showinfo("Success", f"Excel file created successfully!\n\n{output_path}")
 except Exception as e:
     messagebox.showerror("Error", f"Could not save Excel file:\n{e}")
@@ -0,0 +1,1188 @@
+#!/usr/bin/env python3
+"""Helpers of the Digital Asset Metadata Sheet Generator that need no window.
+
+digital_asset_metadata_sheet_generator_windows.py imports them from here, so
+keep this file next to it; the tests in tests/ import them directly.
+"""
+import os
+import re
+import csv
+import json
+import time
+import hashlib
+import mmap
+import platform
+import subprocess
+import sqlite3
+import argparse
+import threading
+import functools
+import heapq
+import itertools
+import operator
+from datetime import datetime
+from collections import Counter, OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# ==================================================
+# System files to ignore during scanning
+# ==================================================
+SYSTEM_FILES = (
+    "thumbs.db",
+    "desktop.ini",
+    ".ds_store",
+    ".spotlight-v100",
+    ".trashes"
+)
+
+# ==================================================
+# DAMSG_output subfolder for run state (change-feed, indexes, cursors)
+# ==================================================
+STATE_FOLDER = "state"
+
+# ==================================================
+# Hashing engine — read strategy picked per file
+# sequential:   readinto() a reused buffer (small files, unknown storage)
+# file_digest:  hashlib.file_digest (single algorithm only)
+# mmap:         memory-mapped, for large files on local disks
+# large_buffer: large page-aligned buffer, for SMB/NFS shares
+# ==================================================
+HASH_STRATEGIES = ("sequential", "file_digest", "mmap", "large_buffer")
+HASH_SEQUENTIAL_BUFFER = 1024 * 1024      # 1 MiB
+HASH_NETWORK_BUFFER = 8 * 1024 * 1024     # 8 MiB, fewer round trips on SMB
+HASH_MMAP_SLICE = 16 * 1024 * 1024        # mmap is hashed in slices of this size
+HASH_MMAP_MIN_SIZE = 4 * 1024 * 1024      # Smaller local files use sequential reads
+NETWORK_FS_TYPES = ("cifs", "smbfs", "smb2", "smb3", "nfs", "nfs4", "afpfs", "webdav", "davfs", "fuse.sshfs")
+
+_hash_buffers = threading.local()
+_network_dev_cache = {}
+_mount_table = []
+
+def _hash_buffer(kind, size):
+    """Per-thread buffer reused across files, so allocation never grows with file size."""
+    key = (kind, size)
+    buffers = getattr(_hash_buffers, "buffers", None)
+    if buffers is None:
+        buffers = _hash_buffers.buffers = {}
+    if key not in buffers:
+        # Anonymous mmap is page-aligned; bytearray is enough for small buffers
+        buffers[key] = mmap.mmap(-1, size) if kind == "large_buffer" else bytearray(size)
+    return buffers[key]
+
+def _mount_fs_types():
+    """(mount point, filesystem type) pairs on POSIX, longest mount point first."""
+    if not _mount_table:
+        table = []
+        try:
+            if os.path.exists("/proc/mounts"):
+                with open("/proc/mounts", "r", encoding="utf-8", errors="replace") as f:
+                    for line in f:
+                        parts = line.split()
+                        if len(parts) >= 3:
+                            table.append((parts[1].replace("\\040", " "), parts[2]))
+            else:
+                out = subprocess.run(["mount"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True).stdout
+                for line in out.splitlines():
+                    m = re.match(r"^.+? on (.+) \(([^,)]+)", line)
+                    if m:
+                        table.append((m.group(1), m.group(2)))
+        except Exception:
+            pass
+        _mount_table.extend(sorted(table, key=lambda t: len(t[0]), reverse=True) or [("/", "")])
+    return _mount_table
+
+def is_network_path(path, st_dev=None):
+    """True if path lives on a network share (UNC/mapped drive, SMB/NFS/AFP mount)."""
+    if st_dev is not None and st_dev in _network_dev_cache:
+        return _network_dev_cache[st_dev]
+    full = os.path.abspath(path)
+    result = False
+    if platform.system() == "Windows":
+        drive = os.path.splitdrive(full)[0]
+        if drive.startswith("\\\\"):
+            result = True
+        else:
+            try:
+                import ctypes
+                result = ctypes.windll.kernel32.GetDriveTypeW(drive + "\\") == 4  # DRIVE_REMOTE
+            except Exception:
+                result = False
+    else:
+        real = os.path.realpath(full)
+        for mount_point, fs_type in _mount_fs_types():
+            if real == mount_point or real.startswith(mount_point.rstrip("/") + "/"):
+                result = fs_type.lower() in NETWORK_FS_TYPES
+                break
+    if st_dev is not None:
+        _network_dev_cache[st_dev] = result
+    return result
+
+def choose_hash_strategy(path, st):
+    if st.st_size < HASH_MMAP_MIN_SIZE:
+        return "sequential"
+    if is_network_path(path, st.st_dev):
+        return "large_buffer"
+    return "mmap"
+
+def hash_file(file_path, hashers, strategy=None, block_size=None, header_probe=None):
+    """Feed the bytes of file_path to every hasher in one read.
+
+    strategy is one of HASH_STRATEGIES, or None to choose per file.
+    header_probe, if given, is called with a HeaderReader on the still-open
+    file once hashing is done; its first bytes come from the hashing read.
+    Returns the strategy actually used.
+    """
+    with open(file_path, "rb", buffering=0) as f:
+        st = os.fstat(f.fileno())
+        if strategy is None:
+            strategy = choose_hash_strategy(file_path, st)
+        strategy, head = _hash_open_file(f, st, hashers, strategy, block_size)
+        if header_probe is not None:
+            header_probe(HeaderReader(f, st.st_size, head))
+        return strategy
+
+def _hash_open_file(f, st, hashers, strategy, block_size):
+    """Hash an open file; returns (strategy used, first HEADER_PROBE_BYTES read or b"")."""
+    if strategy == "file_digest" and len(hashers) == 1 and hasattr(hashlib, "file_digest"):
+        hashlib.file_digest(f, lambda: hashers[0])
+        return strategy, b""
+
+    if strategy == "mmap" and st.st_size > 0:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            strategy = "sequential"
+        else:
+            with m, memoryview(m) as view:
+                if hasattr(m, "madvise") and hasattr(mmap, "MADV_SEQUENTIAL"):
+                    m.madvise(mmap.MADV_SEQUENTIAL)
+                head = bytes(view[:HEADER_PROBE_BYTES])
+                for offset in range(0, len(view), HASH_MMAP_SLICE):
+                    chunk = view[offset:offset + HASH_MMAP_SLICE]
+                    for h in hashers:
+                        h.update(chunk)
+                    chunk.release()
+            return strategy, head
+
+    if strategy == "large_buffer":
+        buf = _hash_buffer("large_buffer", block_size or HASH_NETWORK_BUFFER)
+    else:
+        strategy = "sequential"
+        buf = _hash_buffer("sequential", block_size or HASH_SEQUENTIAL_BUFFER)
+    head = None
+    with memoryview(buf) as view:
+        while True:
+            n = f.readinto(view)
+            if not n:
+                break
+            if head is None:
+                head = bytes(view[:min(n, HEADER_PROBE_BYTES)])
+            for h in hashers:
+                h.update(view[:n])
+    return strategy, head or b""
+
+HEADER_PROBE_BYTES = 64 * 1024   # Bytes of each file handed to header_probe from the hashing read
+
+class HeaderReader:
+    """Random-access reads of an open file's header structures.
+
+    Reads inside head (bytes already read while hashing) cost nothing; the
+    rest seek and read the open file, which is in the page cache by then.
+    """
+
+    def __init__(self, f, size, head=b""):
+        self.f, self.size, self.head = f, size, head
+
+    def read(self, offset, n):
+        if offset < 0 or n <= 0 or offset >= self.size:
+            return b""
+        if offset + n <= len(self.head):
+            return self.head[offset:offset + n]
+        self.f.seek(offset)
+        return self.f.read(min(n, self.size - offset))
+
+# ==================================================
+# Filename parsing — structure, view, and suffix codes (Legacy, remove eventually)
+# ==================================================
+
+# Overrides for specific well-known codes (preserves existing descriptions)
+# VIEW_CODE_MAP = {
+#     "cd":    "Dorsal view of specimen cranium",
+#     "cv":    "Ventral view of specimen cranium",
+#     "mrl":   "Right lateral view of specimen mandible",
+#     "sd":    "Dorsal view of specimen skin",
+#     "mo":    "Occlusional view of specimen mandible",
+#     "cll":   "Left lateral view of specimen cranium",
+#     "sv":    "Ventral view of specimen skin",
+#     "crl":   "Right lateral view of specimen cranium",
+#     "mll":   "Left lateral view of specimen mandible",
+#     "label": "Close-up view of specimen label",
+# }
+VIEW_CODE_MAP = {}  # Replaced by parse_filename_description()
+
+STRUCTURE_NAMES = {
+    "H": "head",
+    "S": "skin",
+    "L": "skull",
+    "C": "cranium",
+    "M": "mandible",
+    "P": "postcranium",
+    "B": "long bones",
+    "K": "skeleton",
+    "W": "whole specimen",
+}
+
+VIEW_NAMES = {
+    "L": "lateral",
+    "D": "dorsal",
+    "V": "ventral",
+    "O": "occlusional",
+    "C": "occipital",
+    "A": "anterior",
+    "P": "posterior",
+    "S": "distal",
+    "M": "medial",
+}
+
+VIEW_STEMS = {
+    "D": "dorso", "V": "ventro", "A": "antero", "P": "postero",
+    "M": "medio",  "L": "latero", "C": "occipito", "S": "disto",
+}
+
+SIDE_NAMES = {"L": "left", "R": "right"}
+
+
+def _decode_view(view_chars):
+    v = view_chars.upper()
+    if not v or v == "U":
+        return ""
+    if len(v) == 1:
+        return VIEW_NAMES.get(v, v.lower())
+    if v[0] in SIDE_NAMES:
+        side = SIDE_NAMES[v[0]]
+        rest = v[1:]
+        if len(rest) == 1:
+            direction = VIEW_NAMES.get(rest, rest.lower())
+        else:
+            parts_list = [VIEW_STEMS.get(rest[i], VIEW_NAMES.get(rest[i], rest[i].lower()))
+                          for i in range(len(rest) - 1)]
+            parts_list.append(VIEW_NAMES.get(rest[-1], rest[-1].lower()))
+            direction = "-".join(parts_list)
+        return f"{side} {direction}"
+    else:
+        parts_list = [VIEW_STEMS.get(v[i], VIEW_NAMES.get(v[i], v[i].lower()))
+                      for i in range(len(v) - 1)]
+        parts_list.append(VIEW_NAMES.get(v[-1], v[-1].lower()))
+        return "-".join(parts_list)
+
+
+# SPECIMEN_CODE[_G#][_V#][_S#][_I#] — suffixes in any order, last repeat wins
+FILENAME_GRAMMAR = re.compile(r"\A(?P<specimenCode>[^_]*)_(?P<code>[^_]*)(?P<suffixes>(?:_.*)?)\Z", re.DOTALL)
+SUFFIX_CODE = re.compile(r"([GVSI])(\d+)", re.IGNORECASE)
+SUFFIX_FIELDS = {"G": "group", "V": "view", "S": "section", "I": "image"}
+FILENAME_PARSE_COLUMNS = [
+    "stem", "specimenCode", "structureCode", "viewCode",
+    "group", "view", "section", "image", "description", "parseIssue",
+]
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_code(sv_code):
+    """(description, issue) for one structure/view code such as HLL; decoded once per distinct code."""
+    if sv_code.lower() == "label":
+        return "Close-up view of specimen label", None
+
+    # Check explicit override map first
+    override = VIEW_CODE_MAP.get(sv_code.lower())
+    if override:
+        return override, None
+
+    sv_upper    = sv_code.upper()
+    struct_char = sv_upper[0] if sv_upper else ""
+    view_chars  = sv_upper[1:] if len(sv_upper) > 1 else ""
+
+    struct_name = STRUCTURE_NAMES.get(struct_char, struct_char.lower())
+    view_desc   = _decode_view(view_chars)
+
+    if view_desc:
+        base_desc = f"{view_desc.capitalize()} view of specimen {struct_name}"
+    else:
+        base_desc = f"Unspecified view of specimen {struct_name}"
+
+    issues = []
+    if not struct_char:
+        issues.append("missing structure code")
+    elif struct_char not in STRUCTURE_NAMES:
+        issues.append(f"unknown structure code '{struct_char}'")
+    direction = view_chars[1:] if len(view_chars) > 1 and view_chars[0] in SIDE_NAMES else view_chars
+    unknown = [c for c in direction if c not in VIEW_NAMES] if view_chars != "U" else []
+    if unknown:
+        issues.append(f"unknown view code '{''.join(unknown)}'")
+    return base_desc, "; ".join(issues) or None
+
+
+@functools.lru_cache(maxsize=4096)
+def _decode_suffixes(suffixes):
+    """({G/V/S/I: number}, description, issue) for a suffix tail such as "_G1_V2"."""
+    found, unknown = {}, []
+    for part in suffixes.split("_")[1:]:
+        m = SUFFIX_CODE.fullmatch(part)
+        if m:
+            found[m.group(1).upper()] = int(m.group(2))
+        else:
+            unknown.append(part)
+    desc = ", ".join(f"{SUFFIX_FIELDS[k]} {found[k]}" for k in SUFFIX_FIELDS if k in found)
+    issue = f"unrecognised suffix {', '.join(repr(u) for u in unknown)}" if unknown else None
+    return found, desc, issue
+
+
+def _describe(code, suffixes):
+    """(description, issue) from the code and suffix tail of a parsed stem."""
+    base_desc, code_issue = _decode_code(code)
+    _, suffix_desc, suffix_issue = _decode_suffixes(suffixes)
+    # Label close-ups keep their fixed description whatever the suffixes
+    if suffix_desc and code.lower() != "label":
+        base_desc = f"{base_desc}; {suffix_desc}"
+    return base_desc, "; ".join(i for i in (code_issue, suffix_issue) if i) or None
+
+
+def parse_filename_description(base):
+    """Parse a specimen filename stem into a human-readable description.
+
+    Examples:
+      TM1235_HV       → Ventral view of specimen head
+      TM1235_HLL      → Left lateral view of specimen head
+      TM1235_label    → Close-up view of specimen label
+      TM1234_PU       → Unspecified view of specimen postcranium
+      TM1234_PU_G1_V1 → Unspecified view of specimen postcranium; group 1, view 1
+    """
+    m = FILENAME_GRAMMAR.match(base)
+    if not m:
+        return ""
+    return _describe(m.group("code"), m.group("suffixes"))[0]
+
+
+def parse_filename_batch(stems):
+    """Parse a Series of filename stems; one row per stem with FILENAME_PARSE_COLUMNS.
+
+    Each stem costs one compiled-regex match; each distinct code/suffix
+    combination is decoded once. parseIssue is empty for names that follow
+    the grammar and says what did not for the rest.
+    """
+    stems = pd.Series(stems, dtype="object").fillna("").astype(str)
+    decoded = {}
+    rows = []
+    for stem in stems:
+        m = FILENAME_GRAMMAR.match(stem)
+        if not m:
+            rows.append((stem, "", "", None, None, None, None, "", "no structure/view code"))
+            continue
+        code, suffixes = m.group("code"), m.group("suffixes")
+        key = (code, suffixes)
+        if key not in decoded:
+            fields = _decode_suffixes(suffixes)[0]
+            description, issue = _describe(code, suffixes)
+            code_upper = code.upper() if code.lower() != "label" else ""
+            decoded[key] = (code_upper[:1], code_upper[1:], *(fields.get(k) for k in SUFFIX_FIELDS),
+                            description, issue or "")
+        rows.append((m.group("specimenCode"),) + decoded[key])
+    out = pd.DataFrame(rows, columns=FILENAME_PARSE_COLUMNS[1:], index=stems.index, dtype="object")
+    out.insert(0, "stem", stems)
+    return out
+
+# ==================================================
+# Scan warning log — streamed to CSV during scanning
+# ==================================================
+WARNING_LOG_COLUMNS = ["level", "issueType", "file", "issue"]
+WARNING_DEDUP_WINDOW = 10000   # Recent (level, file, issue) keys remembered for dedup
+WARNING_MAX_ISSUE_TYPES = 500  # Further issue types are counted under "Other"
+WARNING_SAMPLES_PER_TYPE = 5   # Example files kept per issue type for the summary
+WARNING_PENDING_LIMIT = 1000   # Rows held before open(); later ones only reach the counters
+
+
+class ScanWarningLog:
+    """Streaming, bounded-memory replacement for the old scan_warnings list.
+
+    append() takes the same {"level", "file", "issue"} dicts as before (plus an
+    optional "type"). Entries are written to the CSV as they occur, repeated
+    entries are dropped, and only per-issue-type counters and a few sample
+    files are held in memory. Entries logged before open() are buffered, up
+    to WARNING_PENDING_LIMIT rows; the rest only reach the counters and the
+    summary, and the CSV notes how many were left out.
+    """
+
+    def __init__(self):
+        self.path = None
+        self._file = None
+        self._writer = None
+        self._pending = []
+        self._unbuffered = 0   # Rows past WARNING_PENDING_LIMIT before open()
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+        self.total = 0
+        self.duplicates = 0
+        self.summary = {}  # (level, issueType) → {"count", "samples"}
+
+    def open(self, path):
+        """Set the CSV path; the file is created on the first warning.
+
+        Reopening a log that already had a path starts a new log: the previous
+        file is closed and the counters and dedup window are reset.
+        """
+        with self._lock:
+            if self.path is not None:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._recent.clear()
+                self.total = 0
+                self.duplicates = 0
+                self.summary = {}
+            self.path = path
+            pending, self._pending = self._pending, []
+            for entry in pending:
+                self._write(entry)
+            if self._unbuffered:
+                self._write({"level": "WARN", "issueType": "Warnings not logged", "file": "",
+                             "issue": f"{self._unbuffered} earlier warning(s) are counted in the summary only"})
+                self._unbuffered = 0
+
+    def append(self, entry):
+        level = entry.get("level", "WARN")
+        file = entry.get("file", "")
+        issue = entry.get("issue", "")
+        issue_type = entry.get("type") or issue.split(":", 1)[0].strip()
+        key = (level, file, issue)
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                self.duplicates += 1
+                return
+            self._recent[key] = None
+            if len(self._recent) > WARNING_DEDUP_WINDOW:
+                self._recent.popitem(last=False)
+
+            self.total += 1
+            summary_key = (level, issue_type)
+            if summary_key not in self.summary and len(self.summary) >= WARNING_MAX_ISSUE_TYPES:
+                summary_key = (level, "Other")
+            item = self.summary.setdefault(summary_key, {"count": 0, "samples": []})
+            item["count"] += 1
+            if file and len(item["samples"]) < WARNING_SAMPLES_PER_TYPE:
+                item["samples"].append(file)
+
+            row = {"level": level, "issueType": issue_type, "file": file, "issue": issue}
+            if self.path is None:
+                if len(self._pending) < WARNING_PENDING_LIMIT:
+                    self._pending.append(row)
+                else:
+                    self._unbuffered += 1
+            else:
+                self._write(row)
+
+    def _write(self, row):
+        if self._file is None:
+            self._file = open(self.path, "w", newline="", encoding="utf-8")
+            self._writer = csv.DictWriter(self._file, fieldnames=WARNING_LOG_COLUMNS, lineterminator="\n")
+            self._writer.writeheader()
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def write_summary(self, path):
+        rows = [
+            {"level": level, "issueType": issue_type, "count": item["count"], "sampleFiles": "; ".join(item["samples"])}
+            for (level, issue_type), item in sorted(self.summary.items(), key=lambda kv: -kv[1]["count"])
+        ]
+        pd.DataFrame(rows, columns=["level", "issueType", "count", "sampleFiles"]).to_csv(
+            path, index=False, encoding='utf-8', lineterminator='\n'
+        )
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __len__(self):
+        return self.total
+
+
+scan_warnings = ScanWarningLog()
+
+# ==================================================
+# Deterministic documentId generator for image/assets
+# ==================================================
+def document_id_prefix(institution_code, collection_code, base_name):
+    clean_inst = institution_code.replace("_", "").replace(" ", "")
+    clean_collection = collection_code.replace("_", "").replace(" ", "")
+    clean_base = base_name.replace("_", "").replace(" ", "")
+    return f"{clean_inst}{clean_collection}{clean_base}"
+
+def _path_digest(relative_path):
+    return hashlib.sha1(relative_path.replace("\\", "/").encode("utf-8")).hexdigest()
+
+def generate_document_id(institution_code,collection_code, base_name, relative_path, length=8):
+    return document_id_prefix(institution_code, collection_code, base_name) + _path_digest(relative_path)[:length]
+
+# ==================================================
+# Deterministic metadata documentId generator
+# ==================================================
+def metadata_document_id_prefix(institution_code, collection_code, category):
+    clean_inst = institution_code.replace("_", "")
+    clean_collection = collection_code.replace("_", "")
+    clean_category = category.replace("_", "").upper()
+    return f"{clean_inst}{clean_collection}METADATAINVENTORY{clean_category}"
+
+def generate_metadata_document_id(institution_code, collection_code, category, relative_path, length=8):
+    return metadata_document_id_prefix(institution_code, collection_code, category) + _path_digest(relative_path)[:length]
+
+# ==================================================
+# SQLite indexes of the LA master — each records which master file and row
+# count it describes, and is rebuilt when that is no longer the latest
+# ==================================================
+class MasterIndexStore:
+    """Base of the SQLite stores kept in step with the LA master.
+
+    Subclasses pass their table definitions as schema; the index_meta table
+    and the masterFile/rowCount bookkeeping are shared.
+    """
+
+    def __init__(self, path, schema, check_same_thread=True, wal=False):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=check_same_thread)
+        if wal:
+            self.conn.execute("PRAGMA journal_mode=WAL")  # Queries can run while a scan writes
+        self.conn.executescript(schema + """
+            CREATE TABLE IF NOT EXISTS index_meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+
+    def _meta(self, key):
+        row = self.conn.execute("SELECT value FROM index_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, master_name, row_count):
+        """Record the master described; call inside the caller's transaction."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO index_meta (key, value) VALUES (?, ?)",
+            [("masterFile", master_name), ("rowCount", str(row_count)), ("updated", datetime.now().isoformat(timespec="seconds"))],
+        )
+
+    def is_current(self, master_name, row_count):
+        return self._meta("masterFile") == master_name and self._meta("rowCount") == str(row_count)
+
+    def describes(self):
+        """(master file name, row count, last update) the index was built from."""
+        return self._meta("masterFile"), int(self._meta("rowCount") or 0), self._meta("updated")
+
+    def close(self):
+        self.conn.close()
+
+# ==================================================
+# documentId collision index — IDs are the master dedup key, so two paths
+# must never share one
+# ==================================================
+DOCUMENT_ID_INDEX_FILE = "document_ids.sqlite"
+DOCUMENT_ID_HASH_LENGTH = 8   # Hex characters of the path hash in a new ID
+DOCUMENT_ID_EXTEND_STEP = 4   # Extra hex characters per step when an ID is taken
+
+class DocumentIdIndex(MasterIndexStore):
+    """relativePath → documentId for every ID handed out, shared by the scan and output threads.
+
+    A path keeps the ID it was first given. A new path whose ID is already
+    taken gets a longer hash, extended DOCUMENT_ID_EXTEND_STEP characters at
+    a time; batches are assigned in path order so the result does not depend
+    on scan order.
+    """
+
+    def __init__(self, path):
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS document_ids (
+                relativePath TEXT PRIMARY KEY,
+                documentId   TEXT NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS document_ids_by_id ON document_ids (documentId);
+        """, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.collisions = 0
+
+    def mark_current(self, master_name, row_count):
+        with self.lock, self.conn:
+            self._set_meta(master_name, row_count)
+
+    def seed(self, master_df, master_name):
+        """Record the IDs already in the master; existing assignments are kept."""
+        if not master_df.empty and {"documentId", "relativePath"}.issubset(master_df.columns):
+            pairs = master_df[["relativePath", "documentId"]].dropna().astype(str)
+            pairs = pairs[(pairs["documentId"] != "") & (pairs["relativePath"] != "")]
+            with self.lock, self.conn:
+                self.conn.executemany(
+                    "INSERT OR IGNORE INTO document_ids (relativePath, documentId) VALUES (?, ?)",
+                    zip(pairs["relativePath"].str.replace("\\", "/", regex=False), pairs["documentId"]),
+                )
+        self.mark_current(master_name, len(master_df))
+
+    def _select_in(self, sql, column, values):
+        """Rows of sql whose column matches any of values, via a temp table join."""
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS lookup (value TEXT PRIMARY KEY) WITHOUT ROWID")
+            self.conn.execute("DELETE FROM lookup")
+            self.conn.executemany("INSERT OR IGNORE INTO lookup VALUES (?)", ((v,) for v in values))
+            return self.conn.execute(f"{sql} JOIN lookup l ON l.value = d.{column}").fetchall()
+
+    def _taken(self, doc_ids):
+        """The documentIds among doc_ids that are already handed out."""
+        return {doc_id for (doc_id,) in self._select_in("SELECT DISTINCT d.documentId FROM document_ids d", "documentId", doc_ids)}
+
+    def assign(self, requests, length=DOCUMENT_ID_HASH_LENGTH):
+        """documentIds for a batch of (prefix, relativePath) requests, in request order.
+
+        Taken IDs are looked up once per batch: the first choices of every new
+        path, then the longer IDs of the paths whose first choice is taken.
+        IDs of earlier batches are in the table, so nothing is kept in memory
+        between batches.
+        """
+        paths = [rel.replace("\\", "/") for _, rel in requests]
+        with self.lock:
+            known = dict(self._select_in("SELECT d.relativePath, d.documentId FROM document_ids d", "relativePath", paths))
+            pending = sorted({rel: prefix for (prefix, _), rel in zip(requests, paths) if rel not in known}.items())
+            if pending:
+                # Each path's IDs in extension order: length, length + step, ..., the full digest
+                options = {}
+                for rel, prefix in pending:
+                    digest = _path_digest(rel)
+                    options[rel] = [prefix + digest[:n] for n in range(length, len(digest), DOCUMENT_ID_EXTEND_STEP)] + [prefix + digest]
+                first_choices = Counter(ids[0] for ids in options.values())
+                taken = self._taken(first_choices)
+                looked_up = {rel for rel, ids in options.items() if ids[0] in taken or first_choices[ids[0]] > 1}
+                taken |= self._taken(doc_id for rel in looked_up for doc_id in options[rel][1:])
+                batch_ids = set()
+                new_pairs = []
+                for rel, prefix in pending:
+                    ids = options[rel]
+                    if rel not in looked_up and ids[0] in batch_ids:
+                        # First choice taken by a longer ID given earlier in this batch
+                        taken |= self._taken(ids[1:])
+                    doc_id = next((i for i in ids if i not in taken and i not in batch_ids), ids[-1])
+                    if doc_id != ids[0]:
+                        self.collisions += 1
+                        scan_warnings.append({
+                            "level": "WARN", "file": rel, "type": "documentId collision",
+                            "issue": f"documentId {ids[0]} already used by another path; assigned {doc_id}",
+                        })
+                    batch_ids.add(doc_id)
+                    known[rel] = doc_id
+                    new_pairs.append((rel, doc_id))
+                with self.conn:
+                    self.conn.executemany("INSERT INTO document_ids (relativePath, documentId) VALUES (?, ?)", new_pairs)
+        return [known[rel] for rel in paths]
+
+
+def find_document_id_collisions(master_df):
+    """Master rows whose documentId is shared by more than one relativePath (one vectorized pass)."""
+    if master_df.empty or not {"documentId", "relativePath"}.issubset(master_df.columns):
+        return master_df.iloc[0:0]
+    ids = master_df["documentId"].fillna("").astype(str)
+    paths = master_df["relativePath"].fillna("").astype(str).str.replace("\\", "/", regex=False)
+    path_counts = pd.DataFrame({"documentId": ids, "path": paths}).drop_duplicates().groupby("documentId")["path"].size()
+    shared = path_counts.index[(path_counts > 1) & (path_counts.index != "")]
+    collisions = master_df[ids.isin(shared)]
+    return collisions.sort_values(["documentId", "relativePath"], kind="stable")
+
+# ==================================================
+# Walk rules — include/exclude patterns compiled into one regex per
+# collection; excluded folders are pruned instead of walked and filtered
+# ==================================================
+WALK_RULES_FILE = "walk_rules.json"   # Optional, in DAMSG_output/state: {"exclude": [...], "include": [...], "collections": {"cat/inst/coll": {...}}}
+# Volume metadata, NAS recycle bins and thumbnail caches — never assets
+PRUNED_FOLDERS = (
+    ".Trashes",
+    ".Spotlight-V100",
+    ".fseventsd",
+    ".TemporaryItems",
+    ".DocumentRevisions-V100",
+    "@eaDir",
+    "#recycle",
+    "#snapshot",
+    "@Recycle",
+    ".@__thumb",
+    "$RECYCLE.BIN",
+    "System Volume Information",
+)
+OTHER_FILE_TYPES_RULE = "other file types (file filter)"
+
+def _glob_regex(glob):
+    """Regex for a glob where * and ? stay within one path segment and ** spans segments."""
+    out, i = [], 0
+    while i < len(glob):
+        c = glob[i]
+        if glob.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[" and glob.find("]", i + 2) != -1:
+            j = glob.find("]", i + 2)
+            inner = glob[i + 1:j]
+            out.append("[" + ("^" + inner[1:] if inner.startswith("!") else inner).replace("\\", "\\\\") + "]")
+            i = j + 1
+            continue
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+def walk_rule_regex(pattern):
+    """Regex for one rule, matched against the path relative to the collection
+    root ("/"-separated, folders ending in "/").
+
+    "re:..." is a regex as is. Otherwise a glob: with a trailing "/" it matches
+    folders only; with a leading or inner "/" it is anchored at the collection
+    root, else it matches the name at any depth.
+    """
+    if pattern.startswith("re:"):
+        return pattern[3:]
+    body = pattern.strip("/")
+    rx = _glob_regex(body)
+    if not pattern.startswith("/") and "/" not in body:
+        rx = "(?:.*/)?" + rx
+    return rx + ("/" if pattern.endswith("/") else "/?")
+
+class WalkRules:
+    """The include/exclude rules of one collection, compiled into a single regex.
+
+    First match wins: include rules, then exclude rules (collection before
+    global), then the built-in ones (PRUNED_FOLDERS, SYSTEM_FILES, hidden
+    files), then the file filter's extensions, all case-insensitive. An
+    include rule overrides an exclusion but never admits a file outside the
+    file filter. Folders no rule matches are walked; files no rule matches
+    are skipped as other file types.
+    """
+
+    def __init__(self, extensions, include=(), exclude=()):
+        ext_rx = "|".join(re.escape(e) for e in extensions)
+        rules = [(True, p, scope, f"(?=.*/\\Z|.*(?:{ext_rx})\\Z)(?:{walk_rule_regex(p)})") for p, scope in include]
+        rules += [(False, p, scope, walk_rule_regex(p)) for p, scope in exclude]
+        rules += [(False, f"{name}/", "built-in", walk_rule_regex(f"{name}/")) for name in PRUNED_FOLDERS]
+        rules += [(False, name, "built-in", walk_rule_regex(name)) for name in SYSTEM_FILES]
+        rules.append((False, ".*", "built-in", r"(?:.*/)?\.[^/]*"))    # Hidden files (folders are walked)
+        self.rules = []
+        alternatives = []
+        for keep, pattern, scope, rx in rules:
+            try:
+                re.compile(rx)
+            except re.error as e:
+                scan_warnings.append({"level": "WARN", "file": WALK_RULES_FILE, "issue": f"Walk rule {pattern!r} ({scope}) ignored: {e}"})
+                continue
+            alternatives.append(rx)
+            self.rules.append((keep, f"{'include' if keep else 'exclude'} {pattern} ({scope})"))
+        alternatives.append(f".*(?:{ext_rx})")
+        self.rules.append((True, None))
+        self.regex = re.compile(
+            "|".join(f"(?P<r{i}>{rx})" for i, rx in enumerate(alternatives)),
+            re.IGNORECASE | re.DOTALL,
+        )
+        # Recorded with the change-feed state: a listing made under other rules is not reused
+        self.signature = hashlib.sha1(self.regex.pattern.encode("utf-8")).hexdigest()[:16]
+
+    def match(self, path, is_dir):
+        """(keep, rule) for a relative path; rule is None when no include/exclude rule decided."""
+        m = self.regex.fullmatch(path + "/" if is_dir else path)
+        if m is None:
+            return (True, None) if is_dir else (False, OTHER_FILE_TYPES_RULE)
+        return self.rules[int(m.lastgroup[1:])]
+
+    def wanted(self, rel_path):
+        """Whether a file (relative path, either separator) is scanned: no folder on its way is pruned and the file is kept."""
+        parts = rel_path.replace(os.sep, "/").split("/")
+        for i in range(1, len(parts)):
+            if not self.match("/".join(parts[:i]), True)[0]:
+                return False
+        return self.match("/".join(parts), False)[0]
+
+def load_walk_rules(output_folder):
+    """Walk rule config from WALK_RULES_FILE, {} if absent."""
+    path = os.path.join(output_folder, STATE_FOLDER, WALK_RULES_FILE)
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        scan_warnings.append({"level": "WARN", "file": path, "issue": f"Walk rules unreadable, built-in rules only: {e}"})
+        return {}
+
+def collection_walk_rules(config, collection_key, extensions):
+    """WalkRules for "category/institution/collection": its own rules ahead of the global ones."""
+    own = config.get("collections", {}).get(collection_key, {})
+    return WalkRules(
+        extensions,
+        include=[(p, collection_key) for p in own.get("include", [])] + [(p, "global") for p in config.get("include", [])],
+        exclude=[(p, collection_key) for p in own.get("exclude", [])] + [(p, "global") for p in config.get("exclude", [])],
+    )
+
+def format_walk_rule_hits(hits):
+    """Display lines for a Counter of (rule, is_dir) hits, most hits first."""
+    by_rule = {}
+    for (rule, is_dir), n in hits.items():
+        by_rule.setdefault(rule, [0, 0])[0 if is_dir else 1] += n
+    lines = []
+    for rule, (folders, files) in sorted(by_rule.items(), key=lambda kv: -sum(kv[1])):
+        kept = rule.startswith("include ")
+        counts = [f"{folders:,} folder(s) {'kept' if kept else 'pruned'}"] if folders else []
+        if files:
+            counts.append(f"{files:,} file(s) {'kept' if kept else 'skipped'}")
+        lines.append(f"  {rule}: {', '.join(counts)}")
+    return lines
+
+# ==================================================
+# Perceptual near-duplicate search — multi-index Hamming lookups over
+# 64-bit hashes instead of comparing all pairs
+# ==================================================
+PHASH_COLUMN = "perceptualHash"
+PHASH_MAX_DISTANCE = 6        # Differing bits (of 64) still reported as near-duplicates
+PHASH_CHUNKS = 4              # 16-bit slices of the hash, each looked up on its own
+PHASH_BATCH = 65536           # Hashes looked up per vectorized step
+NEAR_DUPLICATE_COLUMNS = ["clusterId", "distance", PHASH_COLUMN, "checksumSHA256", "scanType",
+                          "institutionCode", "collectionCode", "relativePath"]
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _popcount64(values):
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values).astype(np.int64)
+    return _POPCOUNT8[values.view(np.uint8).reshape(-1, 8)].sum(axis=1, dtype=np.int64)
+
+def near_duplicate_pairs(hashes, max_distance=PHASH_MAX_DISTANCE):
+    """(i, j, distance) arrays for every pair i < j of a uint64 hash array
+    within max_distance differing bits.
+
+    Multi-index hashing: two hashes that differ in at most max_distance bits
+    differ in at most max_distance // PHASH_CHUNKS bits in one of the
+    PHASH_CHUNKS slices. Hashes are bucketed by each slice once; every hash
+    looks up the buckets of its slice with each combination of that many bits
+    flipped, and the candidates are checked with a vectorized popcount.
+    """
+    n = len(hashes)
+    width = 64 // PHASH_CHUNKS
+    radius = max_distance // PHASH_CHUNKS
+    masks = [sum(1 << b for b in flipped) for r in range(radius + 1) for flipped in itertools.combinations(range(width), r)]
+    found = []
+    for c in range(PHASH_CHUNKS):
+        keys = ((hashes >> np.uint64(c * width)) & np.uint64((1 << width) - 1)).astype(np.intp)
+        order = np.argsort(keys, kind="stable")
+        # Bucket k holds order[bounds[k]:bounds[k + 1]]
+        bounds = np.concatenate([[0], np.cumsum(np.bincount(keys, minlength=1 << width))])
+        for mask in masks:
+            for start in range(0, n, PHASH_BATCH):
+                query = keys[start:start + PHASH_BATCH] ^ mask
+                lo = bounds[query]
+                counts = bounds[query + 1] - lo
+                total = int(counts.sum())
+                if not total:
+                    continue
+                i = np.repeat(np.arange(start, start + len(query)), counts)
+                # Positions lo .. hi-1 of every query, flattened
+                j = order[np.repeat(lo, counts) + np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)]
+                keep = i < j
+                i, j = i[keep], j[keep]
+                distance = _popcount64(hashes[i] ^ hashes[j])
+                close = distance <= max_distance
+                found.append(np.stack([i[close], j[close], distance[close]]))
+    if not found:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.int64)
+    pairs = np.concatenate(found, axis=1)
+    # A pair close in several slices is found once per slice
+    _, first = np.unique(pairs[0] * n + pairs[1], return_index=True)
+    return pairs[0, first], pairs[1, first], pairs[2, first]
+
+def near_duplicate_clusters(phashes, max_distance=PHASH_MAX_DISTANCE, shared=()):
+    """{perceptual hash: (cluster number, distance to the cluster's first hash)}
+    for hashes with a neighbour within max_distance (single linkage), and for
+    the shared hashes (held by several files) even without one."""
+    values = sorted(set(phashes))
+    hashes = np.array([int(v, 16) for v in values], dtype=np.uint64)
+    parent = list(range(len(values)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    i, j, _ = near_duplicate_pairs(hashes, max_distance)
+    for a, b in zip(i.tolist(), j.tolist()):
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    members = {}
+    shared = set(shared)
+    for x in sorted(set(i.tolist()) | set(j.tolist()) | {k for k, v in enumerate(values) if v in shared}):
+        members.setdefault(find(x), []).append(x)
+    clusters = {}
+    for number, (first, group) in enumerate(sorted(members.items()), start=1):
+        distances = _popcount64(hashes[group] ^ hashes[first])
+        for x, d in zip(group, distances.tolist()):
+            clusters[values[x]] = (number, d)
+    return clusters
+
+def near_duplicate_report(df, phashes, max_distance=PHASH_MAX_DISTANCE):
+    """Rows of df (master rows) in near-duplicate clusters, by cluster and distance.
+
+    phashes maps checksumSHA256 → perceptual hash. Files with the same checksum
+    are exact duplicates (preservation audit); a cluster is reported only when
+    it holds at least two different checksums.
+    """
+    df = df[df["checksumSHA256"].isin(phashes.keys())]
+    if df.empty:
+        return pd.DataFrame(columns=NEAR_DUPLICATE_COLUMNS)
+    df = df.assign(**{PHASH_COLUMN: df["checksumSHA256"].map(phashes)})
+    checksums_per_hash = df.groupby(PHASH_COLUMN)["checksumSHA256"].nunique()
+    clusters = near_duplicate_clusters(checksums_per_hash.index, max_distance, checksums_per_hash.index[checksums_per_hash > 1])
+    df = df[df[PHASH_COLUMN].isin(clusters.keys())]
+    df = df.assign(
+        clusterId=[clusters[h][0] for h in df[PHASH_COLUMN]],
+        distance=[clusters[h][1] for h in df[PHASH_COLUMN]],
+    )
+    distinct = df.groupby("clusterId")["checksumSHA256"].nunique()
+    df = df[df["clusterId"].isin(distinct[distinct > 1].index)]
+    for col in NEAR_DUPLICATE_COLUMNS:
+        if col not in df.columns:
+            df[col] = ""
+    return df.sort_values(["clusterId", "distance", "relativePath"])[NEAR_DUPLICATE_COLUMNS]
+
+# ==================================================
+# Fixity scrubbing — read pacing and scrub windows
+# ==================================================
+SCRUB_BURST_SECONDS = 1.0                 # Reads may run this far ahead of the cap before pausing
+
+class ScrubPaused(Exception):
+    """Raised mid-file when the scrub window or time budget runs out."""
+
+class ScrubThrottle:
+    """Paces reads to a bandwidth and IOPS cap.
+
+    Sits in hash_file's hasher list, so update() is called once per block
+    read; each read costs the longer of its bytes at the bandwidth cap and
+    one I/O at the IOPS cap. Raises ScrubPaused once the deadline passes.
+    """
+
+    def __init__(self, bytes_per_second=None, iops=None, deadline=None):
+        self.bytes_per_second = bytes_per_second
+        self.iops = iops
+        self.deadline = deadline
+        self._due = time.monotonic()
+
+    def _pace(self, seconds):
+        now = time.monotonic()
+        self._due = max(self._due, now - SCRUB_BURST_SECONDS) + seconds
+        wait = self._due - now
+        if self.deadline is not None:
+            wait = min(wait, self.deadline - time.time())
+        if wait > 0:
+            time.sleep(wait)
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise ScrubPaused()
+
+    def read_op(self, nbytes=0):
+        self._pace(max(nbytes / self.bytes_per_second if self.bytes_per_second else 0,
+                       1 / self.iops if self.iops else 0))
+
+    def update(self, chunk):
+        self.read_op(len(chunk))
+
+def scrub_file(path, st, throttle):
+    """SHA-256 of path (os.stat result st), read at the throttle's pace.
+
+    Returns None when the throttle's deadline passes before or while the file
+    is read; OSError from an unreadable file is left to the caller.
+    """
+    sha256 = hashlib.sha256()
+    try:
+        throttle.read_op()   # The open itself costs an I/O
+        hash_file(path, [sha256, throttle], "sequential",
+                  HASH_NETWORK_BUFFER if is_network_path(path, st.st_dev) else HASH_SEQUENTIAL_BUFFER)
+    except ScrubPaused:
+        return None
+    return sha256.hexdigest()
+
+def parse_scrub_window(text):
+    """"HH:MM-HH:MM" → (start, end) in minutes after midnight; the end may be past midnight."""
+    m = re.fullmatch(r"(\d{1,2}):(\d{2})-(\d{1,2}):(\d{2})", text.strip())
+    if not m or int(m.group(1)) > 23 or int(m.group(3)) > 24 or int(m.group(2)) > 59 or int(m.group(4)) > 59:
+        raise argparse.ArgumentTypeError(f"window must look like 19:00-06:30, not {text!r}")
+    start, end = int(m.group(1)) * 60 + int(m.group(2)), int(m.group(3)) * 60 + int(m.group(4))
+    if start == end:
+        raise argparse.ArgumentTypeError(f"window {text!r} is empty")
+    return start, end
+
+def scrub_window_end(windows, now):
+    """Epoch seconds when the window now falls in closes; None if now is outside every window."""
+    midnight = datetime(now.year, now.month, now.day).timestamp()
+    minute = (now.timestamp() - midnight) / 60
+    ends = []
+    for start, end in windows:
+        if start < end and start <= minute < end:
+            ends.append(midnight + end * 60)
+        elif start > end and minute >= start:
+            ends.append(midnight + (24 * 60 + end) * 60)
+        elif start > end and minute < end:
+            ends.append(midnight + end * 60)
+    return max(ends) if ends else None
+
+def scrub_window_start(windows, now):
+    """Epoch seconds when the next window opens."""
+    midnight = datetime(now.year, now.month, now.day).timestamp()
+    starts = [midnight + start * 60 for start, _ in windows]
+    return min(s if s > now.timestamp() else s + 24 * 3600 for s in starts)
+
+# ==================================================
+# Manifest diff — streaming sort-merge join of two tiers' manifests
+# ==================================================
+MANIFEST_SORT_RUN = 500_000               # Entries sorted in memory per temporary run file
+MANIFEST_CHUNK_ROWS = 200_000             # Master CSV rows read per chunk
+SHA256SUMS_LINE = re.compile(r"^((?:[0-9A-Fa-f]{2} ?){32})[ *]?(.+)$")   # certutil may space the hex pairs
+SHA256SUMS_SKIPPED = "SHA256SUMS line skipped"
+
+def _manifest_path(rel, under=""):
+    """relativePath with "/" separators, under stripped; None if rel is not under it."""
+    rel = rel.replace("\\", "/")
+    while rel.startswith("./"):
+        rel = rel[2:]
+    if under:
+        if not rel.startswith(under + "/"):
+            return None
+        rel = rel[len(under) + 1:]
+    return rel
+
+def read_sha256sums(path, under="", encoding="utf-8-sig", warnings=None):
+    """Yield (relativePath, checksum) from a SHA256SUMS manifest (sha256sum or
+    SHA256_checksum_tool.bat format). Comments and blank lines are skipped;
+    other lines that are not checksum lines go to warnings (a ScanWarningLog,
+    the scan warnings by default)."""
+    warnings = scan_warnings if warnings is None else warnings
+    under = under.replace("\\", "/").strip("/")
+    with open(path, "r", encoding=encoding, errors="replace") as f:
+        for number, line in enumerate(f, 1):
+            # Windows tools often start the file with a BOM, whatever the encoding asked for
+            m = SHA256SUMS_LINE.match(line.lstrip("\ufeff").rstrip("\r\n"))
+            if not m:
+                if line.strip() and not line.lstrip().startswith("#"):
+                    warnings.append({"level": "WARN", "file": path, "type": SHA256SUMS_SKIPPED,
+                                     "issue": f"Line {number}: not a checksum line, skipped"})
+                continue
+            rel = _manifest_path(m.group(2), under)
+            # System files (Thumbs.db, .DS_Store) are never inventoried by DAMSG
+            if rel is not None and rel.rpartition("/")[2].lower() not in SYSTEM_FILES:
+                yield rel, m.group(1).replace(" ", "").lower()
+
+def read_master_slice(sources, scan_type=None, under=""):
+    """Yield (relativePath, checksumSHA256) for one scanType from LA master CSVs (in order),
+    metadata CSV rows left out. scanType defaults to that of the first row."""
+    under = under.replace("\\", "/").strip("/")
+    for source in sources:
+        for chunk in pd.read_csv(source, chunksize=MANIFEST_CHUNK_ROWS, dtype=object, keep_default_na=False,
+                                 usecols=lambda c: c in ("scanType", "relativePath", "checksumSHA256", "format")):
+            if scan_type is None and len(chunk):
+                scan_type = chunk["scanType"].iloc[0]
+            chunk = chunk[(chunk["scanType"] == scan_type) & (chunk["format"] != "text/csv")]
+            for rel, checksum in zip(chunk["relativePath"], chunk["checksumSHA256"]):
+                rel = _manifest_path(rel, under)
+                if rel is not None:
+                    yield rel, checksum.lower()
+
+def external_sort(records, key, tmp_dir):
+    """Sort an iterable of string tuples by key with bounded memory: sorted runs
+    of MANIFEST_SORT_RUN records are spilled to CSV files in tmp_dir and merged."""
+    runs, batch = [], []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= MANIFEST_SORT_RUN:
+            batch.sort(key=key)
+            run = os.path.join(tmp_dir, f"run_{len(os.listdir(tmp_dir))}.csv")
+            with open(run, "w", newline="", encoding="utf-8") as f:
+                csv.writer(f, lineterminator="\n").writerows(batch)
+            runs.append(run)
+            batch = []
+    batch.sort(key=key)
+    if not runs:
+        yield from batch
+        return
+    files = [open(run, "r", newline="", encoding="utf-8") for run in runs]
+    try:
+        yield from heapq.merge(*[map(tuple, csv.reader(f)) for f in files], batch, key=key)
+    finally:
+        for f in files:
+            f.close()
+
+def _last_per_path(records):
+    """Sorted (path, checksum, seq) → (path, checksum), the last entry of each path winning."""
+    previous = None
+    for record in records:
+        if previous is not None and record[0] != previous[0]:
+            yield previous[:2]
+        previous = record
+    if previous is not None:
+        yield previous[:2]
+
+def diff_manifests(left, right, tmp_dir):
+    """Streaming diff of two (relativePath, checksum) iterables.
+
+    Both sides are sorted by path on disk and merge-joined. Paths on one side
+    only are then sorted by checksum and joined again, so a file that kept its
+    checksum under a new path is reported as moved. Yields (kind, path,
+    checksum, other) with kind in "same", "changed", "removed", "added" or
+    "moved"; other is the right-hand checksum of a changed file and the new
+    path of a moved one.
+    """
+    def sorted_side(records, name):
+        folder = os.path.join(tmp_dir, name)
+        os.makedirs(folder, exist_ok=True)
+        numbered = ((rel, checksum, f"{i:012d}") for i, (rel, checksum) in enumerate(records))
+        return _last_per_path(external_sort(numbered, operator.itemgetter(0, 2), folder))
+
+    only = {"removed": os.path.join(tmp_dir, "removed.csv"), "added": os.path.join(tmp_dir, "added.csv")}
+    with open(only["removed"], "w", newline="", encoding="utf-8") as rf, \
+         open(only["added"], "w", newline="", encoding="utf-8") as af:
+        removed, added = csv.writer(rf, lineterminator="\n"), csv.writer(af, lineterminator="\n")
+        lefts, rights = sorted_side(left, "left"), sorted_side(right, "right")
+        l, r = next(lefts, None), next(rights, None)
+        while l is not None or r is not None:
+            if r is None or (l is not None and l[0] < r[0]):
+                removed.writerow(l)
+                l = next(lefts, None)
+            elif l is None or r[0] < l[0]:
+                added.writerow(r)
+                r = next(rights, None)
+            else:
+                yield ("same" if l[1] == r[1] else "changed"), l[0], l[1], r[1]
+                l, r = next(lefts, None), next(rights, None)
+
+    def by_checksum(name):
+        folder = os.path.join(tmp_dir, f"{name}_by_checksum")
+        os.makedirs(folder, exist_ok=True)
+        f = open(only[name], "r", newline="", encoding="utf-8")
+        return f, external_sort(map(tuple, csv.reader(f)), operator.itemgetter(1, 0), folder)
+
+    rf, removed = by_checksum("removed")
+    af, added = by_checksum("added")
+    try:
+        l, r = next(removed, None), next(added, None)
+        while l is not None or r is not None:
+            # Files without a checksum cannot be matched as moves
+            if r is None or (l is not None and (l[1] < r[1] or not l[1])):
+                yield "removed", l[0], l[1], ""
+                l = next(removed, None)
+            elif l is None or r[1] < l[1] or not r[1]:
+                yield "added", r[0], r[1], ""
+                r = next(added, None)
+            else:
+                yield "moved", l[0], l[1], r[0]
+                l, r = next(removed, None), next(added, None)
+    finally:
+        rf.close()
+        af.close()
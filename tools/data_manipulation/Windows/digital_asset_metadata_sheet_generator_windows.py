@@ -2,9 +2,10 @@
 import os
 import subprocess
 import pandas as pd
+import numpy as np
 from datetime import datetime
 from tkinter import (
-    Tk, Canvas, Label, Button, StringVar, BooleanVar,
+    Tk, Canvas, Frame, LabelFrame, Label, Button, StringVar, BooleanVar,
     OptionMenu, Checkbutton, filedialog, messagebox, DISABLED, NORMAL
 )
 from PIL import Image, ExifTags, ImageTk
@@ -12,6 +13,36 @@ import platform
 import sys
 import pathlib
 import hashlib
+import json
+import re
+import csv
+import argparse
+import sqlite3
+import threading
+import queue
+import time
+import io
+import tempfile
+import concurrent.futures
+import zipfile
+import zlib
+import struct
+import heapq
+import bisect
+from xml.sax.saxutils import escape as xml_escape
+from collections import Counter, deque
+
+from damsg_core import (
+    STATE_FOLDER, HASH_STRATEGIES, choose_hash_strategy, hash_file, is_network_path, HeaderReader,
+    FILENAME_PARSE_COLUMNS, parse_filename_description, parse_filename_batch,
+    ScanWarningLog, scan_warnings,
+    document_id_prefix, metadata_document_id_prefix, MasterIndexStore,
+    DOCUMENT_ID_INDEX_FILE, DocumentIdIndex, find_document_id_collisions,
+    load_walk_rules, collection_walk_rules, format_walk_rule_hits,
+    PHASH_COLUMN, PHASH_MAX_DISTANCE, near_duplicate_report,
+    ScrubThrottle, scrub_file, parse_scrub_window, scrub_window_end, scrub_window_start,
+    read_sha256sums, read_master_slice, diff_manifests,
+)
 
 # ==================================================
 # Google Sheets configuration
@@ -51,15 +82,47 @@ ATOM_COLUMNS = [
 ATOM_OUTPUT_COLUMNS = ATOM_COLUMNS + ["checksumSHA256", "scanType"]
 
 # ==================================================
-# System files to ignore during scanning
+# Checksum algorithms — computed together in one read of each file
+# blake3 and xxhash are optional (pip install blake3 xxhash)
 # ==================================================
-SYSTEM_FILES = (
-    "thumbs.db",
-    "desktop.ini",
-    ".ds_store",
-    ".spotlight-v100",
-    ".trashes"
-)
+try:
+    import blake3
+    BLAKE3_AVAILABLE = True
+except ImportError:
+    BLAKE3_AVAILABLE = False
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+CHECKSUM_COLUMNS = {
+    "sha256":   "checksumSHA256",
+    "md5":      "checksumMD5",
+    "blake3":   "checksumBLAKE3",
+    "xxh3_128": "checksumXXH3",
+    "blake2b":  "checksumBLAKE2b",
+}
+# Fastest available non-archival hash; blake2b (stdlib) if neither optional package is installed
+FAST_HASH_ALGORITHM = "xxh3_128" if XXHASH_AVAILABLE else "blake3" if BLAKE3_AVAILABLE else "blake2b"
+FAST_AUDIT_PROFILE = "Fast hash audit (SHA-256 carried forward)"
+CHECKSUM_PROFILES = {
+    "SHA-256":             ("sha256",),
+    "SHA-256 + MD5":       ("sha256", "md5"),
+    "SHA-256 + fast hash": ("sha256", FAST_HASH_ALGORITHM),
+    FAST_AUDIT_PROFILE:    (FAST_HASH_ALGORITHM,),
+}
+
+# ==================================================
+# File filters — extensions scanned for each File Filter choice
+# ==================================================
+FILE_TYPES = {
+    "All":[ ".tif",".tiff",".jpg",".jpeg",".nef",".cr2",".cr3",".arw",".dng",".orf",".rw2", ".pdf",".csv"],
+    "TIFF only":[ ".tif",".tiff"],
+    "RAW only":[ ".nef",".cr2",".cr3",".arw",".dng",".orf",".rw2"],
+    "JPEG only":[ ".jpg",".jpeg"],
+    "PDF only":[ ".pdf"]
+}
 
 # ==================================================
 # Run timestamp
@@ -106,6 +169,19 @@ EXCLUDED_ROOT_FOLDERS = (
     "DAMSG_mapping"
 )
 
+# ==================================================
+# Change-feed scanning — per-scanType directory state store
+# Stored in DAMSG_output/state (STATE_FOLDER); a full walk is forced at least this often
+# ==================================================
+FULL_WALK_INTERVAL_DAYS = 7
+
+# ==================================================
+# Progress reporting — views poll the shared aggregator at a fixed rate
+# ==================================================
+PROGRESS_POLL_HZ = 5
+PROGRESS_STATUS_FILE = "scan_status.json"  # Written to DAMSG_output/state once per second
+MASTER_INDEX_FILE = "master_index.sqlite"   # (documentId, scanType) key index of the latest LA master
+
 # ==================================================
 # DwC Simple Multimedia Extension — MIME type map
 # ==================================================
@@ -147,142 +223,6 @@ DWC_TYPE_MAP = {
     ".csv":  "Text",
 }
 
-# ==================================================
-# Filename parsing — structure, view, and suffix codes (Legacy, remove eventually)
-# ==================================================
-
-# Overrides for specific well-known codes (preserves existing descriptions)
-# VIEW_CODE_MAP = {
-#     "cd":    "Dorsal view of specimen cranium",
-#     "cv":    "Ventral view of specimen cranium",
-#     "mrl":   "Right lateral view of specimen mandible",
-#     "sd":    "Dorsal view of specimen skin",
-#     "mo":    "Occlusional view of specimen mandible",
-#     "cll":   "Left lateral view of specimen cranium",
-#     "sv":    "Ventral view of specimen skin",
-#     "crl":   "Right lateral view of specimen cranium",
-#     "mll":   "Left lateral view of specimen mandible",
-#     "label": "Close-up view of specimen label",
-# }
-VIEW_CODE_MAP = {}  # Replaced by parse_filename_description()
-
-STRUCTURE_NAMES = {
-    "H": "head",
-    "S": "skin",
-    "L": "skull",
-    "C": "cranium",
-    "M": "mandible",
-    "P": "postcranium",
-    "B": "long bones",
-    "K": "skeleton",
-    "W": "whole specimen",
-}
-
-VIEW_NAMES = {
-    "L": "lateral",
-    "D": "dorsal",
-    "V": "ventral",
-    "O": "occlusional",
-    "C": "occipital",
-    "A": "anterior",
-    "P": "posterior",
-    "S": "distal",
-    "M": "medial",
-}
-
-VIEW_STEMS = {
-    "D": "dorso", "V": "ventro", "A": "antero", "P": "postero",
-    "M": "medio",  "L": "latero", "C": "occipito", "S": "disto",
-}
-
-SIDE_NAMES = {"L": "left", "R": "right"}
-
-
-def _decode_view(view_chars):
-    v = view_chars.upper()
-    if not v or v == "U":
-        return ""
-    if len(v) == 1:
-        return VIEW_NAMES.get(v, v.lower())
-    if v[0] in SIDE_NAMES:
-        side = SIDE_NAMES[v[0]]
-        rest = v[1:]
-        if len(rest) == 1:
-            direction = VIEW_NAMES.get(rest, rest.lower())
-        else:
-            parts_list = [VIEW_STEMS.get(rest[i], VIEW_NAMES.get(rest[i], rest[i].lower()))
-                          for i in range(len(rest) - 1)]
-            parts_list.append(VIEW_NAMES.get(rest[-1], rest[-1].lower()))
-            direction = "-".join(parts_list)
-        return f"{side} {direction}"
-    else:
-        parts_list = [VIEW_STEMS.get(v[i], VIEW_NAMES.get(v[i], v[i].lower()))
-                      for i in range(len(v) - 1)]
-        parts_list.append(VIEW_NAMES.get(v[-1], v[-1].lower()))
-        return "-".join(parts_list)
-
-
-def _parse_suffixes(suffix_parts):
-    group = view_num = section = image = None
-    for part in suffix_parts:
-        p = part.upper()
-        if p.startswith("G") and p[1:].isdigit():   group    = int(p[1:])
-        elif p.startswith("V") and p[1:].isdigit(): view_num = int(p[1:])
-        elif p.startswith("S") and p[1:].isdigit(): section  = int(p[1:])
-        elif p.startswith("I") and p[1:].isdigit(): image    = int(p[1:])
-    parts_out = []
-    if group    is not None: parts_out.append(f"group {group}")
-    if view_num is not None: parts_out.append(f"view {view_num}")
-    if section  is not None: parts_out.append(f"section {section}")
-    if image    is not None: parts_out.append(f"image {image}")
-    return ", ".join(parts_out)
-
-
-def parse_filename_description(base):
-    """Parse a specimen filename stem into a human-readable description.
-
-    Examples:
-      TM1235_HV       → Ventral view of specimen head
-      TM1235_HLL      → Left lateral view of specimen head
-      TM1235_label    → Close-up view of specimen label
-      TM1234_PU       → Unspecified view of specimen postcranium
-      TM1234_PU_G1_V1 → Unspecified view of specimen postcranium; group 1, view 1
-    """
-    parts = base.split("_")
-    if len(parts) < 2:
-        return ""
-
-    sv_code      = parts[1]
-    suffix_parts = parts[2:]
-
-    if sv_code.lower() == "label":
-        return "Close-up view of specimen label"
-
-    # Check explicit override map first
-    override = VIEW_CODE_MAP.get(sv_code.lower())
-    if override:
-        suffix_desc = _parse_suffixes(suffix_parts)
-        return f"{override}; {suffix_desc}" if suffix_desc else override
-
-    sv_upper    = sv_code.upper()
-    struct_char = sv_upper[0] if sv_upper else ""
-    view_chars  = sv_upper[1:] if len(sv_upper) > 1 else ""
-
-    struct_name = STRUCTURE_NAMES.get(struct_char, struct_char.lower())
-    view_desc   = _decode_view(view_chars)
-
-    if view_desc:
-        base_desc = f"{view_desc.capitalize()} view of specimen {struct_name}"
-    else:
-        base_desc = f"Unspecified view of specimen {struct_name}"
-
-    suffix_desc = _parse_suffixes(suffix_parts)
-    return f"{base_desc}; {suffix_desc}" if suffix_desc else base_desc
-
-# ==================================================
-# Scan warning log — populated during scanning
-# ==================================================
-scan_warnings = []
 
 # Detect exiftool once so we don't log a FileNotFoundError for every file
 EXIFTOOL_AVAILABLE = bool(
@@ -298,39 +238,741 @@ if not EXIFTOOL_AVAILABLE:
 # Extensions that Pillow cannot open (non-image formats)
 PILLOW_UNSUPPORTED = (".pdf", ".csv", ".txt", ".xml", ".mp4", ".mov", ".avi", ".wav", ".mp3")
 
+# ==================================================
+# Per-device I/O scheduler — files are read by per-device worker threads,
+# capped by device class, in physical order on each device
+# ==================================================
+IO_DEVICE_WORKERS = {
+    "hdd": 1,                                # One stream per spindle; a second only adds seeks
+    "ssd": min(8, max(2, os.cpu_count() or 2)),
+    "network": 8,                            # Latency-bound; parallel requests fill the link
+}
+IO_DEVICES_FILE = "io_devices.json"          # Optional, in DAMSG_output/state: {"E:\\": "ssd", "/mnt/suzie": 2}
+IO_THROUGHPUT_FILE = "io_throughput.json"    # Measured read cost per device, in DAMSG_output/state; used by the scan planner
+IO_THROUGHPUT_DECAY = 0.5                    # Weight left on earlier runs' samples when a scan adds its own
+FS_IOC_FIEMAP = 0xC020660B                   # Linux: physical extent map of a file
+
+_device_class_cache = {}
+
+def _linux_rotational(st_dev):
+    """True/False from sysfs for the block device behind st_dev, None if unknown."""
+    node = f"/sys/dev/block/{os.major(st_dev)}:{os.minor(st_dev)}"
+    for queue in (os.path.join(node, "queue", "rotational"), os.path.join(os.path.realpath(node), "..", "queue", "rotational")):
+        try:
+            with open(queue, "r") as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+def _windows_seek_penalty(path):
+    """IncursSeekPenalty of the volume holding path (IOCTL_STORAGE_QUERY_PROPERTY), None if unknown."""
+    try:
+        import ctypes
+        from ctypes import wintypes
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateFileW.restype = wintypes.HANDLE
+        drive = os.path.splitdrive(os.path.abspath(path))[0]
+        handle = kernel32.CreateFileW(f"\\\\.\\{drive}", 0, 3, None, 3, 0, None)  # No access rights needed; OPEN_EXISTING
+        if handle in (None, ctypes.c_void_p(-1).value):
+            return None
+        try:
+            query = struct.pack("<III", 7, 0, 0)     # StorageDeviceSeekPenaltyProperty, PropertyStandardQuery
+            out = ctypes.create_string_buffer(12)    # DEVICE_SEEK_PENALTY_DESCRIPTOR
+            returned = wintypes.DWORD()
+            ok = kernel32.DeviceIoControl(wintypes.HANDLE(handle), 0x002D1400, query, len(query),
+                                          out, len(out), ctypes.byref(returned), None)
+            return bool(out.raw[8]) if ok and returned.value >= 9 else None
+        finally:
+            kernel32.CloseHandle(wintypes.HANDLE(handle))
+    except Exception:
+        return None
+
+def device_class(path, st_dev):
+    """"network", "ssd" or "hdd" for the device holding path. Unknown local
+    devices count as "hdd", which reads one file at a time as before."""
+    if st_dev in _device_class_cache:
+        return _device_class_cache[st_dev]
+    if is_network_path(path, st_dev):
+        result = "network"
+    else:
+        if platform.system() == "Windows":
+            seeks = _windows_seek_penalty(path)
+        elif platform.system() == "Linux":
+            seeks = _linux_rotational(st_dev)
+        else:
+            seeks = None
+        result = "ssd" if seeks is False else "hdd"
+    _device_class_cache[st_dev] = result
+    return result
+
+def first_extent_offset(path):
+    """Physical byte offset of a file's first extent (Linux FIEMAP), None where unsupported."""
+    try:
+        import fcntl
+    except ImportError:
+        return None
+    buf = bytearray(32 + 56)                                   # struct fiemap + one fiemap_extent
+    struct.pack_into("=QQIIII", buf, 0, 0, 0xFFFFFFFFFFFFFFFF, 0, 0, 1, 0)
+    try:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            fcntl.ioctl(fd, FS_IOC_FIEMAP, buf)
+        finally:
+            os.close(fd)
+    except OSError:
+        return None
+    if not struct.unpack_from("=I", buf, 20)[0]:               # fm_mapped_extents
+        return None
+    return struct.unpack_from("=Q", buf, 40)[0]                # fm_extents[0].fe_physical
+
+def device_label(path, st_dev):
+    """Drive letter on Windows, "dev major:minor" elsewhere."""
+    return os.path.splitdrive(os.path.abspath(path))[0] or f"dev {os.major(st_dev)}:{os.minor(st_dev)}"
+
+def load_io_overrides(output_folder):
+    """{path prefix: device class or worker count} from IO_DEVICES_FILE, {} if absent."""
+    path = os.path.join(output_folder, STATE_FOLDER, IO_DEVICES_FILE)
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        scan_warnings.append({"level": "WARN", "file": path, "issue": f"I/O device overrides unreadable, ignored: {e}"})
+        return {}
+
+class _DeviceQueue:
+    """Pending jobs of one device, taken lowest physical position first."""
+
+    def __init__(self, label, kind, workers, physical):
+        self.label, self.kind, self.workers, self.physical = label, kind, workers, physical
+        self.heap = []
+        self.cond = threading.Condition()
+        self.threads = []
+        self.done = 0
+        self.samples = [0, 0.0, 0.0, 0.0, 0.0]   # Jobs, Σbytes, Σbytes², Σseconds, Σbytes·seconds
+
+class DeviceScheduler:
+    """Runs file jobs with a separate concurrency cap per device (st_dev).
+
+    submit(path, fn, *args) queues fn(*args) on the device holding path and
+    returns a Future. Each device has its own worker threads (IO_DEVICE_WORKERS
+    by device class, or an override) that always take the queued job with the
+    lowest position next: the first extent's physical offset where the OS
+    reports it, else the inode number. A spinning disk is read front to back
+    instead of seeking back and forth; devices never wait on each other.
+    """
+
+    def __init__(self, overrides=None):
+        self.overrides = sorted((overrides or {}).items(), key=lambda kv: len(kv[0]), reverse=True)
+        self._devices = {}
+        self._lock = threading.Lock()
+        self._seq = 0
+        self._closed = False
+
+    def _override(self, path):
+        full = os.path.normcase(os.path.abspath(path))
+        for prefix, value in self.overrides:
+            if full.startswith(os.path.normcase(os.path.abspath(prefix))):
+                return value
+        return None
+
+    def device_info(self, path):
+        """(label, class, workers) of the device holding path, without reading it."""
+        device, _ = self._device(path, os.stat(path))
+        return device.label, device.kind, device.workers
+
+    def _device(self, path, st):
+        """(device queue, path's first extent offset if probing the device read it, else None)."""
+        with self._lock:
+            device = self._devices.get(st.st_dev)
+        if device is not None:
+            return device, None
+        kind = device_class(path, st.st_dev)
+        override = self._override(path)
+        if isinstance(override, str) and override in IO_DEVICE_WORKERS:
+            kind = override
+        workers = override if isinstance(override, int) and override > 0 else IO_DEVICE_WORKERS[kind]
+        # Physical order only matters where seeks are expensive
+        offset = first_extent_offset(path) if kind == "hdd" else None
+        label = device_label(path, st.st_dev)
+        with self._lock:
+            device = self._devices.setdefault(st.st_dev, _DeviceQueue(label, kind, workers, offset is not None))
+        return device, offset
+
+    def submit(self, path, fn, *args):
+        future = concurrent.futures.Future()
+        try:
+            st = os.stat(path)
+        except OSError:
+            # Let the job itself report the problem, in the caller's order
+            st = None
+        if st is None:
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+            return future
+        device, offset = self._device(path, st)
+        if device.physical and offset is None:
+            offset = first_extent_offset(path)
+        # Extents not yet allocated (delayed allocation) report offset 0; inode breaks the tie
+        position = (offset or 0, st.st_ino)
+        with self._lock:
+            self._seq += 1
+            seq = self._seq
+        with device.cond:
+            heapq.heappush(device.heap, (position, seq, future, fn, args, st.st_size))
+            if len(device.threads) < device.workers:
+                t = threading.Thread(target=self._worker, args=(device,), daemon=True,
+                                     name=f"damsg-io-{device.label}-{len(device.threads) + 1}")
+                device.threads.append(t)
+                t.start()
+            device.cond.notify()
+        return future
+
+    def _worker(self, device):
+        while True:
+            with device.cond:
+                while not device.heap and not self._closed:
+                    device.cond.wait()
+                if not device.heap:
+                    return
+                _, _, future, fn, args, size = heapq.heappop(device.heap)
+            started = time.perf_counter()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except BaseException as e:
+                    future.set_exception(e)
+            seconds = time.perf_counter() - started
+            with device.cond:
+                device.done += 1
+                for i, v in enumerate((1, size, size * size, seconds, size * seconds)):
+                    device.samples[i] += v
+
+    def devices(self):
+        """[(label, class, workers, ordering, files read)] for every device used so far."""
+        with self._lock:
+            devices = list(self._devices.values())
+        return [(d.label, d.kind, d.workers, "physical offset" if d.physical else "inode", d.done) for d in devices]
+
+    def throughput(self):
+        """{label: measured read cost} for every device that ran a job, for record_io_throughput."""
+        with self._lock:
+            devices = list(self._devices.values())
+        measured = {}
+        for d in devices:
+            with d.cond:
+                if d.samples[0]:
+                    measured[d.label] = {"kind": d.kind, "workers": d.workers, "samples": list(d.samples)}
+        return measured
+
+    def shutdown(self):
+        self._closed = True
+        with self._lock:
+            devices = list(self._devices.values())
+        for device in devices:
+            with device.cond:
+                device.cond.notify_all()
+            for t in device.threads:
+                t.join()
+
 # ==================================================
 # Checksum generation for file integrity (optional)
 # ==================================================
 def build_extent_summary(rows):
-    """Build a human-readable extent summary from a list of scanned file rows."""
+    """Build a human-readable extent summary from a list of scanned FileRecords."""
     fmt_counts = {}
     total_bytes = 0
     for item in rows:
-        ext = item.get("format", "").split("/")[-1].upper() or "FILE"
+        ext = (item.format or "").split("/")[-1].upper() or "FILE"
         fmt_counts[ext] = fmt_counts.get(ext, 0) + 1
-        try:
-            total_bytes += os.path.getsize(item.get("fullPath", ""))
-        except Exception:
-            pass
+        total_bytes += item.size or 0
     total_mb = total_bytes / (1024 * 1024)
     size_str = f"{total_mb:.1f} MB" if total_mb >= 1 else f"{total_bytes / 1024:.1f} KB"
     fmt_str = "; ".join(f"{count} {fmt}" for fmt, count in sorted(fmt_counts.items()))
     n = len(rows)
     return f"{n} item{'s' if n != 1 else ''}: {fmt_str} ({size_str} total)"
 
-def generate_checksum(file_path, block_size=65536):
-    sha256 = hashlib.sha256()
+def new_hasher(algorithm):
+    if algorithm == "blake3":
+        return blake3.blake3()
+    if algorithm == "xxh3_128":
+        return xxhash.xxh3_128()
+    return hashlib.new(algorithm)
 
-    try:
-        with open(file_path, "rb") as f:
-            for block in iter(lambda: f.read(block_size), b""):
-                sha256.update(block)
+def generate_checksums(file_path, algorithms=("sha256",), block_size=None, strategy=None, technical=None, extra_hashers=()):
+    """Hex digests {algorithm: digest} for every algorithm, from a single read of the file.
+
+    If technical is a dict, header-only technical metadata is added to it
+    while the file is still open (see read_technical_metadata). extra_hashers
+    (e.g. a ChunkHasher) are fed the same bytes.
+    """
+    hashers = [new_hasher(a) for a in algorithms]
+    probe = None
+    if technical is not None:
+        probe = lambda reader: technical.update(read_technical_metadata(reader, file_path))
 
-        return sha256.hexdigest()
+    try:
+        hash_file(file_path, hashers + list(extra_hashers), strategy, block_size, probe)
+        return {a: h.hexdigest() for a, h in zip(algorithms, hashers)}
 
     except Exception as e:
         scan_warnings.append({"level": "ERROR", "file": file_path, "issue": f"Checksum failed: {e}"})
+        return {}
+
+def generate_checksum(file_path, block_size=None, strategy=None):
+    return generate_checksums(file_path, ("sha256",), block_size, strategy).get("sha256", "")
+
+
+class HashingWriter:
+    """Text file writer that hashes the UTF-8 bytes as they are written.
+
+    Lets generated files (metadata CSVs) get their checksums without being
+    read back from disk. Newlines are not translated, as with newline="".
+    """
+
+    def __init__(self, path, algorithms=("sha256",)):
+        self._file = open(path, "wb")
+        self.algorithms = tuple(algorithms)
+        self._hashers = [new_hasher(a) for a in self.algorithms]
+
+    def write(self, text):
+        data = text.encode("utf-8")
+        self._file.write(data)
+        for h in self._hashers:
+            h.update(data)
+        return len(text)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def checksums(self):
+        """{algorithm: hex digest} of everything written so far."""
+        return {a: h.hexdigest() for a, h in zip(self.algorithms, self._hashers)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ==================================================
+# Header-only technical metadata
+# Dimensions, bit depth, colour space, compression, ICC profile and page
+# count come from the TIFF IFDs, JPEG SOF/APP segments, PNG chunks and PDF
+# cross-reference data. The first bytes are handed over by the hashing read;
+# anything further in is a small read on the same open file.
+# ==================================================
+TECHNICAL_COLUMNS = ["pixelWidth", "pixelHeight", "bitDepth", "colourSpace", "compression", "iccProfileName", "pageCount"]
+TECHNICAL_EXTENSIONS = (".tif", ".tiff", ".jpg", ".jpeg", ".png", ".pdf", ".dng", ".nef", ".cr2", ".arw", ".orf", ".rw2")
+TIFF_MAX_IFDS = 10000       # Page chains longer than this are assumed corrupt
+
+TIFF_COMPRESSION = {
+    1: "Uncompressed", 2: "CCITT RLE", 3: "CCITT Group 3", 4: "CCITT Group 4", 5: "LZW",
+    6: "JPEG (old-style)", 7: "JPEG", 8: "Deflate", 32773: "PackBits", 32946: "Deflate",
+    34712: "JPEG 2000", 34713: "NEF compressed", 34892: "Lossy JPEG", 34887: "LERC",
+    50000: "ZSTD", 50001: "WebP",
+}
+TIFF_PHOTOMETRIC = {
+    0: "Grayscale", 1: "Grayscale", 2: "RGB", 3: "Palette", 4: "Transparency mask", 5: "CMYK",
+    6: "YCbCr", 8: "CIELab", 9: "ICCLab", 10: "ITULab", 32803: "CFA (raw)", 34892: "Linear raw",
+}
+# TIFF field type: (struct format, size in bytes)
+TIFF_TYPES = {
+    1: ("B", 1), 2: ("s", 1), 3: ("H", 2), 4: ("I", 4), 5: ("II", 8), 6: ("b", 1), 7: ("s", 1),
+    8: ("h", 2), 9: ("i", 4), 10: ("ii", 8), 11: ("f", 4), 12: ("d", 8), 13: ("I", 4),
+    16: ("Q", 8), 17: ("q", 8), 18: ("Q", 8),
+}
+TIFF_TAG_NEW_SUBFILE_TYPE, TIFF_TAG_SUBIFDS, TIFF_TAG_ICC = 254, 330, 34675
+TIFF_TAGS_USED = {254, 256, 257, 258, 259, 262, 277, 330}
+
+JPEG_SOF = {0xC0: "JPEG baseline", 0xC1: "JPEG extended", 0xC2: "JPEG progressive", 0xC3: "JPEG lossless"}
+JPEG_SOF.update({m: "JPEG" for m in (0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF)})
+PNG_COLOUR_TYPES = {0: "Grayscale", 2: "RGB", 3: "Palette", 4: "Grayscale + alpha", 6: "RGB + alpha"}
+
+def _icc_profile_name(reader, offset=0):
+    """Profile description ('desc' tag) of an ICC profile starting at offset."""
+    header = reader.read(offset, 132)
+    if len(header) < 132 or header[36:40] != b"acsp":
         return ""
+    count = min(struct.unpack(">I", header[128:132])[0], 256)
+    table = reader.read(offset + 132, count * 12)
+    for i in range(len(table) // 12):
+        sig, tag_offset, tag_size = struct.unpack(">4sII", table[i * 12:i * 12 + 12])
+        if sig != b"desc":
+            continue
+        data = reader.read(offset + tag_offset, min(tag_size, 4096))
+        if data[:4] == b"desc":
+            n = struct.unpack(">I", data[8:12])[0]
+            return data[12:12 + n].split(b"\0")[0].decode("latin-1").strip()
+        if data[:4] == b"mluc" and struct.unpack(">I", data[8:12])[0]:
+            length, text_offset = struct.unpack(">II", data[20:28])
+            return data[text_offset:text_offset + length].decode("utf-16-be", "replace").strip("\0 ")
+        if data[:4] == b"text":
+            return data[8:].split(b"\0")[0].decode("latin-1").strip()
+    return ""
+
+def _tiff_ifd(reader, bo, big, offset):
+    """({tag: values}, next IFD offset) for the IFD at offset, keeping only TIFF_TAGS_USED."""
+    count_fmt, entry_size, ptr_fmt = ("Q", 20, "Q") if big else ("H", 12, "I")
+    count_size, ptr_size = struct.calcsize(count_fmt), struct.calcsize(ptr_fmt)
+    count = struct.unpack(bo + count_fmt, reader.read(offset, count_size))[0]
+    if count > 4096:
+        raise ValueError(f"implausible IFD entry count {count}")
+    raw = reader.read(offset + count_size, count * entry_size + ptr_size)
+    tags = {}
+    for i in range(count):
+        entry = raw[i * entry_size:(i + 1) * entry_size]
+        tag, typ = struct.unpack(bo + "HH", entry[:4])
+        if tag not in TIFF_TAGS_USED and tag != TIFF_TAG_ICC:
+            continue
+        n = struct.unpack(bo + ptr_fmt, entry[4:4 + ptr_size])[0]
+        fmt, size = TIFF_TYPES.get(typ, ("s", 1))
+        field = entry[4 + ptr_size:]
+        inline = size * n <= ptr_size
+        if tag == TIFF_TAG_ICC:
+            tags[tag] = None if inline else struct.unpack(bo + ptr_fmt, field)[0]
+            continue
+        data = field[:size * n] if inline else reader.read(struct.unpack(bo + ptr_fmt, field)[0], min(size * n, 65536))
+        if fmt != "s":
+            n = len(data) // size
+            data = struct.unpack(f"{bo}{n * len(fmt)}{fmt[0]}", data[:n * size])
+        tags[tag] = data
+    tail = raw[count * entry_size:count * entry_size + ptr_size]
+    next_offset = struct.unpack(bo + ptr_fmt, tail)[0] if len(tail) == ptr_size else 0
+    return tags, next_offset
+
+def _tiff_technical(reader):
+    head = reader.read(0, 16)
+    bo = {b"II": "<", b"MM": ">"}.get(head[:2])
+    if bo is None or len(head) < 16:
+        return None
+    magic = struct.unpack(bo + "H", head[2:4])[0]
+    if magic == 43:                                   # BigTIFF
+        big, offset = True, struct.unpack(bo + "Q", head[8:16])[0]
+    elif magic in (42, 0x4F52, 0x5352, 0x55):         # TIFF, Olympus ORF, Panasonic RW2
+        big, offset = False, struct.unpack(bo + "I", head[4:8])[0]
+    else:
+        return None
+
+    # Main chain = pages; SubIFDs hold full-size raw data in DNG/NEF/ARW
+    ifds, pages, seen = [], 0, set()
+    while offset and offset not in seen and len(seen) < TIFF_MAX_IFDS:
+        seen.add(offset)
+        tags, offset = _tiff_ifd(reader, bo, big, offset)
+        reduced = tags.get(TIFF_TAG_NEW_SUBFILE_TYPE, (0,))[0] & 1
+        pages += not reduced
+        if len(ifds) < 8:
+            ifds.append(tags)
+            for sub in tags.get(TIFF_TAG_SUBIFDS, ())[:8]:
+                if sub not in seen:
+                    seen.add(sub)
+                    ifds.append(_tiff_ifd(reader, bo, big, sub)[0])
+    if not ifds:
+        return None
+    full = [t for t in ifds if not t.get(TIFF_TAG_NEW_SUBFILE_TYPE, (0,))[0] & 1 and 256 in t]
+    primary = full[0] if full else ifds[0]
+
+    bits = primary.get(258, (1,))
+    compression = primary.get(259, (1,))[0]
+    photometric = primary.get(262, (None,))[0]
+    icc = primary.get(TIFF_TAG_ICC, ifds[0].get(TIFF_TAG_ICC))
+    return {
+        "pixelWidth": primary.get(256, ("",))[0],
+        "pixelHeight": primary.get(257, ("",))[0],
+        "bitDepth": bits[0] if len(set(bits)) == 1 else ",".join(map(str, bits)),
+        "colourSpace": TIFF_PHOTOMETRIC.get(photometric, "" if photometric is None else str(photometric)),
+        "compression": TIFF_COMPRESSION.get(compression, str(compression)),
+        "iccProfileName": _icc_profile_name(reader, icc) if icc else "",
+        "pageCount": max(pages, 1),
+    }
+
+def _jpeg_technical(reader):
+    if reader.read(0, 2) != b"\xff\xd8":
+        return None
+    pos, icc_chunks, adobe_transform = 2, {}, None
+    while pos < reader.size:
+        marker = reader.read(pos, 4)
+        if len(marker) < 4 or marker[0] != 0xFF:
+            return None
+        code = marker[1]
+        if code == 0xFF:                              # Fill byte
+            pos += 1
+            continue
+        if code == 0x01 or 0xD0 <= code <= 0xD8:      # Markers without a length
+            pos += 2
+            continue
+        length = struct.unpack(">H", marker[2:4])[0]
+        if code in JPEG_SOF:
+            precision, height, width, components = struct.unpack(">BHHB", reader.read(pos + 4, 6))
+            if components == 1:
+                colour = "Grayscale"
+            elif components == 3:
+                colour = "RGB" if adobe_transform == 0 else "YCbCr"
+            elif components == 4:
+                colour = "YCCK" if adobe_transform == 2 else "CMYK"
+            else:
+                colour = str(components)
+            icc = b"".join(icc_chunks[k] for k in sorted(icc_chunks))
+            return {
+                "pixelWidth": width, "pixelHeight": height, "bitDepth": precision,
+                "colourSpace": colour, "compression": JPEG_SOF[code],
+                "iccProfileName": _icc_profile_name(HeaderReader(None, len(icc), icc)) if icc else "",
+                "pageCount": 1,
+            }
+        if code == 0xE2:
+            segment = reader.read(pos + 4, length - 2)
+            if segment.startswith(b"ICC_PROFILE\0") and len(segment) > 14:
+                icc_chunks[segment[12]] = segment[14:]
+        elif code == 0xEE:
+            segment = reader.read(pos + 4, 12)
+            if segment.startswith(b"Adobe") and len(segment) == 12:
+                adobe_transform = segment[11]
+        elif code in (0xDA, 0xD9):                    # Scan data or EOI before any frame header
+            return None
+        pos += 2 + length
+    return None
+
+def _png_technical(reader):
+    if reader.read(0, 8) != b"\x89PNG\r\n\x1a\n":
+        return None
+    info, pos = {}, 8
+    while pos + 8 <= reader.size:
+        length, chunk = struct.unpack(">I4s", reader.read(pos, 8))
+        if chunk == b"IHDR":
+            width, height, depth, colour = struct.unpack(">IIBB", reader.read(pos + 8, 10))
+            info.update(pixelWidth=width, pixelHeight=height, bitDepth=depth,
+                        colourSpace=PNG_COLOUR_TYPES.get(colour, str(colour)),
+                        compression="Deflate", iccProfileName="", pageCount=1)
+        elif chunk == b"iCCP":
+            info["iccProfileName"] = reader.read(pos + 8, min(length, 80)).split(b"\0")[0].decode("latin-1")
+        elif chunk == b"acTL":                        # Animated PNG
+            info["pageCount"] = struct.unpack(">I", reader.read(pos + 8, 4))[0]
+        elif chunk in (b"IDAT", b"IEND"):
+            break
+        pos += 12 + length
+    return info or None
+
+# ----- PDF: page count from the cross-reference data, never the page content -----
+PDF_XREF_SCAN = 64 * 1024
+_PDF_REF = rb"\s+(\d+)\s+\d+\s+R"
+
+def _pdf_dict_value(data, key, pattern=rb"\s*(\d+)"):
+    m = re.search(re.escape(key) + pattern, data)
+    return int(m.group(1)) if m else None
+
+def _pdf_unpredict(data, columns, predictor):
+    """Undo PNG predictors (Predictor >= 10) on an xref or object stream."""
+    if predictor < 10:
+        return data
+    rows, prev, stride = [], bytearray(columns), columns + 1
+    for start in range(0, len(data) - columns, stride):
+        kind, row = data[start], bytearray(data[start + 1:start + stride])
+        for i in range(columns):
+            left = row[i - 1] if i else 0
+            if kind == 1:
+                row[i] = (row[i] + left) & 0xFF
+            elif kind == 2:
+                row[i] = (row[i] + prev[i]) & 0xFF
+            elif kind == 3:
+                row[i] = (row[i] + ((left + prev[i]) >> 1)) & 0xFF
+            elif kind == 4:
+                up_left = prev[i - 1] if i else 0
+                p = left + prev[i] - up_left
+                pa, pb, pc = abs(p - left), abs(p - prev[i]), abs(p - up_left)
+                row[i] = (row[i] + (left if pa <= pb and pa <= pc else prev[i] if pb <= pc else up_left)) & 0xFF
+        rows.append(bytes(row))
+        prev = row
+    return b"".join(rows)
+
+def _pdf_stream(reader, offset):
+    """(dictionary bytes, decoded stream bytes) of the stream object at offset."""
+    head = reader.read(offset, 4096)
+    start = head.find(b"stream")
+    if start < 0:
+        raise ValueError("stream keyword not found")
+    dictionary = head[:start]
+    start += 6
+    start += 2 if head[start:start + 2] == b"\r\n" else 1
+    length = _pdf_dict_value(dictionary, b"/Length", rb"\s*(\d+)(?!\s+\d+\s+R)")
+    if length is None:                                # Indirect /Length: look for endstream instead
+        data = reader.read(offset + start, PDF_XREF_SCAN * 16)
+        length = data.find(b"endstream")
+    data = reader.read(offset + start, length)
+    if b"/FlateDecode" in dictionary:
+        data = zlib.decompress(data)
+    columns = _pdf_dict_value(dictionary, b"/Columns") or 1
+    return dictionary, _pdf_unpredict(data, columns, _pdf_dict_value(dictionary, b"/Predictor") or 1)
+
+def _pdf_xref_section(reader, offset, entries):
+    """Add one cross-reference section's entries (newest wins) and return its trailer dictionary."""
+    if reader.read(offset, 32).lstrip().startswith(b"xref"):
+        data, pos = b"", offset
+        while b"trailer" not in data and pos < reader.size:
+            data += reader.read(pos, PDF_XREF_SCAN)
+            pos += PDF_XREF_SCAN
+        table, _, trailer = data.partition(b"trailer")
+        tokens = table.split()[1:]
+        i = 0
+        while i + 1 < len(tokens):
+            first, count = int(tokens[i]), int(tokens[i + 1])
+            i += 2
+            for k in range(count):
+                if tokens[i + 2:i + 3] == [b"n"]:
+                    entries.setdefault(first + k, (1, int(tokens[i]), 0))
+                else:
+                    entries.setdefault(first + k, (0, 0, 0))
+                i += 3
+        return trailer.split(b"startxref")[0]
+
+    dictionary, data = _pdf_stream(reader, offset)
+    widths = [int(w) for w in re.search(rb"/W\s*\[([^\]]*)\]", dictionary).group(1).split()]
+    index = re.search(rb"/Index\s*\[([^\]]*)\]", dictionary)
+    if index:
+        index = [int(v) for v in index.group(1).split()]
+    else:
+        index = [0, _pdf_dict_value(dictionary, b"/Size")]
+    row, pos = sum(widths), 0
+    for first, count in zip(index[::2], index[1::2]):
+        for k in range(count):
+            fields, field_pos = [], pos
+            for w in widths:
+                fields.append(int.from_bytes(data[field_pos:field_pos + w], "big") if w else None)
+                field_pos += w
+            kind = 1 if fields[0] is None else fields[0]
+            entries.setdefault(first + k, (kind, fields[1] or 0, fields[2] or 0))
+            pos += row
+    return dictionary
+
+def _pdf_object(reader, entries, number):
+    """Body of indirect object number, from the file or from its object stream."""
+    kind, a, b = entries.get(number, (0, 0, 0))
+    if kind == 1:
+        return reader.read(a, 4096).split(b"endobj")[0]
+    if kind == 2:
+        dictionary, data = _pdf_stream(reader, entries[a][1])
+        first = _pdf_dict_value(dictionary, b"/First")
+        pairs = data[:first].split()
+        offsets = {int(pairs[i]): int(pairs[i + 1]) for i in range(0, len(pairs) - 1, 2)}
+        start = first + offsets[number]
+        later = [o for o in offsets.values() if o > offsets[number]]
+        return data[start:first + min(later)] if later else data[start:]
+    raise ValueError(f"object {number} not in cross-reference data")
+
+def _pdf_technical(reader):
+    if b"%PDF-" not in reader.read(0, 1024):
+        return None
+    tail = reader.read(max(0, reader.size - 2048), 2048)
+    at = tail.rfind(b"startxref")
+    if at < 0:
+        return None
+    offset, entries, root, seen = int(tail[at + 9:].split()[0]), {}, None, set()
+    while offset is not None and offset not in seen:
+        seen.add(offset)
+        trailer = _pdf_xref_section(reader, offset, entries)
+        hybrid = _pdf_dict_value(trailer, b"/XRefStm")
+        if hybrid is not None and hybrid not in seen:
+            seen.add(hybrid)
+            _pdf_xref_section(reader, hybrid, entries)
+        root = root or _pdf_dict_value(trailer, b"/Root", _PDF_REF)
+        offset = _pdf_dict_value(trailer, b"/Prev")
+    pages = _pdf_dict_value(_pdf_object(reader, entries, root), b"/Pages", _PDF_REF)
+    count = _pdf_dict_value(_pdf_object(reader, entries, pages), b"/Count")
+    return {"pageCount": count if count is not None else ""}
+
+def read_technical_metadata(reader, file_path=""):
+    """Technical metadata columns for the file behind reader, or {} when it is not a supported format.
+
+    The format is identified from its signature, not its extension.
+    Unreadable headers add a scan warning and leave the columns blank.
+    """
+    if not file_path.lower().endswith(TECHNICAL_EXTENSIONS):
+        return {}
+    try:
+        for parse in (_tiff_technical, _jpeg_technical, _png_technical, _pdf_technical):
+            info = parse(reader)
+            if info:
+                return {c: str(info[c]) for c in TECHNICAL_COLUMNS if c in info}
+    except (struct.error, ValueError, KeyError, IndexError, TypeError, AttributeError, zlib.error, OSError) as e:
+        scan_warnings.append({"level": "WARN", "file": file_path, "issue": f"Technical metadata unreadable: {e}"})
+        return {}
+    scan_warnings.append({"level": "WARN", "file": file_path, "issue": "Technical metadata unreadable: unrecognised file header"})
+    return {}
+
+def read_technical_metadata_file(file_path):
+    """read_technical_metadata for a file that is not being hashed (header reads only)."""
+    try:
+        with open(file_path, "rb", buffering=0) as f:
+            size = os.fstat(f.fileno()).st_size
+            return read_technical_metadata(HeaderReader(f, size, f.read(min(size, 4096))), file_path)
+    except OSError as e:
+        scan_warnings.append({"level": "WARN", "file": file_path, "issue": f"Technical metadata unreadable: {e}"})
+        return {}
+
+# ==================================================
+# Streaming Excel export — openpyxl write-only mode
+# ==================================================
+EXCEL_MAX_ROWS = 1048576  # Excel's row limit, including the header row
+
+# _excel_sheet_name and write_xlsx_streaming are kept identical to the copies in
+# MacOS/tiff_folder_scanner_macos.py; each script ships on its own
+def _excel_sheet_name(label, used):
+    """Valid, unique sheet name (max 31 chars, no []:*?/\\)."""
+    clean = re.sub(r"[\[\]:*?/\\]", "_", str(label)).strip("'")[:31] or "Sheet"
+    name, n = clean, 2
+    while name.lower() in used:
+        suffix = f" ({n})"
+        name = clean[:31 - len(suffix)] + suffix
+        n += 1
+    used.add(name.lower())
+    return name
+
+def write_xlsx_streaming(path, df, split_column=None, max_rows=EXCEL_MAX_ROWS, sheet="inventory"):
+    """Write df to an .xlsx file row by row without building the workbook in memory.
+
+    With split_column, each value gets its own sheet, otherwise everything goes
+    on sheet; any sheet that reaches max_rows continues on a new sheet.
+    Returns the sheet names written.
+    """
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def cell(v):
+        if v is None or (not isinstance(v, str) and pd.isna(v)):
+            return None
+        return ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v
+
+    if split_column in df.columns and df[split_column].nunique(dropna=False) > 1:
+        groups = [
+            ("(blank)" if pd.isna(key) else key, group)
+            for key, group in df.groupby(split_column, sort=True, dropna=False)
+        ]
+    else:
+        groups = [(sheet, df)]
+
+    wb = Workbook(write_only=True)
+    header = [str(c) for c in df.columns]
+    used, sheet_names = set(), []
+    for label, group in groups:
+        ws = None
+        for i, row in enumerate(group.itertuples(index=False, name=None)):
+            if i % (max_rows - 1) == 0:
+                ws = wb.create_sheet(_excel_sheet_name(label, used))
+                sheet_names.append(ws.title)
+                ws.append(header)
+            ws.append([cell(v) for v in row])
+        if ws is None:
+            ws = wb.create_sheet(_excel_sheet_name(label, used))
+            sheet_names.append(ws.title)
+            ws.append(header)
+    wb.save(path)
+    return sheet_names
 
 # ==================================================
 # Hybrid date extraction
@@ -370,33 +1012,2478 @@ def getDateCreated(path):
         return ""
 
 # ==================================================
-# Deterministic documentId generator for image/assets
+# Normalized inventory rows — file-level facts per file, collection-level
+# metadata once per collection, joined when a DataFrame is built
+# ==================================================
+INVENTORY_ROW_COLUMNS = [
+    # DwC Simple Multimedia Extension standard fields
+    "identifier", "type", "format", "title", "description", "created",
+    "creator", "contributor", "publisher", "audience", "source", "license",
+    "rightsHolder", "references",
+    # System / archival fields
+    "scanType", "documentId", "institutionCode", "collectionCode", "institutionName",
+    "holdingInstitution", "additionalNames", "subject", "fileName", "fullPath",
+    "relativePath", "assetCategory", "scanModeApplied",
+] + list(CHECKSUM_COLUMNS.values()) + ["dateCreated"]
+
+FILE_RECORD_COLUMNS = (
+    "type", "format", "title", "description", "created", "documentId",
+    "fileName", "fullPath", "relativePath", "assetCategory",
+)
+
+
+class FileRecord:
+    """File-level facts for one inventory row.
+
+    Everything shared by a collection (rights, creator, mapping columns, ...)
+    is stored once per collection and joined in records_to_frame(). overrides
+    holds the few per-row exceptions to the collection values.
+    """
+
+    __slots__ = ("collection",) + FILE_RECORD_COLUMNS + ("checksums", "size", "overrides")
+
+    def __init__(self, collection, type, format, title, description, created, documentId,
+                 fileName, fullPath, relativePath, assetCategory, checksums, size=0, overrides=None):
+        self.collection = collection
+        self.type = type
+        self.format = format
+        self.title = title
+        self.description = description
+        self.created = created
+        self.documentId = documentId
+        self.fileName = fileName
+        self.fullPath = fullPath
+        self.relativePath = relativePath
+        self.assetCategory = assetCategory
+        self.checksums = checksums
+        self.size = size
+        self.overrides = overrides
+
+
+def records_to_frame(records, collections, checksum_columns=("checksumSHA256",)):
+    """Join FileRecords with their collection metadata into full inventory rows.
+
+    File-level columns win over collection columns of the same name, as the
+    per-row mapping copy did before.
+    """
+    if not records:
+        return pd.DataFrame()
+    data = {col: [getattr(r, col) for r in records] for col in FILE_RECORD_COLUMNS}
+    data["dateCreated"] = data["created"]
+    for col in checksum_columns:
+        data[col] = [r.checksums.get(col, "") for r in records]
+    file_df = pd.DataFrame(data)
+    file_df["_collection"] = pd.Categorical([r.collection for r in records])
+
+    meta_df = pd.DataFrame.from_dict(
+        {key: collections[key] for key in file_df["_collection"].cat.categories}, orient="index"
+    )
+    meta_df = meta_df[[c for c in meta_df.columns if c not in file_df.columns]]
+    df = file_df.join(meta_df, on="_collection").drop(columns="_collection")
+
+    overrides = {}
+    for i, r in enumerate(records):
+        if r.overrides:
+            for col, value in r.overrides.items():
+                overrides.setdefault(col, {})[i] = value
+    for col, values in overrides.items():
+        values = pd.Series(values, dtype="object")
+        if col in df.columns:
+            df[col] = df[col].astype("object")
+            df.loc[values.index, col] = values
+        else:
+            df[col] = values
+
+    ordered = [c for c in INVENTORY_ROW_COLUMNS if c in df.columns]
+    return df[ordered + [c for c in df.columns if c not in ordered]]
+
+# ==================================================
+# Persistent master key index — dedup and description lookups cost
+# O(new rows) instead of rebuilding key sets from the whole master
+# ==================================================
+class MasterKeyIndex(MasterIndexStore):
+    """(documentId, scanType) → row number and description in the latest LA master CSV.
+
+    The index records which master file it describes; it is rebuilt only when
+    that no longer matches the newest master, and otherwise extended with each
+    run's appended rows.
+    """
+
+    def __init__(self, path):
+        super().__init__(path, """
+            CREATE TABLE IF NOT EXISTS master_keys (
+                documentId  TEXT NOT NULL,
+                scanType    TEXT NOT NULL,
+                rowNumber   INTEGER NOT NULL,
+                description TEXT,
+                PRIMARY KEY (documentId, scanType)
+            ) WITHOUT ROWID;
+        """)
+
+    def _insert(self, df, start_row):
+        if df.empty:
+            return
+        cols = [df[c].fillna("").astype(str) if c in df.columns else pd.Series("", index=df.index)
+                for c in ("documentId", "scanType", "description")]
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO master_keys (documentId, scanType, rowNumber, description) VALUES (?, ?, ?, ?)",
+            zip(cols[0], cols[1], range(start_row, start_row + len(df)), cols[2]),
+        )
+
+    def rebuild(self, master_df, master_name):
+        with self.conn:
+            self.conn.execute("DELETE FROM master_keys")
+            self._insert(master_df, 0)
+            self._set_meta(master_name, len(master_df))
+
+    def append(self, new_rows_df, start_row, master_name):
+        with self.conn:
+            self._insert(new_rows_df, start_row)
+            self._set_meta(master_name, start_row + len(new_rows_df))
+
+    def known(self, keys):
+        """For each (documentId, scanType) pair, whether it is already in the master."""
+        keys = [(str(d), str(t)) for d, t in keys]
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming (pos INTEGER, documentId TEXT, scanType TEXT)")
+            self.conn.execute("DELETE FROM incoming")
+            self.conn.executemany("INSERT INTO incoming VALUES (?, ?, ?)", ((i, d, t) for i, (d, t) in enumerate(keys)))
+            hits = {pos for (pos,) in self.conn.execute(
+                "SELECT i.pos FROM incoming i JOIN master_keys m ON m.documentId = i.documentId AND m.scanType = i.scanType"
+            )}
+        return [i in hits for i in range(len(keys))]
+
+    def descriptions(self, doc_ids):
+        """documentId → non-empty description already recorded in the master (its latest row)."""
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS incoming_ids (documentId TEXT PRIMARY KEY)")
+            self.conn.execute("DELETE FROM incoming_ids")
+            self.conn.executemany("INSERT OR IGNORE INTO incoming_ids VALUES (?)", ((str(d),) for d in doc_ids))
+            # SQLite takes the bare description column from the row holding MAX(rowNumber)
+            return {doc_id: description for doc_id, description, _ in self.conn.execute(
+                "SELECT m.documentId, m.description, MAX(m.rowNumber) FROM incoming_ids i "
+                "JOIN master_keys m ON m.documentId = i.documentId "
+                "WHERE TRIM(m.description) != '' GROUP BY m.documentId"
+            )}
+
+# ==================================================
+# Change-feed directory walk
+# ==================================================
+def load_dir_state(state_path):
+    """Load the change-feed state for one scanType ({collectionKey: {...}})."""
+    if not os.path.isfile(state_path):
+        return {}
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        scan_warnings.append({"level": "WARN", "file": state_path, "issue": f"Change-feed state unreadable, full walk forced: {e}"})
+        return {}
+
+def scan_type_slug(scan_type):
+    return re.sub(r'[^A-Za-z0-9]+', '_', scan_type).strip('_').lower()
+
+def dir_state_file(output_folder, scan_type):
+    return os.path.join(output_folder, STATE_FOLDER, f"dir_state_{scan_type_slug(scan_type)}.json")
+
+def save_dir_state(state_path, state):
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+    tmp_path = state_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, state_path)
+
+def walk_changed(top, base, prev_dirs, new_dirs, rules, full_walk=False, hits=None):
+    """Walk top like os.walk, but only list directories whose mtime changed.
+
+    Yields (dirpath, files, prev_files) where both map file name → [size, mtime_ns]
+    for files kept by rules (WalkRules); folders they exclude are not entered.
+    For an unchanged directory the file names and subdirectories come from
+    prev_dirs instead of a listing, so it costs a single stat and files is
+    prev_files. The collection's derivatives folder is skipped. Every visited
+    directory is recorded in new_dirs, keyed by its path relative to base, as
+    {"mtime", "entries", "subdirs", "files"}.
+    hits, if a Counter, counts (rule, is_dir) for every entry a rule decided.
+    A directory that cannot be read keeps its prev_dirs entry (and its known
+    subdirectories are still visited), so a transient error on a share is not
+    reported as removed files.
+    """
+    stack = [top]
+    while stack:
+        d = stack.pop()
+        key = os.path.relpath(d, base)
+        prefix = "" if d == top else os.path.relpath(d, top).replace(os.sep, "/") + "/"
+        prev = prev_dirs.get(key)
+        try:
+            mtime = os.stat(d).st_mtime_ns
+        except OSError as e:
+            scan_warnings.append({"level": "WARN", "file": d, "issue": f"Directory stat failed: {e}"})
+            if prev is not None:
+                new_dirs[key] = prev
+                stack.extend(os.path.join(d, sd) for sd in reversed(prev["subdirs"]))
+                yield d, prev["files"], prev["files"]
+            continue
+
+        if prev is not None and not full_walk and prev.get("mtime") == mtime:
+            new_dirs[key] = prev
+            stack.extend(os.path.join(d, sd) for sd in reversed(prev["subdirs"]))
+            yield d, prev["files"], prev["files"]
+            continue
+
+        subdirs, file_stats, entries = [], {}, 0
+        try:
+            with os.scandir(d) as it:
+                for entry in it:
+                    entries += 1
+                    try:
+                        is_dir = entry.is_dir(follow_symlinks=False)
+                        if is_dir and d == top and entry.name == DERIVATIVES_FOLDER:
+                            continue
+                        keep, rule = rules.match(prefix + entry.name, is_dir)
+                        if rule is not None and hits is not None:
+                            hits[rule, is_dir] += 1
+                        if not keep:
+                            continue
+                        if is_dir:
+                            subdirs.append(entry.name)
+                            continue
+                        st = entry.stat()
+                        file_stats[entry.name] = [st.st_size, st.st_mtime_ns]
+                    except OSError as e:
+                        scan_warnings.append({"level": "WARN", "file": entry.path, "issue": f"Stat failed: {e}"})
+                        if prev is not None and entry.name in prev["files"]:
+                            file_stats[entry.name] = prev["files"][entry.name]
+        except OSError as e:
+            scan_warnings.append({"level": "WARN", "file": d, "issue": f"Directory listing failed: {e}"})
+            if prev is not None:
+                new_dirs[key] = prev
+                stack.extend(os.path.join(d, sd) for sd in reversed(prev["subdirs"]))
+                yield d, prev["files"], prev["files"]
+            continue
+
+        subdirs.sort()
+        new_dirs[key] = {"mtime": mtime, "entries": entries, "subdirs": subdirs, "files": file_stats}
+        stack.extend(os.path.join(d, sd) for sd in reversed(subdirs))
+        yield d, file_stats, (prev or {}).get("files", {})
+
+def diff_dir_state(prev_dirs, new_dirs):
+    """Compare two directory states → list of (change, relativePath, size)."""
+    delta = []
+    for key, entry in new_dirs.items():
+        prev = prev_dirs.get(key)
+        if prev is entry:
+            continue
+        prev_files = prev["files"] if prev is not None else {}
+        for name, stat in entry["files"].items():
+            rel = os.path.join(key, name)
+            if name not in prev_files:
+                delta.append(("added", rel, stat[0]))
+            elif list(prev_files[name]) != list(stat):
+                delta.append(("modified", rel, stat[0]))
+        for name, stat in prev_files.items():
+            if name not in entry["files"]:
+                delta.append(("removed", os.path.join(key, name), stat[0]))
+    for key, prev in prev_dirs.items():
+        if key not in new_dirs:
+            for name, stat in prev["files"].items():
+                delta.append(("removed", os.path.join(key, name), stat[0]))
+    return delta
+
+def estimate_collection_totals(collection_root, coll_state, extensions, rules):
+    """Return (files, bytes) expected for a collection.
+
+    Uses the change-feed state when it was recorded with the same file filter
+    and walk rules, otherwise falls back to a stat-only walk.
+    """
+    files = total = 0
+    if coll_state_current(coll_state, extensions, rules) and coll_state.get("dirs"):
+        for entry in coll_state["dirs"].values():
+            files += len(entry["files"])
+            total += sum(st[0] for st in entry["files"].values())
+        return files, total
+    for _, file_stats, _ in walk_changed(collection_root, collection_root, {}, {}, rules):
+        files += len(file_stats)
+        total += sum(st[0] for st in file_stats.values())
+    return files, total
+
+def coll_state_current(coll_state, extensions, rules):
+    """Whether a collection's change-feed listing was made with this file filter and these walk rules."""
+    return coll_state.get("extensions") == list(extensions) and coll_state.get("rules") == rules.signature
+
+# ==================================================
+# Progress aggregator — thread-safe counters published by scan workers
+# ==================================================
+def _format_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024:
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+    return f"{n:.1f} TB"
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    h, rem = divmod(seconds, 3600)
+    m, s = divmod(rem, 60)
+    return f"{h}h {m:02d}m" if h else f"{m}m {s:02d}s"
+
+
+class ProgressAggregator:
+    """Counters shared between scan workers and progress views.
+
+    Workers call publish() once per file; views call snapshot() on their own
+    schedule, so the scan never waits on a repaint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.monotonic()
+        self.files_total = 0
+        self.bytes_total = 0
+        self.files_done = 0
+        self.bytes_done = 0
+        self.collection = ""
+        self.current_file = ""
+
+    def start(self):
+        """Reset the clock used for bytes/s and ETA."""
+        with self._lock:
+            self.started = time.monotonic()
+
+    def add_totals(self, files, nbytes):
+        with self._lock:
+            self.files_total += files
+            self.bytes_total += nbytes
+
+    def publish(self, filename, collection, nbytes=0):
+        with self._lock:
+            self.files_done += 1
+            self.bytes_done += nbytes
+            self.collection = collection
+            self.current_file = filename
+
+    def snapshot(self):
+        with self._lock:
+            elapsed = max(time.monotonic() - self.started, 1e-6)
+            snap = {
+                "collection": self.collection,
+                "currentFile": self.current_file,
+                "filesDone": self.files_done,
+                "filesTotal": self.files_total,
+                "bytesDone": self.bytes_done,
+                "bytesTotal": self.bytes_total,
+                "elapsedSeconds": round(elapsed, 1),
+            }
+        snap["bytesPerSecond"] = round(snap["bytesDone"] / elapsed)
+        if snap["bytesTotal"] and snap["bytesDone"]:
+            remaining = max(snap["bytesTotal"] - snap["bytesDone"], 0)
+            snap["etaSeconds"] = round(remaining / max(snap["bytesPerSecond"], 1))
+        elif snap["filesTotal"] and snap["filesDone"]:
+            remaining = max(snap["filesTotal"] - snap["filesDone"], 0)
+            snap["etaSeconds"] = round(remaining * elapsed / snap["filesDone"])
+        else:
+            snap["etaSeconds"] = None
+        return snap
+
+
+def format_progress(snap):
+    """Two display lines (current file, counters) for a progress snapshot."""
+    line = f"[{snap['collection']}]  {snap['currentFile']}" if snap["currentFile"] else "Starting scan…"
+    counts = f"{snap['filesDone']:,}"
+    if snap["filesTotal"]:
+        counts += f" / {snap['filesTotal']:,}"
+    detail = (
+        f"{counts} file(s) · {_format_bytes(snap['bytesDone'])} · "
+        f"{_format_bytes(snap['bytesPerSecond'])}/s"
+    )
+    if snap["etaSeconds"] is not None:
+        detail += f" · ETA {_format_duration(snap['etaSeconds'])}"
+    return line, detail
+
+def write_progress_status(path, snap):
+    """Write a progress snapshot as JSON for external monitoring."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(dict(snap, updated=datetime.now().isoformat(timespec="seconds")), f)
+    os.replace(tmp_path, path)
+
+# ==================================================
+# Append-only inventories — per-run deltas, manifest, compaction, retention
+# ==================================================
+INVENTORY_MANIFEST = "inventory_manifest.json"
+INVENTORY_MODES = ["Full snapshot each run", "Append-only deltas"]
+SNAPSHOT_PREFIX = {"la": "digital_asset_inventory_la_", "atom": "digital_asset_inventory_atom_"}
+DELTA_PREFIX = {"la": "digital_asset_delta_la_", "atom": "digital_asset_delta_atom_"}
+COMPACT_AFTER_DELTAS = 20   # Deltas since the last snapshot before a run compacts automatically
+SNAPSHOT_RETENTION = 5      # Snapshots kept once the same run's delta can rebuild the view
+
+def _run_id(file_name, prefix):
+    return file_name[len(prefix):-len(".csv")]
+
+def load_manifest(output_folder):
+    """Inventory manifest: {"version", "runs": [{"run", "la": {...}, "atom": {...}}]} in run order.
+
+    Each kind of a run records a "delta" file (rows added by that run), a
+    "snapshot" file (the full view after that run), or both once compacted.
+    The first time it is loaded, existing full inventories are recorded as
+    snapshots; an unreadable manifest is rebuilt from the snapshot and delta
+    files on disk.
+    """
+    path = os.path.join(output_folder, INVENTORY_MANIFEST)
+    if os.path.isfile(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            scan_warnings.append({"level": "WARN", "file": path, "issue": f"Inventory manifest unreadable, rebuilt from the inventory files: {e}"})
+    runs = {}
+    files = os.listdir(output_folder) if os.path.isdir(output_folder) else []
+    for role, prefixes in (("snapshot", SNAPSHOT_PREFIX), ("delta", DELTA_PREFIX)):
+        for kind, prefix in prefixes.items():
+            for f in files:
+                if f.startswith(prefix) and f.endswith(".csv"):
+                    runs.setdefault(_run_id(f, prefix), {}).setdefault(kind, {})[role] = f
+    return {"version": 1, "runs": [dict(entry, run=run) for run, entry in sorted(runs.items())]}
+
+def save_manifest(output_folder, manifest):
+    path = os.path.join(output_folder, INVENTORY_MANIFEST)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, path)
+
+def record_inventory_file(manifest, run, kind, role, file_name, rows):
+    """Record a run's delta or snapshot file for kind ("la"/"atom")."""
+    entry = next((r for r in manifest["runs"] if r["run"] == run), None)
+    if entry is None:
+        entry = {"run": run}
+        manifest["runs"].append(entry)
+        manifest["runs"].sort(key=lambda r: r["run"])
+    entry.setdefault(kind, {})[role] = file_name
+    entry[kind][f"{role}Rows"] = int(rows)
+
+def inventory_chain(manifest, kind, upto=None):
+    """(snapshot file or None, [delta files]) that rebuild the view of kind as of run upto.
+
+    Walks back from upto to the nearest snapshot; runs without an entry for kind
+    did not change it.
+    """
+    deltas = []
+    for entry in reversed(manifest["runs"]):
+        if upto is not None and entry["run"] > upto:
+            continue
+        files = entry.get(kind) or {}
+        if files.get("snapshot"):
+            return files["snapshot"], deltas[::-1]
+        if files.get("delta"):
+            deltas.append(files["delta"])
+    return None, deltas[::-1]
+
+def dedupe_atom_inventory(atom_df):
+    """Latest row per item (digitalObjectPath + scanType) and per parent (legacyId), in row order."""
+    if "digitalObjectPath" not in atom_df.columns or "scanType" not in atom_df.columns:
+        return atom_df
+    atom_df = atom_df.reset_index(drop=True)
+    item_mask = atom_df["levelOfDescription"] == "Item"
+    items_deduped = atom_df[item_mask].drop_duplicates(subset=["digitalObjectPath", "scanType"], keep="last")
+    parents_deduped = atom_df[~item_mask].drop_duplicates(subset=["legacyId"], keep="last")
+    # Rebuild interleaved order: parent then its items, in original row order
+    return pd.concat([parents_deduped, items_deduped]).sort_index().reset_index(drop=True)
+
+def read_inventory_view(output_folder, manifest, kind, upto=None):
+    """Full inventory of kind as of run upto (latest when None) and the name of its last file."""
+    base, deltas = inventory_chain(manifest, kind, upto)
+    names = ([base] if base else []) + deltas
+    frames = [pd.read_csv(os.path.join(output_folder, f), dtype=dict.fromkeys(TECHNICAL_COLUMNS + [PHASH_COLUMN], str)) for f in names]
+    if not frames:
+        return pd.DataFrame(), ""
+    if len(frames) == 1:
+        return frames[0], names[-1]
+    view = pd.concat(frames, ignore_index=True)
+    # Column order of the newest file, then any columns only older files carry
+    latest = list(frames[-1].columns)
+    view = view[latest + [c for c in view.columns if c not in latest]]
+    if kind == "atom":
+        view = dedupe_atom_inventory(view)
+    return view, names[-1]
+
+def compact_inventory(output_folder, manifest, kind):
+    """Fold the deltas since the last snapshot into a snapshot at the latest run."""
+    base, deltas = inventory_chain(manifest, kind)
+    if not deltas:
+        return None
+    view, last_delta = read_inventory_view(output_folder, manifest, kind)
+    run = _run_id(last_delta, DELTA_PREFIX[kind])
+    snapshot = f"{SNAPSHOT_PREFIX[kind]}{run}.csv"
+    view.to_csv(os.path.join(output_folder, snapshot), index=False, encoding='utf-8', lineterminator='\n')
+    record_inventory_file(manifest, run, kind, "snapshot", snapshot, len(view))
+    print(f"Compacted {len(deltas)} {kind.upper()} delta(s) into {snapshot} ({len(view)} rows)")
+    return snapshot
+
+def apply_snapshot_retention(output_folder, manifest, keep=SNAPSHOT_RETENTION):
+    """Delete all but the newest keep snapshots of each kind.
+
+    Only snapshots whose run also has a delta are removed, so every run's view
+    stays reconstructable from an earlier snapshot and the deltas.
+    """
+    removed = []
+    for kind in SNAPSHOT_PREFIX:
+        snapshots = [r[kind] for r in manifest["runs"] if (r.get(kind) or {}).get("snapshot")]
+        for files in snapshots[:max(len(snapshots) - keep, 0)]:
+            if not files.get("delta"):
+                continue
+            try:
+                os.remove(os.path.join(output_folder, files["snapshot"]))
+            except FileNotFoundError:
+                pass
+            removed.append(files.pop("snapshot"))
+            files.pop("snapshotRows", None)
+    for name in removed:
+        print(f"Retention: removed snapshot {name}")
+    return removed
+
+def deltas_since_snapshot(manifest, kind):
+    return len(inventory_chain(manifest, kind)[1])
+
+# ==================================================
+# Queryable inventory index — the LA master in SQLite for lookups by
+# documentId, checksum, path or collection without loading the CSV
+# ==================================================
+INVENTORY_INDEX_FILE = "inventory_index.sqlite"
+INVENTORY_INDEX_COLUMNS = [
+    "documentId", "scanType", "institutionCode", "collectionCode", "assetCategory", "title",
+    "fileName", "relativePath", "fullPath", "format", "dateCreated", "checksumSHA256",
+]
+INVENTORY_INDEXES = {
+    "idx_inventory_document_id": "documentId",
+    "idx_inventory_checksum": "checksumSHA256",
+    "idx_inventory_relative_path": "relativePath",
+    "idx_inventory_collection": "institutionCode, collectionCode, scanType",
+}
+
+class InventoryIndex(MasterIndexStore):
+    """Every row of the LA master, indexed for the query subcommand.
+
+    Kept in step with the master the same way as MasterKeyIndex: extended with
+    each run's new rows, rebuilt when it no longer describes the latest master.
+    """
+
+    def __init__(self, path):
+        columns = ", ".join(f"{c} TEXT" for c in INVENTORY_INDEX_COLUMNS)
+        super().__init__(path, f"""
+            CREATE TABLE IF NOT EXISTS inventory (rowNumber INTEGER PRIMARY KEY, {columns});
+        """, wal=True)
+        self._create_indexes()
+
+    def _create_indexes(self):
+        for name, columns in INVENTORY_INDEXES.items():
+            self.conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON inventory ({columns})")
+
+    def _insert(self, df, start_row):
+        if df.empty:
+            return
+        cols = [df[c].fillna("").astype(str) if c in df.columns else pd.Series("", index=df.index)
+                for c in INVENTORY_INDEX_COLUMNS]
+        placeholders = ", ".join("?" * (len(cols) + 1))
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO inventory (rowNumber, {', '.join(INVENTORY_INDEX_COLUMNS)}) VALUES ({placeholders})",
+            zip(range(start_row, start_row + len(df)), *cols),
+        )
+
+    def rebuild(self, master_df, master_name):
+        # Bulk load without the secondary indexes, then build them once
+        with self.conn:
+            for name in INVENTORY_INDEXES:
+                self.conn.execute(f"DROP INDEX IF EXISTS {name}")
+            self.conn.execute("DELETE FROM inventory")
+            self._insert(master_df, 0)
+            self._create_indexes()
+            self._set_meta(master_name, len(master_df))
+
+    def append(self, new_rows_df, start_row, master_name):
+        with self.conn:
+            self._insert(new_rows_df, start_row)
+            self._set_meta(master_name, start_row + len(new_rows_df))
+
+    def query(self, document_id=None, checksum=None, path=None, institution=None, collection=None,
+              scan_type=None, limit=None):
+        """Rows matching every given filter, in master order. path matches as a prefix
+        of relativePath, with either path separator."""
+        where, params = [], []
+        for column, value in (("documentId", document_id), ("checksumSHA256", checksum and checksum.lower()),
+                              ("institutionCode", institution), ("collectionCode", collection), ("scanType", scan_type)):
+            if value is not None:
+                where.append(f"{column} = ?")
+                params.append(value)
+        if path is not None:
+            prefixes = {path.replace("/", "\\"), path.replace("\\", "/")}
+            where.append("(" + " OR ".join("(relativePath >= ? AND relativePath < ?)" for _ in prefixes) + ")")
+            for prefix in prefixes:
+                params += [prefix, prefix + "\U0010ffff"]
+        sql = f"SELECT {', '.join(INVENTORY_INDEX_COLUMNS)} FROM inventory"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY rowNumber"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return self.conn.execute(sql, params).fetchall()
+
+# ==================================================
+# Darwin Core Archive export — multimedia inventory streamed into one
+# zip per institution or collection
+# ==================================================
+DWCA_FOLDER = "dwca"
+DWCA_CHUNK_ROWS = 50000   # Master rows read per chunk
+DWCA_QUEUE_SIZE = 4       # Chunks buffered per writer thread
+DWCA_MULTIMEDIA_TERMS = [
+    "identifier", "type", "format", "title", "description", "created",
+    "creator", "contributor", "publisher", "audience", "source", "license",
+    "rightsHolder", "references",
+]
+DWCA_FIELD_CLEAN = str.maketrans({"\t": " ", "\r": " ", "\n": " "})
+DWCA_META_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<archive xmlns="http://rs.tdwg.org/dwc/text/" metadata="eml.xml">
+  <core encoding="UTF-8" fieldsTerminatedBy="\\t" linesTerminatedBy="\\n" fieldsEnclosedBy="" ignoreHeaderLines="1" rowType="http://rs.gbif.org/terms/1.0/Multimedia">
+    <files>
+      <location>multimedia.txt</location>
+    </files>
+    <id index="0"/>
+{fields}
+  </core>
+</archive>
+"""
+DWCA_EML_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<eml:eml xmlns:eml="eml://ecoinformatics.org/eml-2.1.1" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" xsi:schemaLocation="eml://ecoinformatics.org/eml-2.1.1 http://rs.gbif.org/schema/eml-gbif-profile/1.1/eml.xsd" packageId="{package_id}" system="http://gbif.org" scope="system" xml:lang="en">
+  <dataset>
+    <title xml:lang="en">{title}</title>
+    <creator>
+      <organizationName>{organization}</organizationName>
+    </creator>
+    <metadataProvider>
+      <organizationName>{organization}</organizationName>
+    </metadataProvider>
+    <pubDate>{pub_date}</pubDate>
+    <language>en</language>
+    <abstract>
+      <para>{abstract}</para>
+    </abstract>
+    <intellectualRights>
+      <para>{rights}</para>
+    </intellectualRights>
+    <contact>
+      <organizationName>{organization}</organizationName>
+    </contact>
+  </dataset>
+</eml:eml>
+"""
+
+
+# DwC type per MIME type, for masters that do not keep the type term
+DWC_TYPE_BY_MIME = {MIME_TYPE_MAP[ext]: dwc_type for ext, dwc_type in DWC_TYPE_MAP.items() if ext in MIME_TYPE_MAP}
+
+
+def _iso_created(value):
+    """EXIF "YYYY:MM:DD HH:MM:SS" → ISO 8601; other values unchanged."""
+    if len(value) >= 19 and value[4] == ":" and value[7] == ":" and value[10] == " ":
+        return f"{value[:4]}-{value[5:7]}-{value[8:10]}T{value[11:]}"
+    return value
+
+
+def to_dwc_multimedia(chunk):
+    """DwC Simple Multimedia columns (id first) for a chunk of LA master rows.
+
+    Terms the master does not keep are derived: type from the MIME type,
+    created from dateCreated, audience from the asset category. Columns are
+    plain object arrays; element access on pandas string arrays is far slower.
+    """
+    def column(name):
+        if name in chunk.columns:
+            return pd.Series(chunk[name].fillna("").astype(str).to_numpy(dtype=object), index=chunk.index, dtype="object")
+        return pd.Series("", index=chunk.index, dtype="object")
+
+    out = pd.DataFrame({"id": column("documentId")}, dtype="object")
+    for term in DWCA_MULTIMEDIA_TERMS:
+        out[term] = column(term)
+    categories = column("assetCategory")
+    audiences = {c: AUDIENCE_MAP.get(c.replace("_metadata", "").lower(), AUDIENCE_FALLBACK) for c in categories.unique()}
+    derived = {
+        "identifier": out["id"],
+        "type": column("format").map(lambda mime: DWC_TYPE_BY_MIME.get(mime, "")),
+        "created": pd.Series([_iso_created(v) for v in column("dateCreated")], index=chunk.index, dtype="object"),
+        "publisher": column("holdingInstitution"),
+        "audience": categories.map(audiences.get),
+    }
+    for term, values in derived.items():
+        out[term] = out[term].where(out[term] != "", values).astype("object")
+    # Tabs and line breaks would split fields in the unquoted text file
+    for col in out.columns:
+        joined = "".join(out[col].values)
+        if "\t" in joined or "\n" in joined or "\r" in joined:
+            out[col] = pd.Series([v.translate(DWCA_FIELD_CLEAN) for v in out[col].values], index=out.index, dtype="object")
+    return out
+
+
+def dwc_lines(dwc_rows):
+    """multimedia.txt lines (newline-terminated) for to_dwc_multimedia output, built column-wise."""
+    columns = [dwc_rows[col].to_numpy(dtype=object) for col in dwc_rows.columns]
+    lines = columns[0]
+    for values in columns[1:]:
+        lines = lines + "\t" + values
+    return lines + "\n"
+
+
+class DwcaArchiveWriter:
+    """One DwC-A zip: multimedia.txt is compressed as rows arrive, meta.xml and eml.xml on close."""
+
+    def __init__(self, path, label, info):
+        self.path = path
+        self.label = label
+        self.info = info   # institutionCode, holdingInstitution, license, rightsHolder of the first row
+        self.rows = 0
+        self.zf = zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED)
+        entry = zipfile.ZipInfo("multimedia.txt", date_time=datetime.now().timetuple()[:6])
+        entry.compress_type = zipfile.ZIP_DEFLATED
+        self.stream = self.zf.open(entry, "w", force_zip64=True)
+        self.stream.write(("\t".join(["id"] + DWCA_MULTIMEDIA_TERMS) + "\n").encode("utf-8"))
+
+    def write(self, text, rows):
+        self.stream.write(text.encode("utf-8"))
+        self.rows += rows
+
+    def close(self):
+        self.stream.close()
+        fields = "\n".join(
+            f'    <field index="{i}" term="http://purl.org/dc/terms/{term}"/>'
+            for i, term in enumerate(DWCA_MULTIMEDIA_TERMS, start=1)
+        )
+        self.zf.writestr("meta.xml", DWCA_META_XML.format(fields=fields))
+        organization = self.info.get("holdingInstitution") or self.info.get("institutionCode", "")
+        rights = self.info.get("license", "")
+        if self.info.get("rightsHolder"):
+            rights = f"{rights} — {self.info['rightsHolder']}" if rights else self.info["rightsHolder"]
+        self.zf.writestr("eml.xml", DWCA_EML_XML.format(
+            package_id=xml_escape(os.path.splitext(os.path.basename(self.path))[0]),
+            title=xml_escape(f"{organization} — {self.label} digital assets"),
+            organization=xml_escape(organization),
+            pub_date=datetime.now().strftime("%Y-%m-%d"),
+            abstract=xml_escape(f"Multimedia inventory of {self.rows} digitised asset(s) for {self.label}, "
+                                f"generated by the SANSCA Digital Asset Metadata Sheet Generator."),
+            rights=xml_escape(rights),
+        ))
+        self.zf.close()
+
+
+def export_dwca(sources, out_folder, by="collection", scan_type=None, workers=4, chunk_rows=DWCA_CHUNK_ROWS):
+    """Stream LA master CSV files (in order) into one DwC-A zip per institution or collection.
+
+    Each chunk is converted to text once and split by archive; writer threads,
+    each owning a fixed share of the archives, compress in parallel. Memory is
+    bounded by the queued chunks. Only one
+    scanType is exported (each file appears once); metadata CSV rows are left out.
+    Returns ({archive path: row count}, scanType exported).
+    """
+    os.makedirs(out_folder, exist_ok=True)
+    key_columns = ["institutionCode"] if by == "institution" else ["institutionCode", "collectionCode"]
+    queues = [queue.Queue(maxsize=DWCA_QUEUE_SIZE) for _ in range(max(workers, 1))]
+    results, errors = {}, []
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+
+    def writer_loop(q):
+        writers = {}
+        try:
+            while True:
+                job = q.get()
+                if job is None:
+                    break
+                key, text, rows, info = job
+                if key not in writers:
+                    label = " / ".join(key)
+                    name = "_".join(re.sub(r"[^A-Za-z0-9-]+", "-", k) for k in key)
+                    writers[key] = DwcaArchiveWriter(os.path.join(out_folder, f"dwca_{name}_{stamp}.zip"), label, info)
+                writers[key].write(text, rows)
+        except Exception as e:
+            errors.append(e)
+            # Keep draining so the reader never blocks on a full queue
+            while q.get() is not None:
+                pass
+        finally:
+            for w in writers.values():
+                w.close()
+                results[w.path] = w.rows
+
+    threads = [threading.Thread(target=writer_loop, args=(q,), name=f"damsg-dwca-{i}", daemon=True)
+               for i, q in enumerate(queues)]
+    for t in threads:
+        t.start()
+    try:
+        for source in sources:
+            for chunk in pd.read_csv(source, chunksize=chunk_rows, dtype=object, keep_default_na=False):
+                if scan_type is None and "scanType" in chunk.columns and len(chunk):
+                    scan_type = chunk["scanType"].iloc[0]
+                if "scanType" in chunk.columns:
+                    chunk = chunk[chunk["scanType"] == scan_type]
+                if "format" in chunk.columns:
+                    chunk = chunk[chunk["format"] != "text/csv"]
+                chunk = chunk.assign(**{c: "" for c in key_columns if c not in chunk.columns})
+                lines = dwc_lines(to_dwc_multimedia(chunk))
+                for key, positions in chunk.groupby(key_columns, sort=False).indices.items():
+                    key = key if isinstance(key, tuple) else (key,)
+                    first = chunk.iloc[positions[0]]
+                    info = {k: first.get(k, "") for k in ("institutionCode", "holdingInstitution", "license", "rightsHolder")}
+                    queues[zlib.crc32("/".join(key).encode("utf-8")) % len(queues)].put(
+                        (key, "".join(lines[positions]), len(positions), info)
+                    )
+                if errors:
+                    # Stop reading every source, not just this one; the finally
+                    # below still shuts the writers down before this propagates
+                    raise errors[0]
+    finally:
+        for q in queues:
+            q.put(None)
+        for t in threads:
+            t.join()
+    if errors:
+        raise errors[0]
+    return results, scan_type
+
+# ==================================================
+# Access derivatives — thumbnails and access JPEGs in derivatives/ beside metadata/
+# ==================================================
+try:
+    import rawpy
+    RAWPY_AVAILABLE = True
+except ImportError:
+    RAWPY_AVAILABLE = False
+
+# Colour-managed CMYK → sRGB needs Pillow built with LittleCMS (the PyPI wheels are)
+try:
+    from PIL import ImageCms
+    SRGB_PROFILE = ImageCms.createProfile("sRGB")
+except ImportError:
+    ImageCms = None
+
+DERIVATIVES_FOLDER = "derivatives"   # Per collection; never scanned as masters
+DERIVATIVE_INDEX_FILE = "derivative_index.json"
+THUMBNAIL_SIZE = 256
+ACCESS_SIZE = 2048
+THUMBNAIL_QUALITY = 80
+ACCESS_QUALITY = 85
+DERIVATIVE_WORKERS = min(4, os.cpu_count() or 1)
+DERIVATIVE_COLUMNS = ["thumbnailPath", "thumbnailSHA256", "accessPath", "accessSHA256"]
+RAW_EXTENSIONS = (".nef", ".cr2", ".cr3", ".arw", ".dng", ".orf", ".rw2")
+# RAW masters need rawpy (LibRaw) for their embedded preview
+DERIVATIVE_EXTENSIONS = (".tif", ".tiff", ".jpg", ".jpeg", ".png") + (RAW_EXTENSIONS if RAWPY_AVAILABLE else ())
+
+
+def derivative_paths(full_path, collection_root):
+    """(thumbnail, access) paths for a master, mirroring its place in the collection."""
+    rel = os.path.relpath(full_path, collection_root)
+    base = os.path.join(collection_root, DERIVATIVES_FOLDER)
+    return os.path.join(base, "thumbnails", rel + ".jpg"), os.path.join(base, "access", rel + ".jpg")
+
+
+def _access_page_path(access_path, page):
+    """Page 1 is the access path itself; later pages of multi-page masters get .p0002.jpg etc."""
+    return access_path if page == 1 else f"{access_path[:-len('.jpg')]}.p{page:04d}.jpg"
+
+
+def _reduced(im, size):
+    """im shrunk by the largest integer factor that keeps its long side at least size.
+
+    Image.reduce() is a box filter over whole pixel blocks, so it is cheap,
+    and the colour conversion and resampling that follow work on the small
+    image instead of the full page.
+    """
+    factor = max(im.size) // size
+    if factor < 2 or im.mode in ("1", "P", "PA"):
+        return im
+    if im.mode.startswith("I;16"):
+        im = im.convert("I")   # reduce() has no 16-bit modes
+    return im.reduce(factor)
+
+
+def _open_pages(path, size=ACCESS_SIZE):
+    """Yield (page number, image) per page, at least size pixels on the long side.
+
+    Only JPEG (and JPEG RAW previews) can decode at reduced size, through
+    draft(). TIFF and PNG pages are decoded at full resolution, once each,
+    and then reduced with Image.reduce().
+    """
+    if path.lower().endswith(RAW_EXTENSIONS):
+        with rawpy.imread(path) as raw:
+            try:
+                thumb = raw.extract_thumb()
+            except (rawpy.LibRawNoThumbnailError, rawpy.LibRawUnsupportedThumbnailError):
+                thumb = None
+            if thumb is not None and thumb.format == rawpy.ThumbFormat.JPEG:
+                im = Image.open(io.BytesIO(thumb.data))
+                im.draft("RGB", (size, size))
+                yield 1, _reduced(im, size)
+            elif thumb is not None:
+                yield 1, _reduced(Image.fromarray(thumb.data), size)
+            else:
+                yield 1, _reduced(Image.fromarray(raw.postprocess(half_size=True)), size)
+        return
+    with Image.open(path) as im:
+        # JPEG decodes straight to the smallest 1/2–1/8 scale still covering the access size
+        im.draft("RGB", (size, size))
+        for page in range(getattr(im, "n_frames", 1)):
+            im.seek(page)
+            yield page + 1, _reduced(im, size)
+
+
+def _to_jpeg_mode(im):
+    if im.mode.startswith("I;16") or im.mode == "I":
+        # Scale 16-bit samples down instead of clipping them to white
+        return im.convert("I").point(lambda v: v * (1 / 256)).convert("L")
+    if im.mode in ("RGB", "L"):
+        return im
+    return im.convert("RGB")
+
+
+def _jpeg_frame(im):
+    """(im in a JPEG mode, the ICC profile to embed with it or None).
+
+    The master's profile is kept only while it still describes the pixels:
+    a greyscale profile on greyscale output, an RGB one on RGB output. A CMYK
+    master with a profile is converted to sRGB through it; any other change
+    of colour space drops the profile, leaving the JPEG untagged (read as sRGB).
+    """
+    icc_profile = im.info.get("icc_profile")
+    frame = _to_jpeg_mode(im)
+    if not icc_profile:
+        return frame, None
+    grey = im.mode in ("1", "L", "LA", "I", "F") or im.mode.startswith("I;16")
+    if (frame.mode == "L") == grey and im.mode not in ("CMYK", "YCbCr", "LAB", "HSV"):
+        return frame, icc_profile
+    if im.mode == "CMYK" and ImageCms is not None:
+        try:
+            source = ImageCms.ImageCmsProfile(io.BytesIO(icc_profile))
+            return ImageCms.profileToProfile(im, source, SRGB_PROFILE, outputMode="RGB"), None
+        except (ImageCms.PyCMSError, OSError, ValueError):
+            pass
+    return frame, None
+
+
+def _save_jpeg(im, path, quality, icc_profile=None):
+    """Write im as a JPEG (atomically) and return the file's SHA-256."""
+    buf = io.BytesIO()
+    im.save(buf, "JPEG", quality=quality, optimize=True, icc_profile=icc_profile)
+    data = buf.getvalue()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return hashlib.sha256(data).hexdigest()
+
+
+def render_derivatives(source, thumb_path, access_path):
+    """Write a thumbnail (first page) and one access JPEG per page of source.
+
+    Each page is decoded once (at reduced size only for JPEG, see
+    _open_pages); the thumbnail is reduced from the page-1 access image. Returns {"thumbnail": sha256, "access": [(path, sha256), ...]}.
+    """
+    result = {"thumbnail": None, "access": []}
+    for page, im in _open_pages(source):
+        frame, icc_profile = _jpeg_frame(im)
+        if frame is im:
+            frame = im.copy()
+        frame.thumbnail((ACCESS_SIZE, ACCESS_SIZE), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        path = _access_page_path(access_path, page)
+        result["access"].append((path, _save_jpeg(frame, path, ACCESS_QUALITY, icc_profile)))
+        if page == 1:
+            frame.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS, reducing_gap=3.0)
+            result["thumbnail"] = _save_jpeg(frame, thumb_path, THUMBNAIL_QUALITY, icc_profile)
+    return result
+
+# ==================================================
+# Perceptual near-duplicates — 64-bit DCT hashes of reduced-size decodes,
+# searched with multi-index Hamming lookups instead of comparing all pairs
+# ==================================================
+PHASH_INDEX_FILE = "perceptual_hashes.sqlite"   # In DAMSG_output/state: checksumSHA256 → perceptual hash
+PHASH_DECODE_SIZE = 256       # JPEGs and RAW previews decode at the smallest scale still covering this
+PHASH_WORKERS = min(4, os.cpu_count() or 1)
+PHASH_EXTENSIONS = DERIVATIVE_EXTENSIONS
+
+# Rows of the 32-point DCT-II; the hash keeps the 8×8 lowest frequencies
+_PHASH_DCT = np.cos(np.pi * np.outer(np.arange(32), 2 * np.arange(32) + 1) / 64)
+
+def perceptual_hash(path):
+    """pHash of a master's first page as 16 hex digits: a 32×32 greyscale
+    reduction, its DCT, and one bit per low frequency above their median."""
+    pages = _open_pages(path, PHASH_DECODE_SIZE)
+    try:
+        _, im = next(pages)
+        frame = _to_jpeg_mode(im).convert("L")
+    finally:
+        pages.close()
+    frame = frame.resize((32, 32), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    low = (_PHASH_DCT @ np.asarray(frame, dtype=np.float64) @ _PHASH_DCT.T)[:8, :8].ravel()
+    bits = low > np.median(low)
+    return f"{int(''.join('1' if b else '0' for b in bits), 2):016x}"
+
+class PerceptualHashStore:
+    """checksumSHA256 → perceptual hash of every image master hashed so far.
+
+    Keyed by content, so a file keeps its hash across renames, moves and
+    storage tiers. The connection is made usable from the output thread
+    that fills it during a scan and the main thread that reports afterwards,
+    one at a time.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS perceptual_hashes (checksum TEXT PRIMARY KEY, phash TEXT NOT NULL) WITHOUT ROWID"
+        )
+
+    def lookup(self, checksums):
+        """{checksum: perceptual hash} for the checksums already hashed."""
+        found = {}
+        checksums = list(set(checksums))
+        for start in range(0, len(checksums), 500):
+            batch = checksums[start:start + 500]
+            found.update(self.conn.execute(
+                f"SELECT checksum, phash FROM perceptual_hashes WHERE checksum IN ({','.join('?' * len(batch))})", batch
+            ))
+        return found
+
+    def add(self, pairs):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO perceptual_hashes (checksum, phash) VALUES (?, ?)", pairs)
+
+    def close(self):
+        self.conn.close()
+
+def compute_perceptual_hashes(jobs, pool, store):
+    """Hash {checksum: full path} on pool (a thread pool) and store the results.
+
+    Returns ({checksum: perceptual hash}, [(full path, error)]).
+    """
+    futures = {pool.submit(perceptual_hash, path): (checksum, path) for checksum, path in jobs.items()}
+    hashed, failed = {}, []
+    for future in concurrent.futures.as_completed(futures):
+        checksum, path = futures[future]
+        try:
+            hashed[checksum] = future.result()
+        except Exception as e:
+            failed.append((path, e))
+    if hashed:
+        store.add(hashed.items())
+    return hashed, failed
+
+# ==================================================
+# Watch mode — filesystem events (watchdog) or change-feed polling,
+# debounced until files stop changing and ingested in bounded batches
 # ==================================================
-def generate_document_id(institution_code,collection_code, base_name, relative_path, length=8):
-    relative_path = relative_path.replace("\\", "/")
-    clean_inst = institution_code.replace("_", "").replace(" ", "")
-    clean_collection = collection_code.replace("_", "").replace(" ", "")
-    clean_base = base_name.replace("_", "").replace(" ", "")
-    h = hashlib.sha1(relative_path.encode("utf-8")).hexdigest()[:length]
-    return f"{clean_inst}{clean_collection}{clean_base}{h}"
+try:
+    from watchdog.observers import Observer
+    from watchdog.events import FileSystemEventHandler
+    WATCHDOG_AVAILABLE = True
+except ImportError:
+    WATCHDOG_AVAILABLE = False
+
+WATCH_SETTLE_SECONDS = 5    # A file is ingested once its size and mtime have been stable this long
+WATCH_POLL_SECONDS = 15     # Change-feed polling interval when watchdog is not installed
+WATCH_BATCH_MAX = 500       # Files per ingest batch; larger bursts are split into several batches
+
+class WatchDebouncer:
+    """Changed paths waiting to settle, shared by the event source and the ingest loop.
+
+    touch() records an event for a path with its current (size, mtime_ns).
+    A path is released by ready() once no event has arrived for `settle`
+    seconds and a fresh stat still matches, so files still being copied by a
+    digitisation station are not hashed half-written.
+    """
+
+    def __init__(self, settle=WATCH_SETTLE_SECONDS, batch_max=WATCH_BATCH_MAX):
+        self.settle = settle
+        self.batch_max = batch_max
+        self._pending = {}   # path → (monotonic time of last event, (size, mtime_ns))
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def touch(self, path):
+        try:
+            st = os.stat(path)
+        except OSError:
+            return
+        with self._lock:
+            self._pending[path] = (time.monotonic(), (st.st_size, st.st_mtime_ns))
+        self._wake.set()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self, timeout):
+        """Sleep until the next event or timeout."""
+        self._wake.wait(timeout)
+        self._wake.clear()
+
+    def ready(self):
+        """Up to batch_max settled files as (path, size), oldest event first."""
+        now = time.monotonic()
+        with self._lock:
+            due = sorted((last, path, sig) for path, (last, sig) in self._pending.items() if now - last >= self.settle)
+        batch = []
+        for last, path, sig in due:
+            if len(batch) >= self.batch_max:
+                break
+            try:
+                st = os.stat(path)
+                current = (st.st_size, st.st_mtime_ns)
+            except OSError:
+                current = None
+            with self._lock:
+                if self._pending.get(path, (None,))[0] != last:
+                    continue                          # A newer event arrived meanwhile
+                if current is None:
+                    del self._pending[path]           # Deleted or moved away before it settled
+                elif current != sig:
+                    self._pending[path] = (now, current)
+                else:
+                    del self._pending[path]
+                    batch.append((path, current[0]))
+        return batch
+
+def watch_wanted(path, collection_root, rules):
+    """Whether an event path is an asset to ingest: a file inside the collection
+    that its walk rules keep, outside its metadata/ and derivatives/ output folders."""
+    rel = os.path.relpath(path, collection_root)
+    if rel.split(os.sep)[0] in ("metadata", DERIVATIVES_FOLDER, ".."):
+        return False
+    return rules.wanted(rel)
+
+if WATCHDOG_AVAILABLE:
+    class WatchEventHandler(FileSystemEventHandler):
+        """Feeds created, modified and moved-in files of one collection to the debouncer."""
+
+        def __init__(self, debouncer, collection_root, rules):
+            super().__init__()
+            self.debouncer = debouncer
+            self.collection_root = collection_root
+            self.rules = rules
+
+        def _touch(self, path):
+            if watch_wanted(path, self.collection_root, self.rules):
+                self.debouncer.touch(path)
+
+        def on_created(self, event):
+            if not event.is_directory:
+                self._touch(event.src_path)
+
+        def on_modified(self, event):
+            if not event.is_directory:
+                self._touch(event.src_path)
+
+        def on_moved(self, event):
+            if not event.is_directory:
+                self._touch(event.dest_path)
+
+class ChangeFeedPoller:
+    """Polling fallback: re-walks each collection with walk_changed, so only
+    directories whose mtime changed since the last poll are listed."""
+
+    def __init__(self, debouncer, collections, base, rules, interval=WATCH_POLL_SECONDS):
+        self.debouncer = debouncer
+        self.collections = collections   # collection root → previous walk state ({dir key: entry})
+        self.base = base
+        self.rules = rules               # collection root → WalkRules
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="damsg-watch-poll", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def join(self):
+        self._thread.join()
+
+    def poll(self):
+        for collection_root, prev_dirs in self.collections.items():
+            new_dirs = {}
+            rules = self.rules[collection_root]
+            for r, file_stats, prev_stats in walk_changed(collection_root, self.base, prev_dirs, new_dirs, rules):
+                if file_stats is prev_stats:
+                    continue
+                for name, stat in file_stats.items():
+                    path = os.path.join(r, name)
+                    if list(prev_stats.get(name, ())) != list(stat) and watch_wanted(path, collection_root, rules):
+                        self.debouncer.touch(path)
+            self.collections[collection_root] = new_dirs
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
 
 # ==================================================
-# Deterministic metadata documentId generator
+# Fixity scrubbing — rate-limited re-verification of master checksums
 # ==================================================
-def generate_metadata_document_id(institution_code, collection_code, category, relative_path, length=8):
-    relative_path = relative_path.replace("\\", "/")
-    clean_inst = institution_code.replace("_", "")
-    clean_collection = collection_code.replace("_", "")
-    clean_category = category.replace("_", "").upper()
-    h = hashlib.sha1(relative_path.encode("utf-8")).hexdigest()[:length]
-    return f"{clean_inst}{clean_collection}METADATAINVENTORY{clean_category}{h}"
+SCRUB_STATE_FILE = "scrub_state.json"     # In DAMSG_output/state: rotating cursor and pass counters
+SCRUB_RATE_MB = 20                        # Default bandwidth cap, MB/s
+SCRUB_SAVE_SECONDS = 30                   # Cursor is saved at least this often
+SCRUB_MASTER_TARGET = "Master inventory"
+
+def load_scrub_state(output_folder):
+    """Scrub cursor and pass counters; an unreadable state file starts a new pass."""
+    path = os.path.join(output_folder, STATE_FOLDER, SCRUB_STATE_FILE)
+    if os.path.isfile(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (ValueError, OSError) as e:
+            print(f"Scrub state unreadable, starting a new pass: {e}")
+    return {"cursor": None, "pass": 1, "passStarted": datetime.now().isoformat(timespec="seconds"),
+            "passFiles": 0, "passBytes": 0, "passMismatches": 0, "passMissing": 0, "lastPassCompleted": None}
+
+def save_scrub_state(output_folder, state):
+    path = os.path.join(output_folder, STATE_FOLDER, SCRUB_STATE_FILE)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    os.replace(path + ".tmp", path)
+
+def scrub_targets(master_df, scan_types=None, root=None):
+    """Master rows to re-verify as a list of (scanType, relativePath, checksumSHA256), in cursor order.
+
+    Metadata CSVs are skipped as in the preservation audit; when a path is
+    listed more than once under a scanType its latest row is used. With
+    root, only rows whose fullPath lies under it are kept: the rows of other
+    scanTypes (a mirror on another drive) share relativePaths with it, and
+    would otherwise be checked against the local files.
+    """
+    df = master_df[master_df["format"] != "text/csv"]
+    if root is not None:
+        prefix = os.path.normcase(os.path.join(os.path.abspath(root), ""))
+        full = df["fullPath"].fillna("").astype(str).map(lambda p: os.path.normcase(os.path.abspath(p)) if p else "")
+        df = df[full.str.startswith(prefix)]
+    df = df[["scanType", "relativePath", "checksumSHA256"]].dropna()
+    if scan_types:
+        df = df[df["scanType"].isin(scan_types)]
+    df = df.drop_duplicates(["scanType", "relativePath"], keep="last").sort_values(["scanType", "relativePath"])
+    return list(df.itertuples(index=False, name=None))
+
+def changed_since_scan(dir_states, scan_type, rel, st):
+    """True if the change-feed state recorded a different size/mtime for rel.
+
+    A file edited since its last scan is a pending rescan, not bit rot.
+    """
+    entry = dir_states.get(scan_type, {}).get(os.path.dirname(rel))
+    recorded = (entry or {}).get("files", {}).get(os.path.basename(rel))
+    return recorded is not None and list(recorded) != [st.st_size, st.st_mtime_ns]
+
+# ==================================================
+# Chunk-level Merkle manifests — chunk hashes per file, rolled up to
+# folder and collection roots, for partial re-verification
+# ==================================================
+MERKLE_FOLDER = "merkle"                  # DAMSG_output/merkle/<scanType>/<category>/<institution>/<collection>.json
+MERKLE_CHUNK_SIZE = 4 * 1024 * 1024       # 4 MiB; a 4 GB TIFF stack has 1,024 chunks
+MERKLE_VERSION = 1
+
+class ChunkHasher:
+    """SHA-256 of every MERKLE_CHUNK_SIZE byte range of a file.
+
+    Sits in hash_file's hasher list, so the chunk hashes come from the same
+    read as the whole-file checksums.
+    """
+
+    def __init__(self, chunk_size=MERKLE_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.chunks = []
+        self._current = hashlib.sha256()
+        self._filled = 0
+
+    def update(self, data):
+        with memoryview(data) as view:
+            offset = 0
+            while offset < len(view):
+                take = min(len(view) - offset, self.chunk_size - self._filled)
+                self._current.update(view[offset:offset + take])
+                self._filled += take
+                offset += take
+                if self._filled == self.chunk_size:
+                    self.chunks.append(self._current.hexdigest())
+                    self._current, self._filled = hashlib.sha256(), 0
+
+    def digests(self):
+        if self._filled or not self.chunks:
+            self.chunks.append(self._current.hexdigest())
+            self._current, self._filled = hashlib.sha256(), 0
+        return self.chunks
+
+def merkle_root(chunks):
+    """Root over a file's chunk hashes. A single-chunk file's root is its SHA-256;
+    inner nodes are SHA-256(0x01 || left || right), an odd node is carried up."""
+    level = [bytes.fromhex(c) for c in chunks] or [hashlib.sha256(b"").digest()]
+    while len(level) > 1:
+        level = [
+            hashlib.sha256(b"\x01" + level[i] + level[i + 1]).digest() if i + 1 < len(level) else level[i]
+            for i in range(0, len(level), 2)
+        ]
+    return level[0].hex()
+
+def merkle_file_chunks(path):
+    """Chunk hashes of path from a read of its own (files the scan did not hash)."""
+    chunks = ChunkHasher()
+    hash_file(path, [chunks])
+    return chunks.digests()
+
+def merkle_manifest_path(output_folder, scan_type, category, institution, collection):
+    return os.path.join(output_folder, MERKLE_FOLDER, scan_type_slug(scan_type), category, institution, f"{collection}.json")
+
+def load_merkle_manifest(path):
+    """The manifest at path, or None if absent, unreadable or built with another chunk size."""
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except Exception as e:
+        scan_warnings.append({"level": "WARN", "file": path, "issue": f"Merkle manifest unreadable, rebuilt: {e}"})
+        return None
+    if manifest.get("version") != MERKLE_VERSION or manifest.get("chunkSize") != MERKLE_CHUNK_SIZE:
+        return None
+    return manifest
+
+def build_merkle_manifest(files, collection, scan_type):
+    """Manifest for one collection from {path relative to the collection ("/"-separated):
+    {"size", "mtime", "chunks"}}. File roots roll up into folder roots, which hash
+    their sorted "D|F name root" lines, and the collection root is that of "".
+    """
+    dirs = {"": {"dirs": set(), "files": set()}}
+    for rel, entry in files.items():
+        entry["root"] = merkle_root(entry["chunks"])
+        parent, _, name = rel.rpartition("/")
+        dirs.setdefault(parent, {"dirs": set(), "files": set()})["files"].add(name)
+        # Link the folder into its parents up to the collection root
+        while parent:
+            grand, _, dname = parent.rpartition("/")
+            node = dirs.setdefault(grand, {"dirs": set(), "files": set()})
+            if dname in node["dirs"]:
+                break
+            node["dirs"].add(dname)
+            parent = grand
+    # Deepest folders first, so every subfolder's root exists before its parent's
+    for key in sorted(dirs, key=lambda k: k.count("/") + bool(k), reverse=True):
+        node = dirs[key]
+        node["dirs"] = sorted(node["dirs"])
+        node["files"] = sorted(node["files"])
+        prefix = f"{key}/" if key else ""
+        lines = [f"D {d} {dirs[prefix + d]['root']}\n" for d in node["dirs"]]
+        lines += [f"F {n} {files[prefix + n]['root']}\n" for n in node["files"]]
+        node["root"] = hashlib.sha256("".join(sorted(lines)).encode("utf-8")).hexdigest()
+    return {
+        "version": MERKLE_VERSION, "algorithm": "sha256", "chunkSize": MERKLE_CHUNK_SIZE,
+        "scanType": scan_type, "collection": collection,
+        "generated": datetime.now().isoformat(timespec="seconds"),
+        "root": dirs[""]["root"], "dirs": dirs, "files": files,
+    }
+
+def save_merkle_manifest(path, manifest):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+def chunk_ranges(indexes, size, chunk_size=MERKLE_CHUNK_SIZE):
+    """Chunk indexes → "start-end" byte ranges (inclusive), adjacent chunks merged."""
+    ranges = []
+    for i in sorted(indexes):
+        start, end = i * chunk_size, min((i + 1) * chunk_size, size) - 1
+        if ranges and ranges[-1][1] + 1 == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ";".join(f"{s}-{e}" for s, e in ranges)
+
+def diff_chunks(expected, actual, expected_size, actual_size):
+    """Byte ranges where two chunk lists of the same file disagree."""
+    differing = [i for i in range(max(len(expected), len(actual)))
+                 if i >= len(expected) or i >= len(actual) or expected[i] != actual[i]]
+    return chunk_ranges(differing, max(expected_size, actual_size))
+
+def merkle_compare(expected, actual):
+    """Differences between two manifests of one collection as (relativePath, issue, byteRanges).
+
+    Only folders whose roots differ are descended into, and only files whose
+    roots differ have their chunk lists compared.
+    """
+    found = []
+    if expected["root"] == actual["root"]:
+        return found
+    stack = [""]
+    while stack:
+        key = stack.pop()
+        prefix = f"{key}/" if key else ""
+        e_node, a_node = expected["dirs"].get(key), actual["dirs"].get(key)
+        if e_node is None or a_node is None or e_node["root"] == a_node["root"]:
+            continue
+        for name in sorted(set(e_node["dirs"]) | set(a_node["dirs"])):
+            rel = prefix + name
+            if name not in a_node["dirs"]:
+                found.append((rel + "/", "folder missing", ""))
+            elif name not in e_node["dirs"]:
+                found.append((rel + "/", "extra folder", ""))
+            else:
+                stack.append(rel)
+        for name in sorted(set(e_node["files"]) | set(a_node["files"])):
+            rel = prefix + name
+            if name not in a_node["files"]:
+                found.append((rel, "missing", ""))
+            elif name not in e_node["files"]:
+                found.append((rel, "extra", ""))
+            else:
+                e_file, a_file = expected["files"][rel], actual["files"][rel]
+                if e_file["root"] != a_file["root"]:
+                    issue = "content differs" if e_file["size"] == a_file["size"] else "size differs"
+                    found.append((rel, issue, diff_chunks(e_file["chunks"], a_file["chunks"], e_file["size"], a_file["size"])))
+    return found
+
+# ==================================================
+# SHA256SUMS.txt interop — seed checksums from SHA256_checksum_tool.bat
+# manifests and write them back per collection
+# ==================================================
+SHA256SUMS_FILE = "SHA256SUMS.txt"
+
+def _sums_key(rel):
+    """Lookup key for a "/"-separated path: case-insensitive where the filesystem is."""
+    return os.path.normcase(rel.replace("/", os.sep))
+
+def _unchanged_since(st, manifest_mtime_ns):
+    """True if a file's content cannot have changed after a manifest written at manifest_mtime_ns.
+
+    The modification time alone is not enough: copies that preserve timestamps
+    (robocopy, cp -p, rsync -a) can replace the content and keep the old one.
+    st_ctime (creation time on Windows, inode change time elsewhere) is set
+    by such a copy, so both must predate the manifest.
+    """
+    return max(st.st_mtime_ns, st.st_ctime_ns) <= manifest_mtime_ns
+
+class Sha256SumsSeeds:
+    """Checksums from the SHA256SUMS.txt manifests of one collection.
+
+    A file's checksum comes from the nearest manifest in its folder or a parent
+    folder within the collection, and only if the file has not been modified
+    or replaced since that manifest was written. Safe to use from several scan workers.
+    """
+
+    def __init__(self, collection_root):
+        self.root = collection_root
+        self.used = 0
+        self._manifests = {}   # folder → (manifest mtime_ns, {key: checksum}) or None
+        self._lock = threading.Lock()
+
+    def _manifest(self, folder):
+        with self._lock:
+            if folder not in self._manifests:
+                path = os.path.join(folder, SHA256SUMS_FILE)
+                manifest = None
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                    manifest = (mtime, {_sums_key(rel): checksum for rel, checksum in read_sha256sums(path)})
+                except FileNotFoundError:
+                    pass
+                except (OSError, UnicodeError) as e:
+                    scan_warnings.append({"level": "WARN", "file": path, "issue": f"SHA256SUMS manifest unreadable, not used: {e}"})
+                self._manifests[folder] = manifest
+            return self._manifests[folder]
+
+    def lookup(self, full):
+        """Seeded SHA-256 for full, or None if no fresh manifest entry covers it."""
+        try:
+            st = os.stat(full)
+        except OSError:
+            return None
+        folder = os.path.dirname(full)
+        while True:
+            manifest = self._manifest(folder)
+            if manifest is not None:
+                checksum = manifest[1].get(_sums_key(os.path.relpath(full, folder)))
+                if checksum is not None:
+                    if not _unchanged_since(st, manifest[0]):
+                        return None   # Modified or replaced after the manifest was written
+                    with self._lock:
+                        self.used += 1
+                    return checksum
+            if os.path.normcase(folder) == os.path.normcase(self.root) or os.path.dirname(folder) == folder:
+                return None
+            folder = os.path.dirname(folder)
+
+def write_sha256sums(collection_root, entries, source):
+    """Write collection_root/SHA256SUMS.txt in SHA256_checksum_tool.bat's layout.
+
+    entries maps "/"-separated paths to SHA-256. Entries of an existing manifest
+    for files not in entries are kept while the file exists and has not been
+    modified or replaced since that manifest was written. Returns the number
+    of lines written.
+    """
+    path = os.path.join(collection_root, SHA256SUMS_FILE)
+    merged = {}
+    keys = {_sums_key(rel) for rel in entries}
+    if os.path.isfile(path):
+        manifest_mtime = os.stat(path).st_mtime_ns
+        for rel, checksum in read_sha256sums(path):
+            if _sums_key(rel) in keys:
+                continue
+            try:
+                if _unchanged_since(os.stat(os.path.join(collection_root, *rel.split("/"))), manifest_mtime):
+                    merged[rel] = checksum
+            except OSError:
+                continue
+    merged.update(entries)
+
+    nl = os.linesep
+    text = (
+        f"# SHA256 checksums{nl}# Folder: {collection_root}{nl}"
+        f"# Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} by DAMSG ({source}){nl}{nl}"
+        + "".join(f"{checksum} *{rel.replace('/', os.sep)}{nl}" for rel, checksum in sorted(merged.items()))
+    )
+    data = text.encode("utf-8")
+    # Folder-level hash of the manifest text so far, as the batch tool appends it
+    data += f"{nl}# Folder-level SHA256 (of this manifest):{nl}# {hashlib.sha256(data).hexdigest()}{nl}".encode("utf-8")
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+    return len(merged)
+
+# ==================================================
+# Scan planner — stat-only dry run: files and bytes a scan would read, its
+# expected duration from measured device throughput, and a work list the scan
+# can start from instead of walking again
+# ==================================================
+SCAN_PLAN_VERSION = 1
+SCAN_PLAN_MAX_AGE_HOURS = 24   # In-place edits since the dry run would go unnoticed; older work lists are refused
+SCAN_PLAN_COLUMNS = ["assetCategory", "institutionCode", "collectionCode", "device", "extension",
+                     "files", "bytes", "filesToRead", "bytesToRead"]
+# (seconds per file, bytes per second) for a device no scan has measured yet
+IO_DEFAULT_COST = {
+    "hdd":     (0.05, 120e6),
+    "ssd":     (0.05, 400e6),
+    "network": (0.10, 60e6),
+}
+
+def load_io_throughput(output_folder):
+    """{device label: {"kind", "workers", "samples", "measured"}} from IO_THROUGHPUT_FILE, {} if absent."""
+    path = os.path.join(output_folder, STATE_FOLDER, IO_THROUGHPUT_FILE)
+    if not os.path.isfile(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        scan_warnings.append({"level": "WARN", "file": path, "issue": f"Device throughput unreadable, defaults used: {e}"})
+        return {}
+
+def record_io_throughput(output_folder, measured):
+    """Add a scan's per-device job samples (DeviceScheduler.throughput) to IO_THROUGHPUT_FILE.
+
+    Earlier samples keep IO_THROUGHPUT_DECAY of their weight, so the cost
+    follows a drive as it fills or moves; a device whose class changed (another
+    disk under the same drive letter) starts over.
+    """
+    known = load_io_throughput(output_folder)
+    for label, m in measured.items():
+        prev = known.get(label, {})
+        samples = m["samples"]
+        if prev.get("kind") == m["kind"]:
+            samples = [p * IO_THROUGHPUT_DECAY + s for p, s in zip(prev["samples"], samples)]
+        known[label] = {"kind": m["kind"], "workers": m["workers"], "samples": samples,
+                        "measured": datetime.now().isoformat(timespec="seconds")}
+    save_dir_state(os.path.join(output_folder, STATE_FOLDER, IO_THROUGHPUT_FILE), known)
+
+def io_cost(samples):
+    """(seconds per file, seconds per byte) of one read job, fitted by least
+    squares to a device's samples [jobs, Σbytes, Σbytes², Σseconds, Σbytes·seconds].
+
+    Falls back to a pure byte rate (or file rate) when the file sizes are too
+    alike to separate the two, or the fit comes out negative.
+    """
+    n, s, ss, t, st = samples
+    det = n * ss - s * s
+    if det > 1e-6 * n * ss:
+        per_byte = (n * st - s * t) / det
+        per_file = (t - per_byte * s) / n
+        if per_file >= 0 and per_byte >= 0:
+            return per_file, per_byte
+    if s:
+        return 0.0, t / s
+    return t / n, 0.0
+
+def list_collections(root_folder):
+    """(category, institution, collection) folders under a SANSCA root, in scan order."""
+    for cat in os.listdir(root_folder):
+        cat_path = os.path.join(root_folder, cat)
+        if cat in EXCLUDED_ROOT_FOLDERS or not os.path.isdir(cat_path):
+            continue
+        for inst in os.listdir(cat_path):
+            inst_path = os.path.join(cat_path, inst)
+            if not os.path.isdir(inst_path):
+                continue
+            for coll in os.listdir(inst_path):
+                if os.path.isdir(os.path.join(inst_path, coll)):
+                    yield cat, inst, coll
+
+def plan_collection(collection_root, base, extensions, rules, coll_state, reread_all=False):
+    """Stat-only walk of one collection → (dirs, {extension: [files, bytes, filesToRead, bytesToRead]}).
+
+    dirs is the listing in change-feed form (walk_changed's new_dirs). Files to
+    read are those new or changed since the scanType's change-feed state, or
+    every file when reread_all (a fast hash audit); unchanged files are assumed
+    to still have their master row.
+    """
+    prev_dirs = coll_state.get("dirs", {}) if coll_state_current(coll_state, extensions, rules) else {}
+    dirs, totals = {}, {}
+    for r, file_stats, _ in walk_changed(collection_root, base, {}, dirs, rules):
+        prev_files = prev_dirs.get(os.path.relpath(r, base), {}).get("files", {})
+        for name, stat in file_stats.items():
+            t = totals.setdefault(os.path.splitext(name)[1].lower(), [0, 0, 0, 0])
+            t[0] += 1
+            t[1] += stat[0]
+            if reread_all or list(prev_files.get(name, ())) != stat:
+                t[2] += 1
+                t[3] += stat[0]
+    return dirs, totals
+
+def summarize_scan_plan(plan):
+    """Fill in the plan's per-device totals and estimatedSeconds from its collections."""
+    for device in plan["devices"].values():
+        device.update(files=0, bytes=0, filesToRead=0, bytesToRead=0, seconds=0.0)
+    for c in plan["collections"].values():
+        device = plan["devices"][c["device"]]
+        for col in ("files", "bytes", "filesToRead", "bytesToRead", "seconds"):
+            device[col] += c[col]
+    # Devices are read in parallel, so the slowest one sets the pace
+    plan["estimatedSeconds"] = max((d["seconds"] for d in plan["devices"].values()), default=0.0)
+    return plan
+
+def build_scan_plan(root_folder, scan_type, file_filter, collections, dir_state, io_overrides, measured, rules_config, reread_all=False):
+    """Dry-run plan for collections [(category, institution, collection)] of root_folder,
+    walked under the walk rules of rules_config.
+
+    Each collection's read time is (files × seconds per file + bytes × seconds
+    per byte) / concurrent reads, with the cost measured on its device by
+    earlier scans (IO_DEFAULT_COST for its class otherwise).
+    """
+    extensions = tuple(FILE_TYPES[file_filter])
+    scheduler = DeviceScheduler(io_overrides)   # Only asked for device classes; never runs a job
+    plan = {
+        "version": SCAN_PLAN_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "root": os.path.abspath(root_folder),
+        "scanType": scan_type,
+        "fileFilter": file_filter,
+        "extensions": list(extensions),
+        "shard": None,
+        "devices": {},
+        "collections": {},
+    }
+    for cat, inst, coll in collections:
+        collection_root = os.path.join(root_folder, cat, inst, coll)
+        key = f"{cat}/{inst}/{coll}"
+        rules = collection_walk_rules(rules_config, key, extensions)
+        dirs, totals = plan_collection(collection_root, root_folder, extensions, rules, dir_state.get(key, {}), reread_all)
+        label, kind, workers = scheduler.device_info(collection_root)
+        if label not in plan["devices"]:
+            known = measured.get(label)
+            if known is not None and known.get("kind") == kind:
+                per_file, per_byte = io_cost(known["samples"])
+            else:
+                per_file, per_byte = IO_DEFAULT_COST[kind][0], 1 / IO_DEFAULT_COST[kind][1]
+                known = None
+            plan["devices"][label] = {"kind": kind, "workers": workers, "measured": known is not None,
+                                      "secondsPerFile": per_file, "secondsPerByte": per_byte}
+        device = plan["devices"][label]
+        read_files = sum(t[2] for t in totals.values())
+        read_bytes = sum(t[3] for t in totals.values())
+        plan["collections"][key] = {
+            "device": label,
+            "files": sum(t[0] for t in totals.values()),
+            "bytes": sum(t[1] for t in totals.values()),
+            "filesToRead": read_files,
+            "bytesToRead": read_bytes,
+            "seconds": (read_files * device["secondsPerFile"] + read_bytes * device["secondsPerByte"]) / device["workers"],
+            "extensions": totals,
+            "rules": rules.signature,
+            "dirs": dirs,
+        }
+    return summarize_scan_plan(plan)
+
+def shard_scan_plan(plan, shards):
+    """Split a plan into shards of whole collections with about equal estimated time
+    (longest collection first, onto the shard with the least time so far)."""
+    parts = [dict(plan, shard=[i + 1, shards], collections={}, devices={}) for i in range(shards)]
+    loads = [0.0] * shards
+    for key, c in sorted(plan["collections"].items(), key=lambda kv: kv[1]["seconds"], reverse=True):
+        i = loads.index(min(loads))
+        loads[i] += c["seconds"]
+        parts[i]["collections"][key] = c
+        parts[i]["devices"][c["device"]] = dict(plan["devices"][c["device"]])
+    return [summarize_scan_plan(p) for p in parts]
+
+def write_scan_plan(plan, base_path):
+    """Write the work list (base_path.json) and its per-extension summary (base_path.csv)."""
+    os.makedirs(os.path.dirname(base_path), exist_ok=True)
+    save_dir_state(base_path + ".json", plan)
+    with open(base_path + ".csv", "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(SCAN_PLAN_COLUMNS)
+        for key, c in plan["collections"].items():
+            for ext, t in sorted(c["extensions"].items()):
+                w.writerow(key.split("/") + [c["device"], ext] + t)
+
+def scan_plan_summary(plan):
+    """Display lines for a plan: totals, one line per device, estimated time."""
+    cols = plan["collections"].values()
+    lines = [
+        f"{len(plan['collections'])} collection(s): {sum(c['files'] for c in cols):,} file(s), "
+        f"{_format_bytes(sum(c['bytes'] for c in cols))}; to read: {sum(c['filesToRead'] for c in cols):,} file(s), "
+        f"{_format_bytes(sum(c['bytesToRead'] for c in cols))}"
+    ]
+    for label, d in plan["devices"].items():
+        lines.append(
+            f"  {label} ({d['kind']}, {d['workers']} concurrent read(s), {'measured' if d['measured'] else 'default'} throughput): "
+            f"{d['filesToRead']:,} file(s), {_format_bytes(d['bytesToRead'])} → ~{_format_duration(d['seconds'])}"
+        )
+    lines.append(f"Estimated read time: ~{_format_duration(plan['estimatedSeconds'])}")
+    return lines
+
+def load_scan_plan(path, root_folder, scan_type, extensions):
+    """A work list written by the dry run, checked against this scan; ValueError says why it does not fit."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            plan = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"unreadable: {e}")
+    if plan.get("version") != SCAN_PLAN_VERSION:
+        raise ValueError(f"written by another version (work list version {plan.get('version')})")
+    if os.path.normcase(plan["root"]) != os.path.normcase(os.path.abspath(root_folder)):
+        raise ValueError(f"planned for {plan['root']}, not {root_folder}")
+    if plan["scanType"] != scan_type:
+        raise ValueError(f"planned for scan type {plan['scanType']}, not {scan_type}")
+    if plan["extensions"] != list(extensions):
+        raise ValueError(f"planned with File Filter {plan['fileFilter']}")
+    age_hours = (datetime.now() - datetime.fromisoformat(plan["created"])).total_seconds() / 3600
+    if age_hours > SCAN_PLAN_MAX_AGE_HOURS:
+        raise ValueError(f"{age_hours:.0f} hours old (limit {SCAN_PLAN_MAX_AGE_HOURS}); run the dry run again")
+    return plan
+
+# ==================================================
+# Command-line subcommands — the GUI runs when none is given
+# ==================================================
+def cmd_benchmark_hash(args):
+    """Time every hashing strategy on each path (file or folder)."""
+    for target in args.paths:
+        if os.path.isdir(target):
+            files = []
+            for r, _, names in os.walk(target):
+                files.extend(os.path.join(r, n) for n in sorted(names) if os.path.splitext(n)[1].lower() in MIME_TYPE_MAP)
+                if len(files) >= args.max_files:
+                    break
+            files = files[:args.max_files]
+        else:
+            files = [target]
+        if not files:
+            print(f"{target}: no files to hash")
+            continue
+        total = sum(os.path.getsize(p) for p in files)
+        network = is_network_path(files[0], os.stat(files[0]).st_dev)
+        auto = choose_hash_strategy(files[0], os.stat(files[0]))
+        print(f"\n{target}")
+        print(f"  {len(files)} file(s), {_format_bytes(total)}, {'network share' if network else 'local disk'}, auto strategy: {auto}")
+
+        # Warm-up pass so the first strategy does not pay for a cold cache alone
+        for p in files:
+            hash_file(p, [hashlib.sha256()], "sequential")
+        digests = {}
+        for strategy in HASH_STRATEGIES:
+            timings = []
+            for _ in range(args.repeat):
+                h = None
+                started = time.perf_counter()
+                for p in files:
+                    h = hashlib.sha256()
+                    hash_file(p, [h], strategy)
+                timings.append(time.perf_counter() - started)
+            digests[strategy] = h.hexdigest()
+            best = min(timings)
+            print(f"  {strategy:<13} {_format_bytes(total / best if best else 0):>10}/s  (best of {args.repeat}: {best:.3f}s)")
+        if len(set(digests.values())) != 1:
+            print("  WARNING: strategies produced different digests")
+            return 1
+    return 0
+
+def _damsg_output_folder(root_folder):
+    output_folder = os.path.join(root_folder, "DAMSG_output")
+    if not os.path.isdir(output_folder):
+        raise SystemExit(f"No DAMSG_output folder under {root_folder}")
+    return output_folder
+
+def cmd_compact(args):
+    """Fold inventory deltas into snapshots and apply snapshot retention."""
+    if args.keep < 1:
+        raise SystemExit("--keep must be at least 1")
+    output_folder = _damsg_output_folder(args.root)
+    manifest = load_manifest(output_folder)
+    for kind in SNAPSHOT_PREFIX:
+        if compact_inventory(output_folder, manifest, kind) is None:
+            print(f"{kind.upper()}: no deltas since the last snapshot")
+    apply_snapshot_retention(output_folder, manifest, args.keep)
+    save_manifest(output_folder, manifest)
+    return 0
+
+def cmd_inventory_view(args):
+    """Write the full inventory as it stood after a past run."""
+    output_folder = _damsg_output_folder(args.root)
+    manifest = load_manifest(output_folder)
+    runs = [r["run"] for r in manifest["runs"]]
+    if not runs:
+        print("No inventory runs recorded")
+        return 1
+    if args.run is None:
+        for entry in manifest["runs"]:
+            kinds = ", ".join(f"{k}: {'+'.join(sorted(r for r in entry[k] if not r.endswith('Rows')))}"
+                              for k in SNAPSHOT_PREFIX if entry.get(k))
+            print(f"{entry['run']}  {kinds}")
+        return 0
+    if args.run not in runs:
+        print(f"Unknown run {args.run}; run without --run to list recorded runs")
+        return 1
+    view, _ = read_inventory_view(output_folder, manifest, args.kind, upto=args.run)
+    out = args.out or os.path.join(output_folder, f"inventory_view_{args.kind}_{args.run}.csv")
+    view.to_csv(out, index=False, encoding='utf-8', lineterminator='\n')
+    print(f"{args.kind.upper()} inventory as of {args.run} ({len(view)} rows): {out}")
+    return 0
+
+def cmd_verify_ids(args):
+    """Report documentIds in the latest LA master that are shared by different files."""
+    output_folder = _damsg_output_folder(args.root)
+    master_df, master_name = read_inventory_view(output_folder, load_manifest(output_folder), "la")
+    if master_df.empty:
+        print("No LA master inventory found")
+        return 1
+    collisions = find_document_id_collisions(master_df)
+    if collisions.empty:
+        print(f"{master_name}: {len(master_df)} rows, no documentId collisions")
+        return 0
+    report_columns = [c for c in ("documentId", "scanType", "institutionCode", "collectionCode", "fileName", "relativePath")
+                      if c in collisions.columns]
+    out = args.out or os.path.join(output_folder, f"document_id_collisions_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    collisions[report_columns].to_csv(out, index=False, encoding='utf-8', lineterminator='\n')
+    print(f"{master_name}: {collisions['documentId'].nunique()} documentId(s) shared by different files "
+          f"({len(collisions)} rows): {out}")
+    return 1
+
+def cmd_query(args):
+    """Look rows up in the inventory index by documentId, checksum, path or collection."""
+    output_folder = _damsg_output_folder(args.root)
+    manifest = load_manifest(output_folder)
+    index = InventoryIndex(os.path.join(output_folder, INVENTORY_INDEX_FILE))
+    try:
+        if args.rebuild:
+            master_df, master_name = read_inventory_view(output_folder, manifest, "la")
+            index.rebuild(master_df, master_name)
+            print(f"Inventory index rebuilt from {master_name or 'no master'} ({len(master_df)} rows)")
+        filters = dict(document_id=args.document_id, checksum=args.checksum, path=args.path,
+                       institution=args.institution, collection=args.collection, scan_type=args.scan_type)
+        if all(v is None for v in filters.values()):
+            if not args.rebuild:
+                print("Give at least one of --document-id, --checksum, --path, --institution, --collection, --scan-type")
+                return 2
+            return 0
+
+        master_name, row_count, updated = index.describes()
+        base, deltas = inventory_chain(manifest, "la")
+        latest = (deltas or [base])[-1]
+        if latest and latest != master_name:
+            print(f"Note: index describes {master_name or 'no master'} but the latest master is {latest}; "
+                  f"rerun with --rebuild", file=sys.stderr)
+
+        started = time.perf_counter()
+        rows = index.query(limit=args.limit, **filters)
+        elapsed = (time.perf_counter() - started) * 1000
+    finally:
+        index.close()
+
+    columns = args.columns.split(",") if args.columns else INVENTORY_INDEX_COLUMNS
+    unknown = [c for c in columns if c not in INVENTORY_INDEX_COLUMNS]
+    if unknown:
+        raise SystemExit(f"Unknown column(s): {', '.join(unknown)}; available: {', '.join(INVENTORY_INDEX_COLUMNS)}")
+    picks = [INVENTORY_INDEX_COLUMNS.index(c) for c in columns]
+    rows = [[row[i] for i in picks] for row in rows]
+    if args.csv:
+        writer = csv.writer(sys.stdout, lineterminator="\n")
+        writer.writerow(columns)
+        writer.writerows(rows)
+    else:
+        widths = [max([len(c)] + [len(r[i]) for r in rows]) for i, c in enumerate(columns)]
+        for line in [columns] + rows:
+            print("  ".join(v.ljust(w) for v, w in zip(line, widths)).rstrip())
+    print(f"{len(rows)} row(s) in {elapsed:.1f} ms", file=sys.stderr)
+    return 0 if rows else 1
+
+def cmd_scrub(args):
+    """Re-verify master checksums in a rotating order, rate-limited and within time windows."""
+    output_folder = _damsg_output_folder(args.root)
+    master_df, master_name = read_inventory_view(output_folder, load_manifest(output_folder), "la")
+    if master_df.empty:
+        print("No LA master inventory found")
+        return 1
+    targets = scrub_targets(master_df, args.scan_type, args.root)
+    del master_df
+    if not targets:
+        print("No files under " + args.root + " to scrub" + (f" for scanType {', '.join(args.scan_type)}" if args.scan_type else ""))
+        return 1
+    keys = [(scan_type, rel) for scan_type, rel, _ in targets]
+    dir_states = {}
+    for scan_type in {t[0] for t in targets}:
+        dir_states[scan_type] = {
+            key: entry
+            for coll in load_dir_state(dir_state_file(output_folder, scan_type)).values()
+            for key, entry in coll.get("dirs", {}).items()
+        }
+
+    state = load_scrub_state(output_folder)
+    run_stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    report_base = os.path.join(output_folder, f"fixity_scrub_{run_stamp}")
+    reports = {}
+
+    def report(kind, row):
+        # Written as found, so an interrupted run keeps what it found
+        if kind not in reports:
+            f = open(f"{report_base}_{kind}.csv", "w", newline="", encoding="utf-8")
+            writer = csv.DictWriter(f, fieldnames=list(row), lineterminator="\n")
+            writer.writeheader()
+            reports[kind] = (f, writer)
+        f, writer = reports[kind]
+        writer.writerow(row)
+        f.flush()
+
+    throttle = ScrubThrottle(args.rate * 1024 * 1024 if args.rate else None, args.iops)
+    started = time.time()
+    budget_end = started + args.hours * 3600 if args.hours else None
+    position = bisect.bisect_right(keys, tuple(state["cursor"])) if state["cursor"] else 0
+    counts = {"files": 0, "bytes": 0, "mismatches": 0, "missing": 0, "changed": 0, "unreadable": 0}
+    last_save = last_report = time.time()
+    processed = 0
+    stop = ""
+    print(f"Scrubbing {len(keys)} file(s) from {master_name}, pass {state['pass']}, "
+          f"{position} done this pass; cap {args.rate or 'unlimited'} MB/s, {args.iops or 'unlimited'} IOPS")
+    try:
+        while not stop:
+            now = datetime.now()
+            window_end = scrub_window_end(args.window, now) if args.window else None
+            if args.window and window_end is None:
+                if not args.continuous:
+                    stop = "scrub window closed" if processed else "outside the scrub windows"
+                    break
+                opens = scrub_window_start(args.window, now)
+                print(f"Waiting for the next scrub window at {datetime.fromtimestamp(opens):%Y-%m-%d %H:%M}")
+                save_scrub_state(output_folder, state)
+                time.sleep(max(opens - time.time(), 1))
+                continue
+            if budget_end is not None and time.time() >= budget_end:
+                stop = "time budget used"
+                break
+            if not args.continuous and processed >= len(keys):
+                stop = "one full pass done"
+                break
+            ends = [t for t in (window_end, budget_end) if t is not None]
+            throttle.deadline = min(ends) if ends else None
+
+            if position >= len(keys):
+                state["lastPassCompleted"] = {
+                    "pass": state["pass"], "started": state["passStarted"],
+                    "completed": datetime.now().isoformat(timespec="seconds"),
+                    "files": state["passFiles"], "bytes": state["passBytes"],
+                    "mismatches": state["passMismatches"], "missing": state["passMissing"],
+                }
+                print(f"Pass {state['pass']} complete: {state['passFiles']} file(s), {_format_bytes(state['passBytes'])}, "
+                      f"{state['passMismatches']} mismatch(es), {state['passMissing']} missing")
+                state.update({"cursor": None, "pass": state["pass"] + 1, "passStarted": datetime.now().isoformat(timespec="seconds"),
+                              "passFiles": 0, "passBytes": 0, "passMismatches": 0, "passMissing": 0})
+                position = 0
+
+            scan_type, rel, expected = targets[position]
+            path = os.path.join(args.root, rel)
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                counts["missing"] += 1
+                state["passMissing"] += 1
+                report("missing", {"Source Storage": scan_type, "Missing From": args.root, "relativePath": rel})
+            except OSError as e:
+                counts["unreadable"] += 1
+                print(f"Unreadable, skipped: {rel}: {e}", file=sys.stderr)
+            else:
+                if changed_since_scan(dir_states, scan_type, rel, st):
+                    counts["changed"] += 1
+                else:
+                    try:
+                        actual = scrub_file(path, st, throttle)
+                    except OSError as e:
+                        counts["unreadable"] += 1
+                        print(f"Unreadable, skipped: {rel}: {e}", file=sys.stderr)
+                    else:
+                        if actual is None:
+                            continue      # Paused: the cursor stays before this file; the loop head decides what to do next
+                        counts["files"] += 1
+                        counts["bytes"] += st.st_size
+                        state["passFiles"] += 1
+                        state["passBytes"] += st.st_size
+                        if actual != expected:
+                            counts["mismatches"] += 1
+                            state["passMismatches"] += 1
+                            report("mismatch", {"Source Storage": scan_type, "Mismatch With": SCRUB_MASTER_TARGET, "relativePath": rel})
+                            print(f"MISMATCH: {scan_type}: {rel}")
+            state["cursor"] = list(keys[position])
+            position += 1
+            processed += 1
+
+            if time.time() - last_save >= SCRUB_SAVE_SECONDS:
+                state["lastRun"] = datetime.now().isoformat(timespec="seconds")
+                save_scrub_state(output_folder, state)
+                last_save = time.time()
+            if time.time() - last_report >= 60:
+                elapsed = time.time() - started
+                print(f"  {counts['files']} file(s), {_format_bytes(counts['bytes'])} at {_format_bytes(counts['bytes'] / elapsed)}/s")
+                last_report = time.time()
+    except KeyboardInterrupt:
+        stop = "interrupted"
+    finally:
+        state["lastRun"] = datetime.now().isoformat(timespec="seconds")
+        save_scrub_state(output_folder, state)
+        for f, _ in reports.values():
+            f.close()
+
+    elapsed = time.time() - started
+    print(
+        f"Scrub stopped ({stop}): {counts['files']} file(s) verified, {_format_bytes(counts['bytes'])} "
+        f"at {_format_bytes(counts['bytes'] / elapsed if elapsed else 0)}/s; {counts['mismatches']} mismatch(es), "
+        f"{counts['missing']} missing, {counts['changed']} changed since their last scan (rescan to update), "
+        f"{counts['unreadable']} unreadable"
+    )
+    for kind in reports:
+        print(f"  {kind.capitalize()} report: {report_base}_{kind}.csv")
+    return 1 if counts["mismatches"] or counts["missing"] else 0
+
+def _merkle_manifests(root_folder, scan_type):
+    """{"category/institution/collection": manifest path} under root_folder for scan_type
+    (or the only scanType with manifests when None)."""
+    base = os.path.join(_damsg_output_folder(root_folder), MERKLE_FOLDER)
+    slugs = sorted(d for d in os.listdir(base) if os.path.isdir(os.path.join(base, d))) if os.path.isdir(base) else []
+    if scan_type is not None:
+        slug = scan_type_slug(scan_type)
+    elif len(slugs) == 1:
+        slug = slugs[0]
+    else:
+        raise SystemExit(f"{root_folder}: give --scan-type; Merkle manifests exist for: {', '.join(slugs) or 'none'}")
+    found = {}
+    for r, _, names in os.walk(os.path.join(base, slug)):
+        for name in names:
+            if name.endswith(".json"):
+                rel = os.path.relpath(os.path.join(r, name[:-5]), os.path.join(base, slug))
+                found[rel.replace(os.sep, "/")] = os.path.join(r, name)
+    return found
+
+def cmd_merkle_verify(args):
+    """Compare Merkle manifests with the files on disk, or with another copy's manifests."""
+    expected_paths = _merkle_manifests(args.root, args.scan_type)
+    if args.collection:
+        expected_paths = {k: v for k, v in expected_paths.items() if k in args.collection}
+    if not expected_paths:
+        print("No Merkle manifests to verify; scan with 'Write chunk-level Merkle manifests' first")
+        return 1
+    against_paths = _merkle_manifests(args.against, args.against_scan_type) if args.against else {}
+
+    findings = []
+    started = time.perf_counter()
+    for collection, path in sorted(expected_paths.items()):
+        expected = load_merkle_manifest(path)
+        if expected is None:
+            print(f"{collection}: manifest unreadable or from another chunk size, skipped")
+            continue
+        if args.against:
+            if collection not in against_paths:
+                findings.append((collection, "", "collection manifest missing on the other copy", ""))
+                print(f"{collection}: no manifest on {args.against}")
+                continue
+            actual = load_merkle_manifest(against_paths[collection])
+            if actual is None:
+                print(f"{collection}: manifest on {args.against} unreadable, skipped")
+                continue
+            label = args.against
+        else:
+            # Re-read the listed files; with --changed-only, files whose size and
+            # modification time still match keep their recorded chunk hashes
+            collection_root = os.path.join(args.root, *collection.split("/"))
+            files, unreadable = {}, set()
+            for key, entry in expected["files"].items():
+                full = os.path.join(collection_root, *key.split("/"))
+                try:
+                    st = os.stat(full)
+                    if args.changed_only and [st.st_size, st.st_mtime_ns] == [entry["size"], entry["mtime"]]:
+                        chunks = entry["chunks"]
+                    else:
+                        chunks = merkle_file_chunks(full)
+                except FileNotFoundError:
+                    continue   # Reported as missing by the comparison
+                except OSError as e:
+                    unreadable.add(key)
+                    findings.append((collection, key, f"unreadable: {e}", ""))
+                    continue
+                files[key] = {"size": st.st_size, "mtime": st.st_mtime_ns, "chunks": chunks}
+            actual = build_merkle_manifest(files, collection, expected["scanType"])
+            label = "disk"
+        differences = [
+            (collection, rel, issue, ranges) for rel, issue, ranges in merkle_compare(expected, actual)
+            if args.against or rel not in unreadable
+        ]
+        findings.extend(differences)
+        if expected["root"] == actual["root"]:
+            print(f"{collection}: root matches {label} ({expected['root'][:16]}…)")
+        else:
+            print(f"{collection}: root differs from {label}; {len(differences)} difference(s)")
+
+    elapsed = time.perf_counter() - started
+    if not findings:
+        print(f"All {len(expected_paths)} collection root(s) verified in {elapsed:.1f}s")
+        return 0
+    out = args.out or os.path.join(_damsg_output_folder(args.root), f"merkle_verify_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    pd.DataFrame(findings, columns=["collection", "relativePath", "issue", "byteRanges"]).to_csv(
+        out, index=False, encoding='utf-8', lineterminator='\n')
+    print(f"{len(findings)} difference(s) in {elapsed:.1f}s: {out}")
+    return 1
+
+def _manifest_side(spec, scan_type, under, encoding, warnings=None):
+    """(records, label, output folder) for a SANSCA root, an LA master CSV or a SHA256SUMS file."""
+    if os.path.isdir(spec):
+        output_folder = _damsg_output_folder(spec)
+        base, deltas = inventory_chain(load_manifest(output_folder), "la")
+        sources = [os.path.join(output_folder, f) for f in ([base] if base else []) + deltas]
+        if not sources:
+            raise SystemExit(f"No LA master inventory under {spec}")
+    elif spec.lower().endswith(".csv"):
+        sources, output_folder = [spec], os.path.dirname(os.path.abspath(spec))
+    else:
+        return read_sha256sums(spec, under or "", encoding, warnings), spec, os.path.dirname(os.path.abspath(spec))
+    if scan_type is None:
+        first = pd.read_csv(sources[0], nrows=1, dtype=object, usecols=["scanType"])
+        scan_type = first["scanType"].iloc[0] if len(first) else ""
+    return read_master_slice(sources, scan_type, under or ""), scan_type, output_folder
+
+def cmd_manifest_diff(args):
+    """Diff two manifests (SHA256SUMS files or master slices) by relativePath."""
+    # Skipped manifest lines stream to their own log, opened before the manifests are read
+    warnings = ScanWarningLog()
+    left, left_label, out_folder = _manifest_side(args.left, args.left_scan_type, args.left_under, args.encoding, warnings)
+    right, right_label, _ = _manifest_side(args.right, args.right_scan_type, args.right_under, args.encoding, warnings)
+    left_label, right_label = args.left_label or left_label, args.right_label or right_label
+    os.makedirs(args.out_dir or out_folder, exist_ok=True)
+    out_base = os.path.join(args.out_dir or out_folder, f"manifest_diff_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    warnings.open(f"{out_base}_warnings.csv")
+    reports = {}
+    headers = {
+        "removed": ("missing", ["Source Storage", "Missing From", "relativePath"]),
+        "added": ("added", ["Source Storage", "Missing From", "relativePath"]),
+        "changed": ("mismatch", ["Source Storage", "Mismatch With", "relativePath"]),
+        "moved": ("moved", ["Source Storage", "Moved In", "relativePath", "newRelativePath"]),
+    }
+    counts = dict.fromkeys(("same", "changed", "removed", "added", "moved"), 0)
+    started = time.perf_counter()
+    try:
+        with tempfile.TemporaryDirectory(prefix="damsg_diff_", dir=args.tmp_dir) as tmp_dir:
+            for kind, rel, _, other in diff_manifests(left, right, tmp_dir):
+                counts[kind] += 1
+                if kind == "same":
+                    continue
+                if kind not in reports:
+                    suffix, header = headers[kind]
+                    f = open(f"{out_base}_{suffix}.csv", "w", newline="", encoding="utf-8")
+                    writer = csv.writer(f, lineterminator="\n")
+                    writer.writerow(header)
+                    reports[kind] = (f, writer)
+                source, target = (right_label, left_label) if kind == "added" else (left_label, right_label)
+                row = [source, target, rel.replace("/", os.sep)]
+                if kind == "moved":
+                    row.append(other.replace("/", os.sep))
+                reports[kind][1].writerow(row)
+    finally:
+        for f, _ in reports.values():
+            f.close()
+        warnings.close()
+
+    summary = {
+        "Source Storage": left_label,
+        "Target Storage": right_label,
+        "Total Source Files": counts["same"] + counts["changed"] + counts["removed"] + counts["moved"],
+        "Matching": counts["same"],
+        "Missing on Target": counts["removed"],
+        "Checksum Mismatch": counts["changed"],
+        "Added on Target": counts["added"],
+        "Moved": counts["moved"],
+    }
+    pd.DataFrame([summary]).to_csv(f"{out_base}_summary.csv", index=False, encoding='utf-8', lineterminator='\n')
+    print(
+        f"{left_label} → {right_label}: {summary['Total Source Files']} file(s); {counts['same']} matching, "
+        f"{counts['changed']} changed, {counts['removed']} removed, {counts['added']} added, {counts['moved']} moved "
+        f"({time.perf_counter() - started:.1f}s)"
+    )
+    print(f"Summary: {out_base}_summary.csv")
+    for kind in reports:
+        print(f"  {kind.capitalize()}: {out_base}_{headers[kind][0]}.csv")
+    if warnings:
+        print(f"  {len(warnings)} manifest line(s) skipped: {warnings.path}")
+    return 1 if reports else 0
+
+def cmd_plan(args):
+    """Dry run: count what a scan would read, estimate its duration and write the work list."""
+    output_folder = os.path.join(args.root, "DAMSG_output")
+    collections = [
+        (cat, inst, coll) for cat, inst, coll in list_collections(args.root)
+        if (not args.institution or inst in args.institution)
+        and (not args.collection or coll in args.collection or f"{cat}/{inst}/{coll}" in args.collection)
+    ]
+    if not collections:
+        print("No collections to plan")
+        return 1
+    plan = build_scan_plan(
+        args.root, args.scan_type, args.file_filter, collections,
+        load_dir_state(dir_state_file(output_folder, args.scan_type)),
+        load_io_overrides(output_folder), load_io_throughput(output_folder), load_walk_rules(output_folder),
+        reread_all=args.checksums == FAST_AUDIT_PROFILE,
+    )
+    base = args.out or os.path.join(output_folder, f"scan_plan_{scan_type_slug(args.scan_type)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+    print("\n".join(scan_plan_summary(plan)))
+    parts = shard_scan_plan(plan, args.shards) if args.shards > 1 else [plan]
+    for part in parts:
+        path = f"{base}_shard{part['shard'][0]}of{part['shard'][1]}" if part["shard"] else base
+        write_scan_plan(part, path)
+        estimate = f" (~{_format_duration(part['estimatedSeconds'])})" if part["shard"] else ""
+        print(f"Work list: {path}.json{estimate}")
+    return 0
+
+def cmd_export_dwca(args):
+    """Export the LA master as Darwin Core Archives, one per institution or collection."""
+    output_folder = _damsg_output_folder(args.root)
+    base, deltas = inventory_chain(load_manifest(output_folder), "la")
+    sources = [os.path.join(output_folder, f) for f in ([base] if base else []) + deltas]
+    if not sources:
+        print("No LA master inventory found")
+        return 1
+    out_folder = args.out_dir or os.path.join(output_folder, DWCA_FOLDER)
+    archives, scan_type = export_dwca(sources, out_folder, args.by, args.scan_type, args.workers)
+    for path, rows in sorted(archives.items()):
+        print(f"  {os.path.basename(path)}: {rows} multimedia row(s)")
+    print(f"{len(archives)} archive(s) for scanType '{scan_type}' written to {out_folder}")
+    return 0 if archives else 1
+
+def cmd_benchmark_derivatives(args):
+    """Time derivative rendering (pages/s) with different worker counts."""
+    files = []
+    for target in args.paths:
+        if os.path.isdir(target):
+            for r, _, names in os.walk(target):
+                files.extend(os.path.join(r, n) for n in sorted(names) if n.lower().endswith(DERIVATIVE_EXTENSIONS))
+        else:
+            files.append(target)
+    files = files[:args.max_files]
+    if not files:
+        print("No image masters to render")
+        return 1
+    total = sum(os.path.getsize(p) for p in files)
+    print(f"{len(files)} master(s), {_format_bytes(total)}; access {ACCESS_SIZE}px, thumbnail {THUMBNAIL_SIZE}px")
+    for workers in args.workers:
+        with tempfile.TemporaryDirectory(prefix="damsg_derivatives_") as out:
+            started = time.perf_counter()
+            with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+                results = list(pool.map(
+                    lambda ip: render_derivatives(ip[1], os.path.join(out, f"{ip[0]}_thumb.jpg"), os.path.join(out, f"{ip[0]}.jpg")),
+                    enumerate(files),
+                ))
+            elapsed = time.perf_counter() - started
+        pages = sum(len(r["access"]) for r in results)
+        print(f"  {workers:>2} worker(s): {pages / elapsed:8.1f} pages/s  {_format_bytes(total / elapsed):>10}/s  "
+              f"({pages} page(s) in {elapsed:.2f}s)")
+    return 0
+
+def cmd_near_duplicates(args):
+    """Cluster the LA master's image masters of one scanType by perceptual hash."""
+    output_folder = _damsg_output_folder(args.root)
+    master_df, master_name = read_inventory_view(output_folder, load_manifest(output_folder), "la")
+    if master_df.empty:
+        print("No LA master inventory found")
+        return 1
+    scan_type = args.scan_type or master_df["scanType"].iloc[0]
+    tier = master_df[(master_df["scanType"] == scan_type)
+                     & master_df["relativePath"].fillna("").str.lower().str.endswith(PHASH_EXTENSIONS)
+                     & master_df["checksumSHA256"].fillna("").ne("")]
+    store = PerceptualHashStore(os.path.join(output_folder, STATE_FOLDER, PHASH_INDEX_FILE))
+    try:
+        phashes = store.lookup(tier["checksumSHA256"])
+        missing = tier[~tier["checksumSHA256"].isin(phashes.keys())].drop_duplicates("checksumSHA256")
+        if len(missing) and args.compute_missing:
+            print(f"Hashing {len(missing)} image master(s) with {args.workers} worker(s)...")
+            jobs = dict(zip(missing["checksumSHA256"], (os.path.join(args.root, rel) for rel in missing["relativePath"])))
+            with concurrent.futures.ThreadPoolExecutor(args.workers, thread_name_prefix="damsg-phash") as pool:
+                hashed, failed = compute_perceptual_hashes(jobs, pool, store)
+            phashes.update(hashed)
+            for path, e in failed:
+                print(f"  {path}: {e}")
+            print(f"{len(hashed)} hashed, {len(failed)} failed")
+        elif len(missing):
+            print(f"{len(missing)} image master(s) have no perceptual hash yet; use --compute-missing to hash them")
+    finally:
+        store.close()
+    started = time.perf_counter()
+    report = near_duplicate_report(tier, phashes, args.max_distance)
+    print(f"{master_name} ({scan_type}): {len(set(phashes.values()))} distinct hash(es) compared "
+          f"in {time.perf_counter() - started:.1f}s")
+    if report.empty:
+        print(f"No near-duplicates within {args.max_distance} bit(s)")
+        return 0
+    out = args.out or os.path.join(output_folder, f"near_duplicates_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+    report.to_csv(out, index=False, encoding='utf-8', lineterminator='\n')
+    print(f"{report['clusterId'].nunique()} near-duplicate cluster(s), {len(report)} file(s): {out}")
+    return 0
+
+def main_cli(argv):
+    parser = argparse.ArgumentParser(
+        prog="damsg",
+        description="SANSCA Digital Asset Metadata Sheet Generator — command-line tools. Run without arguments for the GUI."
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("benchmark-hash", help="Compare hashing strategies on local and network paths")
+    p.add_argument("paths", nargs="+", help="Files or folders to hash (e.g. a local folder and an SMB share)")
+    p.add_argument("--repeat", type=int, default=3, help="Timed passes per strategy (default 3)")
+    p.add_argument("--max-files", type=int, default=50, help="Files sampled per folder (default 50)")
+    p.set_defaults(func=cmd_benchmark_hash)
+
+    p = sub.add_parser("compact", help="Fold append-only inventory deltas into snapshots")
+    p.add_argument("root", help="SANSCA root folder (contains DAMSG_output)")
+    p.add_argument("--keep", type=int, default=SNAPSHOT_RETENTION,
+                   help=f"Snapshots kept per inventory (default {SNAPSHOT_RETENTION})")
+    p.set_defaults(func=cmd_compact)
+
+    p = sub.add_parser("inventory-view", help="Rebuild the full inventory as of a past run")
+    p.add_argument("root", help="SANSCA root folder (contains DAMSG_output)")
+    p.add_argument("--run", help="Run timestamp (YYYYMMDD_HHMMSS); omit to list recorded runs")
+    p.add_argument("--kind", choices=sorted(SNAPSHOT_PREFIX), default="la", help="Inventory to rebuild (default la)")
+    p.add_argument("--out", help="Output CSV (default DAMSG_output/inventory_view_<kind>_<run>.csv)")
+    p.set_defaults(func=cmd_inventory_view)
+
+    p = sub.add_parser("verify-ids", help="Check the LA master for documentIds shared by different files")
+    p.add_argument("root", help="SANSCA root folder (contains DAMSG_output)")
+    p.add_argument("--out", help="Collision report CSV (default DAMSG_output/document_id_collisions_<timestamp>.csv)")
+    p.set_defaults(func=cmd_verify_ids)
+
+    p = sub.add_parser("query", help="Look up rows of the LA master in the inventory index")
+    p.add_argument("root", help="SANSCA root folder (contains DAMSG_output)")
+    p.add_argument("--document-id", help="Exact documentId")
+    p.add_argument("--checksum", help="SHA-256 checksum; lists every copy of the file")
+    p.add_argument("--path", help="relativePath, or a folder prefix of it (either path separator)")
+    p.add_argument("--institution", help="institutionCode")
+    p.add_argument("--collection", help="collectionCode")
+    p.add_argument("--scan-type", help="scanType (e.g. 'Mirror Drive')")
+    p.add_argument("--columns", help=f"Comma-separated output columns (default all: {','.join(INVENTORY_INDEX_COLUMNS)})")
+    p.add_argument("--limit", type=int, help="Return at most this many rows")
+    p.add_argument("--csv", action="store_true", help="Write CSV to stdout instead of a table")
+    p.add_argument("--rebuild", action="store_true", help="Rebuild the index from the latest LA master first")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("scrub", help="Re-verify master checksums in the background, rate-limited")
+    p.add_argument("root", help="SANSCA root folder (contains DAMSG_output); relativePaths are resolved against it")
+    p.add_argument("--scan-type", action="append",
+                   help="scanType to scrub (repeatable; default every scanType with files under root)")
+    p.add_argument("--rate", type=float, default=SCRUB_RATE_MB, help=f"Bandwidth cap in MB/s, 0 for none (default {SCRUB_RATE_MB})")
+    p.add_argument("--iops", type=float, help="Cap on read operations per second (default none)")
+    p.add_argument("--window", action="append", type=parse_scrub_window,
+                   help="Time window to scrub in, HH:MM-HH:MM (repeatable; may span midnight; default any time)")
+    p.add_argument("--hours", type=float, help="Stop after this many hours")
+    p.add_argument("--continuous", action="store_true",
+                   help="Keep running: wait for the next window and start a new pass when one completes")
+    p.set_defaults(func=cmd_scrub)
+
+    p = sub.add_parser("merkle-verify", help="Check Merkle manifests against the files or another copy, down to byte ranges")
+    p.add_argument("root", help="SANSCA root folder (contains DAMSG_output/merkle)")
+    p.add_argument("--scan-type", help="scanType whose manifests to check (default: the only one present)")
+    p.add_argument("--collection", action="append", help="category/institution/collection to check (repeatable; default all)")
+    p.add_argument("--against", help="Another copy's root folder: compare manifests instead of reading files")
+    p.add_argument("--against-scan-type", help="scanType of the manifests under --against (default: the only one present)")
+    p.add_argument("--changed-only", action="store_true",
+                   help="Only re-read files whose size or modification time changed (fast change check, not a bit-rot check)")
+    p.add_argument("--out", help="Differences CSV (default DAMSG_output/merkle_verify_<timestamp>.csv)")
+    p.set_defaults(func=cmd_merkle_verify)
+
+    p = sub.add_parser("manifest-diff", help="Diff two tiers' manifests: added, removed, changed and moved files")
+    p.add_argument("left", help="SHA256SUMS file, LA master CSV, or SANSCA root folder (its LA master)")
+    p.add_argument("right", help="The manifest to compare against, in any of the same forms")
+    p.add_argument("--left-scan-type", help="scanType of the left master slice (default: that of its first row)")
+    p.add_argument("--right-scan-type", help="scanType of the right master slice (default: that of its first row)")
+    p.add_argument("--left-under", help="Only compare left paths under this folder, relative to it (e.g. digital_vouchers/ISAM/Mam)")
+    p.add_argument("--right-under", help="Only compare right paths under this folder, relative to it")
+    p.add_argument("--left-label", help="Storage name for the left side in the reports")
+    p.add_argument("--right-label", help="Storage name for the right side in the reports")
+    p.add_argument("--encoding", default="utf-8-sig",
+                   help="Encoding of SHA256SUMS files (default UTF-8, with or without a BOM; e.g. cp850 for cmd output)")
+    p.add_argument("--out-dir", help="Report folder (default: next to the left manifest, or its DAMSG_output)")
+    p.add_argument("--tmp-dir", help="Folder for the temporary sort runs (default system temp)")
+    p.set_defaults(func=cmd_manifest_diff)
+
+    p = sub.add_parser("plan", help="Dry run: count files and bytes a scan would read, estimate its time, write a work list")
+    p.add_argument("root", help="SANSCA root folder")
+    p.add_argument("--scan-type", required=True, help="scanType to plan for (e.g. 'Working Drive'); its change-feed state decides what is new")
+    p.add_argument("--file-filter", choices=list(FILE_TYPES), default="All", help="File Filter of the scan (default All)")
+    p.add_argument("--checksums", choices=list(CHECKSUM_PROFILES), default="SHA-256",
+                   help="Checksum profile of the scan; a fast hash audit re-reads every file (default SHA-256)")
+    p.add_argument("--institution", action="append", help="institutionCode to plan (repeatable; default all)")
+    p.add_argument("--collection", action="append", help="collectionCode or category/institution/collection (repeatable; default all)")
+    p.add_argument("--shards", type=int, default=1, help="Split the work list into this many parts of about equal time (default 1)")
+    p.add_argument("--out", help="Work list path without extension (default DAMSG_output/scan_plan_<scanType>_<timestamp>)")
+    p.set_defaults(func=cmd_plan)
+
+    p = sub.add_parser("export-dwca", help="Export the LA master as Darwin Core Archives (multimedia) for IPT/GBIF")
+    p.add_argument("root", help="SANSCA root folder (contains DAMSG_output)")
+    p.add_argument("--by", choices=["collection", "institution"], default="collection", help="One archive per collection (default) or institution")
+    p.add_argument("--scan-type", help="scanType to export (default: that of the first master row)")
+    p.add_argument("--workers", type=int, default=4, help="Archive writer threads (default 4)")
+    p.add_argument("--out-dir", help="Output folder (default DAMSG_output/dwca)")
+    p.set_defaults(func=cmd_export_dwca)
+
+    p = sub.add_parser("benchmark-derivatives", help="Measure thumbnail/access JPEG rendering speed (pages/s)")
+    p.add_argument("paths", nargs="+", help="Image masters or folders (e.g. large multi-page TIFFs)")
+    p.add_argument("--workers", type=lambda v: [int(n) for n in v.split(",")], default=[1, DERIVATIVE_WORKERS],
+                   help=f"Comma-separated worker counts to compare (default 1,{DERIVATIVE_WORKERS})")
+    p.add_argument("--max-files", type=int, default=50, help="Masters sampled (default 50)")
+    p.set_defaults(func=cmd_benchmark_derivatives)
+
+    p = sub.add_parser("near-duplicates", help="Cluster image masters that look alike (perceptual hash) across collections")
+    p.add_argument("root", help="SANSCA root folder (contains DAMSG_output); relativePaths are resolved against it")
+    p.add_argument("--scan-type", help="scanType to compare within (default: that of the first master row)")
+    p.add_argument("--max-distance", type=int, default=PHASH_MAX_DISTANCE,
+                   help=f"Largest Hamming distance in bits between near-duplicates (default {PHASH_MAX_DISTANCE}, max 63)")
+    p.add_argument("--compute-missing", action="store_true", help="Hash image masters not hashed by a scan yet")
+    p.add_argument("--workers", type=int, default=PHASH_WORKERS, help=f"Decoder threads for --compute-missing (default {PHASH_WORKERS})")
+    p.add_argument("--out", help="Report CSV (default DAMSG_output/near_duplicates_<timestamp>.csv)")
+    p.set_defaults(func=cmd_near_duplicates)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if len(sys.argv) > 1:
+    sys.exit(main_cli(sys.argv[1:]))
 
 # ==================================================
 # Tkinter UI
 # ==================================================
 root = Tk()
 root.title("SANSCA Digital Asset Metadata Sheet Generator")
-root.geometry("850x950")
+root.geometry("850x900")
 root.resizable(False, False)
 
 if not EXIFTOOL_AVAILABLE:
@@ -422,8 +3509,20 @@ scanModeVar = StringVar()
 scanTypeVar = StringVar()
 clearPreviousMetadataVar = BooleanVar(value=False)
 clearMasterFilesVar = BooleanVar(value=False)
-
-fileFilters = ["All","TIFF only","RAW only","JPEG only", "PDF only"]
+forceFullWalkVar = BooleanVar(value=False)
+checksumProfileVar = StringVar()
+inventoryModeVar = StringVar()
+derivativesVar = BooleanVar(value=False)
+watchModeVar = BooleanVar(value=False)
+merkleVar = BooleanVar(value=False)
+seedSumsVar = BooleanVar(value=False)
+exportSumsVar = BooleanVar(value=False)
+perceptualHashVar = BooleanVar(value=False)
+dryRunVar = BooleanVar(value=False)
+workListVar = StringVar()
+advancedShownVar = BooleanVar(value=False)
+
+fileFilters = list(FILE_TYPES)
 outputChoices = ["CSV only","Excel only","Both"]
 scanModes = ["Single Collection","All Collections (selected institution)","All Institutions + Collections"]
 scanTypes = [
@@ -437,6 +3536,8 @@ fileFilterVar.set(fileFilters[0])
 outputChoiceVar.set(outputChoices[0])
 scanModeVar.set(scanModes[0])
 scanTypeVar.set(scanTypes[0])
+checksumProfileVar.set("SHA-256")
+inventoryModeVar.set(INVENTORY_MODES[0])
 
 mappingDF = None
 atomMappingDF = None
@@ -468,6 +3569,20 @@ def selectRootFolder():
     rootFolderVar.set(p)
     rootLabel.config(text=p)
 
+def selectWorkList():
+    p = filedialog.askopenfilename(filetypes=[("Scan work list", "*.json")])
+    workListVar.set(p)
+    workListLabel.config(text=p or "No work list — the scan walks the folders")
+
+def toggleAdvancedOptions():
+    if advancedShownVar.get():
+        advancedFrame.pack_forget()
+        advancedButton.config(text="Show advanced options ▸")
+    else:
+        advancedFrame.pack(fill="x", padx=20, pady=5, before=startButton)
+        advancedButton.config(text="Hide advanced options ▾")
+    advancedShownVar.set(not advancedShownVar.get())
+
 def loadGoogleSheets():
     global mappingDF, atomMappingDF
     try:
@@ -552,24 +3667,34 @@ Button(root,text="Load Mapping from Google Sheets",command=loadGoogleSheets,bg="
 sheetStatusLabel=Label(root,text="Mapping not loaded",wraplength=800,anchor="w",fg="gray")
 sheetStatusLabel.pack()
 
-Label(root,text="Scan Type:").pack(pady=5)
-OptionMenu(root,scanTypeVar,*scanTypes).pack(fill="x", padx=20)
+optionsFrame=Frame(root)
+optionsFrame.pack(fill="x", padx=20, pady=5)
+optionsFrame.columnconfigure(1, weight=1)
+
+Label(optionsFrame,text="Scan Type:").grid(row=0, column=0, sticky="e", padx=5, pady=2)
+OptionMenu(optionsFrame,scanTypeVar,*scanTypes).grid(row=0, column=1, sticky="ew", pady=2)
+
+Label(optionsFrame,text="Scan Mode:").grid(row=1, column=0, sticky="e", padx=5, pady=2)
+OptionMenu(optionsFrame,scanModeVar,*scanModes).grid(row=1, column=1, sticky="ew", pady=2)
 
-Label(root,text="Scan Mode:").pack(pady=5)
-OptionMenu(root,scanModeVar,*scanModes).pack(fill="x", padx=20)
+Label(optionsFrame,text="Institution:").grid(row=2, column=0, sticky="e", padx=5, pady=2)
+institutionMenu=OptionMenu(optionsFrame,institutionVar,"")
+institutionMenu.grid(row=2, column=1, sticky="ew", pady=2)
+Label(optionsFrame,text="Collection:").grid(row=3, column=0, sticky="e", padx=5, pady=2)
+collectionMenu=OptionMenu(optionsFrame,collectionVar,"")
+collectionMenu.grid(row=3, column=1, sticky="ew", pady=2)
 
-Label(root,text="Institution:").pack(pady=5)
-institutionMenu=OptionMenu(root,institutionVar,"")
-institutionMenu.pack(fill="x", padx=20)
-Label(root,text="Collection:").pack(pady=5)
-collectionMenu=OptionMenu(root,collectionVar,"")
-collectionMenu.pack(fill="x", padx=20)
+Label(optionsFrame,text="File Filter:").grid(row=4, column=0, sticky="e", padx=5, pady=2)
+OptionMenu(optionsFrame,fileFilterVar,*fileFilters).grid(row=4, column=1, sticky="ew", pady=2)
 
-Label(root,text="File Filter:").pack(pady=5)
-OptionMenu(root,fileFilterVar,*fileFilters).pack(fill="x", padx=20)
+Label(optionsFrame,text="Output Choice:").grid(row=5, column=0, sticky="e", padx=5, pady=2)
+OptionMenu(optionsFrame,outputChoiceVar,*outputChoices).grid(row=5, column=1, sticky="ew", pady=2)
 
-Label(root,text="Output Choice:").pack(pady=5)
-OptionMenu(root,outputChoiceVar,*outputChoices).pack(fill="x", padx=20)
+Label(optionsFrame,text="Checksums:").grid(row=6, column=0, sticky="e", padx=5, pady=2)
+OptionMenu(optionsFrame,checksumProfileVar,*CHECKSUM_PROFILES).grid(row=6, column=1, sticky="ew", pady=2)
+
+Label(optionsFrame,text="Master Inventory:").grid(row=7, column=0, sticky="e", padx=5, pady=2)
+OptionMenu(optionsFrame,inventoryModeVar,*INVENTORY_MODES).grid(row=7, column=1, sticky="ew", pady=2)
 
 Checkbutton(
     root,
@@ -585,7 +3710,68 @@ Checkbutton(
     fg="red"
 ).pack(pady=2)
 
-Button(root,text="Start Processing",command=root.destroy,bg="lightblue").pack(pady=20)
+advancedButton=Button(root,text="Show advanced options ▸",command=toggleAdvancedOptions)
+advancedButton.pack(pady=5)
+
+# Hidden until toggled; two columns keep the window under 900 px tall with it shown
+advancedFrame=LabelFrame(root,text="Advanced options",padx=5,pady=5)
+advancedFrame.columnconfigure(0, weight=1)
+advancedFrame.columnconfigure(1, weight=1)
+
+Checkbutton(
+    advancedFrame,
+    text="Force full directory walk (ignore change-feed state)",
+    variable=forceFullWalkVar, wraplength=380, justify="left"
+).grid(row=0, column=0, sticky="w")
+
+Checkbutton(
+    advancedFrame,
+    text="Generate access derivatives (thumbnail + access JPEG)",
+    variable=derivativesVar, wraplength=380, justify="left"
+).grid(row=0, column=1, sticky="w")
+
+Checkbutton(
+    advancedFrame,
+    text="Reuse checksums from existing SHA256SUMS.txt files (unmodified files only)",
+    variable=seedSumsVar, wraplength=380, justify="left"
+).grid(row=1, column=0, sticky="w")
+
+Checkbutton(
+    advancedFrame,
+    text="Write SHA256SUMS.txt in each collection",
+    variable=exportSumsVar, wraplength=380, justify="left"
+).grid(row=1, column=1, sticky="w")
+
+Checkbutton(
+    advancedFrame,
+    text="Perceptual hashes and near-duplicate report (image masters)",
+    variable=perceptualHashVar, wraplength=380, justify="left"
+).grid(row=2, column=0, sticky="w")
+
+Checkbutton(
+    advancedFrame,
+    text="Write chunk-level Merkle manifests (partial re-verification)",
+    variable=merkleVar, wraplength=380, justify="left"
+).grid(row=2, column=1, sticky="w")
+
+Checkbutton(
+    advancedFrame,
+    text="Keep watching for new files after the scan (watch mode)",
+    variable=watchModeVar, wraplength=380, justify="left"
+).grid(row=3, column=0, sticky="w")
+
+Checkbutton(
+    advancedFrame,
+    text="Dry run: count files, estimate time and write a work list (nothing is scanned)",
+    variable=dryRunVar, wraplength=380, justify="left"
+).grid(row=3, column=1, sticky="w")
+
+Button(advancedFrame,text="Select Work List from a Dry Run (optional)",command=selectWorkList).grid(row=4, column=0, columnspan=2, sticky="ew", pady=(5, 0))
+workListLabel=Label(advancedFrame,text="No work list — the scan walks the folders",wraplength=780,anchor="w",fg="gray")
+workListLabel.grid(row=5, column=0, columnspan=2, sticky="w")
+
+startButton=Button(root,text="Start Processing",command=root.destroy,bg="lightblue")
+startButton.pack(pady=20)
 
 root.mainloop()
 
@@ -603,110 +3789,268 @@ scanType = scanTypeVar.get()
 # ==================================================
 # File scanning logic
 # ==================================================
-fileTypes = {
-    "All":[ ".tif",".tiff",".jpg",".jpeg",".nef",".cr2",".cr3",".arw",".dng",".orf",".rw2", ".pdf",".csv"],
-    "TIFF only":[ ".tif",".tiff"],
-    "RAW only":[ ".nef",".cr2",".cr3",".arw",".dng",".orf",".rw2"],
-    "JPEG only":[ ".jpg",".jpeg"],
-    "PDF only":[ ".pdf"]
-}
-extensions = tuple(fileTypes[fileFilterVar.get()])
+extensions = tuple(FILE_TYPES[fileFilterVar.get()])
+
+# Checksum columns written for this run (checksumSHA256 is always present)
+checksum_algorithms = CHECKSUM_PROFILES[checksumProfileVar.get()]
+checksum_audit = checksumProfileVar.get() == FAST_AUDIT_PROFILE
+extra_checksum_columns = [CHECKSUM_COLUMNS[a] for a in checksum_algorithms if a != "sha256"]
+checksum_columns = ["checksumSHA256"] + extra_checksum_columns
+atom_output_columns = ATOM_OUTPUT_COLUMNS + extra_checksum_columns
 all_rows = []
 atom_rows = []
 
-def scan_collection(categoryRoot, institutionCode, collectionCode, meta, atom_meta=None):
-    collectionRoot = os.path.join(rootFolder, categoryRoot, institutionCode, collectionCode)
-    if not os.path.isdir(collectionRoot):
-        return []
+# Collection-level inventory columns, stored once per "category/institution/collection"
+collection_meta = {}
+
+def register_collection(categoryRoot, institutionCode, collectionCode, meta, atom_meta=None):
+    """Store the columns shared by every file of a collection; returns the collection key."""
+    key = f"{categoryRoot}/{institutionCode}/{collectionCode}"
+    if key in collection_meta:
+        return key
+    values = {
+        "identifier":      "",  # placeholder — URI to be assigned when image service is live
+        "creator":         meta.get("creator", "") if meta is not None else "",
+        "contributor":     meta.get("contributor", "") if meta is not None else "",
+        "publisher":       meta.get("publisher", "") if meta is not None else "",
+        "audience":        AUDIENCE_MAP.get(categoryRoot.lower(), AUDIENCE_FALLBACK),
+        "source":          meta.get("source", "") if meta is not None else "",
+        "license":         meta.get("license", "") if meta is not None else "",
+        "rightsHolder":    meta.get("rightsHolder", "") if meta is not None else "",
+        "references":      "",  # placeholder — URI to occurrence record, future field
+        "scanType":        scanType,
+        "institutionCode": institutionCode,
+        "collectionCode":  collectionCode,
+        "institutionName": INSTITUTION_CODE_MAP.get(institutionCode, institutionCode),
+        "holdingInstitution": (
+            meta.get("holdingInstitution", "") if meta is not None
+            else (atom_meta.get("repository", "") if atom_meta is not None and len(atom_meta) > 0 else INSTITUTION_CODE_MAP.get(institutionCode, institutionCode))
+        ),
+        "additionalNames": "",
+        "subject":         meta.get("subject", "") if meta is not None else "",
+        "scanModeApplied": scanMode,
+    }
+
+    # Add ALL mapping columns automatically (file-level columns are never overridden)
+    if meta is not None and mappingDF is not None:
+        for col in mappingDF.columns:
+            if col in FILE_RECORD_COLUMNS or col in CHECKSUM_COLUMNS.values() or col == "dateCreated":
+                continue
+            if col not in values or (col == "additionalNames" and not values["additionalNames"].strip()):
+                values[col] = meta.get(col, "")
 
-    rows = []
-    for r, _, files in os.walk(collectionRoot):
-        for f in files: 
+    collection_meta[key] = values
+    return key
 
-            # Skip hidden/system files
-            if f.startswith(".") or f.startswith("._") or f.lower() in SYSTEM_FILES:
-                continue
-           
-            if f.lower().endswith(extensions):
-                full = os.path.join(r, f)
-                rel = os.path.relpath(full, rootFolder)
-                base = os.path.splitext(f)[0]
-                fmt = os.path.splitext(f)[1].lower()
-
-                _update_progress(f, collectionCode)
-                checksum = generate_checksum(full)
-                date_created = getDateCreated(full)
-
-                asset_category = categoryRoot
-                if os.path.sep + "metadata" + os.path.sep in full:
-                    asset_category = f"{categoryRoot}_metadata"
-
-                parsed_desc = parse_filename_description(base)
-                if parsed_desc:
-                    description_text = parsed_desc
-                elif categoryRoot.lower() in DESCRIPTION_TEMPLATE_MAP:
-                    description_text = DESCRIPTION_TEMPLATE_MAP[categoryRoot.lower()].format(
-                        collectionCode=collectionCode,
-                        institutionCode=institutionCode
-                    )
-                else:
-                    description_text = meta.get("description", collectionCode) if meta is not None else collectionCode
+def describe_file(categoryRoot, institutionCode, collectionCode, collection_key, meta, full, rel, size):
+    """Hash and describe one new or changed file.
 
-                if fmt == ".csv":
-                    doc_id = generate_metadata_document_id(institutionCode, collectionCode, categoryRoot, rel)
-                else:
-                    doc_id = generate_document_id(institutionCode, collectionCode, base, rel)
-
-                mime_type = MIME_TYPE_MAP.get(fmt, "application/octet-stream")
-                dwc_type  = DWC_TYPE_MAP.get(fmt, "")
-
-                row_data = {
-                    # --- DwC Simple Multimedia Extension standard fields ---
-                    "identifier":    "",  # placeholder — URI to be assigned when image service is live
-                    "type":          dwc_type,
-                    "format":        mime_type,
-                    "title":         base,
-                    "description":   description_text,
-                    "created":       date_created,
-                    "creator":       meta.get("creator", "") if meta is not None else "",
-                    "contributor":   meta.get("contributor", "") if meta is not None else "",
-                    "publisher":     meta.get("publisher", "") if meta is not None else "",
-                    "audience":      AUDIENCE_MAP.get(categoryRoot.lower(), AUDIENCE_FALLBACK),
-                    "source":        meta.get("source", "") if meta is not None else "",
-                    "license":       meta.get("license", "") if meta is not None else "",
-                    "rightsHolder":  meta.get("rightsHolder", "") if meta is not None else "",
-                    "references":    "",  # placeholder — URI to occurrence record, future field
-                    # --- System / archival fields ---
-                    "scanType":        scanType,
-                    "documentId":      doc_id,
-                    "institutionCode": institutionCode,
-                    "collectionCode":  collectionCode,
-                    "institutionName":    INSTITUTION_CODE_MAP.get(institutionCode, institutionCode),
-                    "holdingInstitution": (
-                        meta.get("holdingInstitution", "") if meta is not None
-                        else (atom_meta.get("repository", "") if atom_meta is not None and len(atom_meta) > 0 else INSTITUTION_CODE_MAP.get(institutionCode, institutionCode))
-                    ),
-                    "additionalNames": "",
-                    "subject":         "Metadata" if fmt == ".csv" else (meta.get("subject", "") if meta is not None else ""),
-                    "fileName":        f,
-                    "fullPath":        full,
-                    "relativePath":    rel,
-                    "assetCategory":   asset_category,
-                    "scanModeApplied": scanMode,
-                    "checksumSHA256":  checksum,
-                    # preserved for legacy/archival use
-                    "dateCreated":     date_created,
-                }
+    Returns its FileRecord, with documentId still blank, and the documentId
+    prefix the ID is to be assigned under.
+    """
+    f = os.path.basename(full)
+    base = os.path.splitext(f)[0]
+    fmt = os.path.splitext(f)[1].lower()
+
+    technical = {}
+    chunks = ChunkHasher() if merkle_enabled else None
+    seeds = sha256_seeds.get(os.path.join(rootFolder, categoryRoot, institutionCode, collectionCode))
+    # A SHA256SUMS.txt checksum saves the read only when SHA-256 is all this run needs
+    seeded = seeds.lookup(full) if seeds is not None and chunks is None and seed_sums_usable else None
+    if seeded:
+        digests = {"checksumSHA256": seeded}
+        if full.lower().endswith(TECHNICAL_EXTENSIONS):
+            technical = read_technical_metadata_file(full)
+    else:
+        digests = file_digests(full, rel, technical, chunks)
+    if chunks is not None and digests:
+        merkle_fresh[full] = chunks.digests()
+    date_created = getDateCreated(full)
+
+    asset_category = categoryRoot
+    if os.path.sep + "metadata" + os.path.sep in full:
+        asset_category = f"{categoryRoot}_metadata"
+
+    parsed_desc = parse_filename_description(base)
+    if parsed_desc:
+        description_text = parsed_desc
+    elif categoryRoot.lower() in DESCRIPTION_TEMPLATE_MAP:
+        description_text = DESCRIPTION_TEMPLATE_MAP[categoryRoot.lower()].format(
+            collectionCode=collectionCode,
+            institutionCode=institutionCode
+        )
+    else:
+        description_text = meta.get("description", collectionCode) if meta is not None else collectionCode
 
-                # Add ALL mapping columns automatically
-                if meta is not None and mappingDF is not None:
-                    for col in mappingDF.columns:
-                        if col not in row_data or (col == "additionalNames" and not row_data["additionalNames"].strip()):
-                            row_data[col] = meta.get(col, "")
+    if fmt == ".csv":
+        id_prefix = metadata_document_id_prefix(institutionCode, collectionCode, categoryRoot)
+    else:
+        id_prefix = document_id_prefix(institutionCode, collectionCode, base)
 
-                rows.append(row_data)   
+    mime_type = MIME_TYPE_MAP.get(fmt, "application/octet-stream")
+    dwc_type  = DWC_TYPE_MAP.get(fmt, "")
 
-    return rows
+    record = FileRecord(
+        collection_key, dwc_type, mime_type, base, description_text, date_created, "",
+        f, full, rel, asset_category, digests, size,
+        {"subject": "Metadata"} if fmt == ".csv" else technical or None,
+    )
+    return record, id_prefix
+
+def _describe_scheduled(categoryRoot, institutionCode, collectionCode, collection_key, meta, full, rel, size):
+    """describe_file as run by an I/O scheduler worker."""
+    progress.publish(os.path.basename(full), collectionCode, size)
+    return describe_file(categoryRoot, institutionCode, collectionCode, collection_key, meta, full, rel, size)
+
+def forget_collection(state_key):
+    """Report every file of a collection folder gone since the last scan as removed and drop its state."""
+    categoryRoot, institutionCode, collectionCode = state_key.split("/")
+    for change, rel, size in diff_dir_state(dir_state.pop(state_key, {}).get("dirs", {}), {}):
+        scan_delta.append({
+            "change": change, "scanType": scanType, "assetCategory": categoryRoot,
+            "institutionCode": institutionCode, "collectionCode": collectionCode,
+            "relativePath": rel, "sizeBytes": size,
+        })
+
+def scan_collection(categoryRoot, institutionCode, collectionCode, meta, atom_meta=None):
+    """Walk a collection and queue its new and changed files on io_scheduler.
+
+    Returns a function that waits for those reads and returns the collection's
+    rows, so the next collection can be walked while this one is being read.
+    """
+    collectionRoot = os.path.join(rootFolder, categoryRoot, institutionCode, collectionCode)
+    state_key = f"{categoryRoot}/{institutionCode}/{collectionCode}"
+    try:
+        os.stat(collectionRoot)
+    except FileNotFoundError:
+        forget_collection(state_key)
+        return lambda: []
+    except OSError as e:
+        scan_warnings.append({"level": "WARN", "file": collectionRoot, "issue": f"Collection folder unreadable, state kept: {e}"})
+        return lambda: []
+    collection_key = register_collection(categoryRoot, institutionCode, collectionCode, meta, atom_meta)
+    if seed_sums_usable:
+        sha256_seeds[collectionRoot] = Sha256SumsSeeds(collectionRoot)
+
+    # Change-feed state — unchanged directories are not listed again
+    coll_state = dir_state.get(state_key, {})
+    rules = rules_for(state_key)
+    full_walk = (
+        force_full_walk
+        or not coll_state_current(coll_state, extensions, rules)
+        or full_walk_due(coll_state)
+    )
+    prev_dirs = coll_state.get("dirs", {})
+    new_dirs = {}
+    planned = work_list["collections"].get(state_key) if work_list is not None else None
+    if planned is not None and planned.get("rules") != rules.signature:
+        print(f"{institutionCode}/{collectionCode} ({categoryRoot}): walk rules changed since the dry run — walked again")
+        planned = None
+
+    # Merkle manifest entries are reused for unchanged files; those it lacks are read for their chunks
+    merkle_path = merkle_manifest_path(output_folder, scanType, categoryRoot, institutionCode, collectionCode) if merkle_enabled else None
+    merkle_prev = (load_merkle_manifest(merkle_path) or {"files": {}})["files"] if merkle_enabled else {}
+    merkle_jobs = {}   # full path → Future of merkle_file_chunks
+
+    rows = []
+    pending = []       # (row position, Future of describe_file)
+    # Walk rules decide which folders walk_changed enters and which files it keeps
+    # With a work list, only directories changed since the dry run are listed again
+    walk_from = planned["dirs"] if planned is not None else prev_dirs
+    for r, file_stats, prev_stats in walk_changed(collectionRoot, rootFolder, walk_from, new_dirs, rules, full_walk and planned is None, walk_rule_hits):
+        if planned is not None:
+            prev_stats = prev_dirs.get(os.path.relpath(r, rootFolder), {}).get("files", {})
+        for f in sorted(file_stats):
+            full = os.path.join(r, f)
+            rel = os.path.relpath(full, rootFolder)
+
+            # Same size/mtime as last run — reuse the previous master row if it
+            # has every checksum this run asks for (a fast hash audit re-reads instead)
+            if not checksum_audit and prev_stats.get(f) == file_stats[f] and rel in previous_row_index:
+                prev = previous_row(rel)
+                if all(prev.get(col) for col in checksum_columns):
+                    progress.publish(f, collectionCode, file_stats[f][0])
+                    rows.append(FileRecord(
+                        collection_key, prev.get("type", ""), prev.get("format", ""), prev.get("title", ""),
+                        prev.get("description", ""), prev.get("dateCreated", ""), prev.get("documentId", ""),
+                        f, full, rel, prev.get("assetCategory", ""),
+                        {col: prev[col] for col in checksum_columns}, file_stats[f][0],
+                        technical_overrides(prev, full) or None,
+                    ))
+                    if merkle_enabled:
+                        entry = merkle_prev.get(os.path.relpath(full, collectionRoot).replace(os.sep, "/"))
+                        if entry is None or [entry["size"], entry["mtime"]] != list(file_stats[f]):
+                            merkle_jobs[full] = io_scheduler.submit(full, merkle_file_chunks, full)
+                    continue
+
+            pending.append((len(rows), io_scheduler.submit(
+                full, _describe_scheduled, categoryRoot, institutionCode, collectionCode,
+                collection_key, meta, full, rel, file_stats[f][0],
+            )))
+            rows.append(None)
+
+    def finish():
+        # documentIds are assigned for the whole collection once every read is done
+        id_requests = []   # (row position, documentId prefix, relativePath)
+        for pos, future in pending:
+            record, id_prefix = future.result()
+            rows[pos] = record
+            id_requests.append((pos, id_prefix, record.relativePath))
+        if id_requests:
+            doc_ids = document_ids.assign([(prefix, rel) for _, prefix, rel in id_requests])
+            for (pos, _, _), doc_id in zip(id_requests, doc_ids):
+                rows[pos].documentId = doc_id
+
+        seeds = sha256_seeds.pop(collectionRoot, None)
+        if seeds is not None and seeds.used:
+            print(f"{institutionCode}/{collectionCode} ({categoryRoot}): {seeds.used} checksum(s) taken from {SHA256SUMS_FILE}")
+
+        if merkle_path is not None:
+            files = {}
+            for r in rows:
+                key = os.path.relpath(r.fullPath, collectionRoot).replace(os.sep, "/")
+                if key.startswith("metadata/"):
+                    continue   # Rewritten every run
+                size, mtime = new_dirs[os.path.relpath(os.path.dirname(r.fullPath), rootFolder)]["files"][r.fileName]
+                chunks = merkle_fresh.pop(r.fullPath, None)
+                if chunks is None and r.fullPath in merkle_jobs:
+                    try:
+                        chunks = merkle_jobs[r.fullPath].result()
+                    except OSError as e:
+                        scan_warnings.append({"level": "ERROR", "file": r.fullPath, "issue": f"Merkle chunk hashing failed: {e}"})
+                        continue
+                if chunks is None:
+                    entry = merkle_prev.get(key)
+                    if entry is None or [entry["size"], entry["mtime"]] != [size, mtime]:
+                        continue   # Hashing failed; already in the scan warnings
+                    chunks = entry["chunks"]
+                files[key] = {"size": size, "mtime": mtime, "chunks": chunks}
+            manifest = build_merkle_manifest(files, f"{categoryRoot}/{institutionCode}/{collectionCode}", scanType)
+            save_merkle_manifest(merkle_path, manifest)
+            print(f"Merkle root {institutionCode}/{collectionCode} ({categoryRoot}): {manifest['root']}")
+
+        for change, rel, size in diff_dir_state(prev_dirs, new_dirs):
+            scan_delta.append({
+                "change": change, "scanType": scanType, "assetCategory": categoryRoot,
+                "institutionCode": institutionCode, "collectionCode": collectionCode,
+                "relativePath": rel, "sizeBytes": size,
+            })
+        if planned is not None:
+            # The dry run listed every directory
+            last_full_walk = max(coll_state.get("lastFullWalk") or "", work_list["created"])
+        elif full_walk:
+            last_full_walk = datetime.now().isoformat(timespec="seconds")
+        else:
+            last_full_walk = coll_state.get("lastFullWalk")
+        dir_state[state_key] = {
+            "extensions": list(extensions),
+            "rules": rules.signature,
+            "lastFullWalk": last_full_walk,
+            "dirs": new_dirs,
+        }
+        return rows
+
+    return finish
 
 # ==================================================
 # Master file paths
@@ -715,10 +4059,10 @@ master_csv = os.path.join(rootFolder, "DAMSG_output", f"digital_asset_inventory_
 master_xlsx = os.path.join(rootFolder, "DAMSG_output", f"digital_asset_inventory_la_{RUN_TIMESTAMP}.xlsx")
 os.makedirs(os.path.dirname(master_csv), exist_ok=True)
 
-if clearMasterFilesVar.get():
+if clearMasterFilesVar.get() and not dryRunVar.get():
     output_folder = os.path.dirname(master_csv)
     for f in os.listdir(output_folder):
-        if f.startswith("digital_asset_inventory_la_") and f.endswith((".csv", ".xlsx")):
+        if f.startswith(("digital_asset_inventory_la_", "digital_asset_delta_la_")) and f.endswith((".csv", ".xlsx")):
             try:
                 os.remove(os.path.join(output_folder, f))
                 print(f"Cleared master file: {f}")
@@ -737,37 +4081,142 @@ if clearMasterFilesVar.get():
                 print(f"Cleared scan warnings: {f}")
             except Exception as e:
                 print(f"Could not delete {f}: {e}")
-        if (f.startswith("digital_asset_inventory_atom_") or f.startswith("atom_import_")) and f.endswith(".csv"):
+        if f.startswith(("digital_asset_inventory_atom_", "digital_asset_delta_atom_", "atom_import_")) and f.endswith(".csv"):
             try:
                 os.remove(os.path.join(output_folder, f))
                 print(f"Cleared AtoM file: {f}")
             except Exception as e:
                 print(f"Could not delete {f}: {e}")
+        if f.startswith("filename_validation_") and f.endswith(".csv"):
+            try:
+                os.remove(os.path.join(output_folder, f))
+                print(f"Cleared filename validation: {f}")
+            except Exception as e:
+                print(f"Could not delete {f}: {e}")
+        if f.startswith("scan_delta_") and f.endswith(".csv"):
+            try:
+                os.remove(os.path.join(output_folder, f))
+                print(f"Cleared scan delta: {f}")
+            except Exception as e:
+                print(f"Could not delete {f}: {e}")
         if f.startswith("preservation_audit_atom_") and f.endswith(".csv"):
             try:
                 os.remove(os.path.join(output_folder, f))
                 print(f"Cleared AtoM audit file: {f}")
             except Exception as e:
                 print(f"Could not delete {f}: {e}")
+        if f == INVENTORY_MANIFEST:
+            try:
+                os.remove(os.path.join(output_folder, f))
+                print(f"Cleared inventory manifest: {f}")
+            except Exception as e:
+                print(f"Could not delete {f}: {e}")
 
 output_folder = os.path.dirname(master_csv)
-previous_la_files = sorted(
-    [f for f in os.listdir(output_folder) if f.startswith("digital_asset_inventory_la_") and f.endswith(".csv")],
-    reverse=True
-)
-if previous_la_files:
-    master_df = pd.read_csv(os.path.join(output_folder, previous_la_files[0]))
-else:
-    master_df = pd.DataFrame()
+scan_warnings.open(os.path.join(output_folder, f"scan_warnings_{RUN_TIMESTAMP}.csv"))
 
-previous_atom_files = sorted(
-    [f for f in os.listdir(output_folder) if f.startswith("digital_asset_inventory_atom_") and f.endswith(".csv")],
-    reverse=True
-)
-if previous_atom_files:
-    atom_master_df = pd.read_csv(os.path.join(output_folder, previous_atom_files[0]))
-else:
-    atom_master_df = pd.DataFrame()
+# Previous masters: latest snapshot plus any append-only deltas written since
+inventory_delta_mode = inventoryModeVar.get() == "Append-only deltas"
+inventory_manifest = load_manifest(output_folder)
+master_df, previous_master_name = read_inventory_view(output_folder, inventory_manifest, "la")
+atom_master_df, _ = read_inventory_view(output_folder, inventory_manifest, "atom")
+
+# ==================================================
+# Master key index — rebuilt only if it does not describe the latest master
+# ==================================================
+master_index = MasterKeyIndex(os.path.join(output_folder, STATE_FOLDER, MASTER_INDEX_FILE))
+if not master_index.is_current(previous_master_name, len(master_df)):
+    master_index.rebuild(master_df, previous_master_name)
+inventory_index = InventoryIndex(os.path.join(output_folder, INVENTORY_INDEX_FILE))
+if not inventory_index.is_current(previous_master_name, len(master_df)):
+    inventory_index.rebuild(master_df, previous_master_name)
+document_ids = DocumentIdIndex(os.path.join(output_folder, STATE_FOLDER, DOCUMENT_ID_INDEX_FILE))
+if not document_ids.is_current(previous_master_name, len(master_df)):
+    document_ids.seed(master_df, previous_master_name)
+
+# ==================================================
+# Change-feed state — directory mtimes for this scanType
+# ==================================================
+dir_state_path = dir_state_file(output_folder, scanType)
+dir_state = load_dir_state(dir_state_path)
+force_full_walk = forceFullWalkVar.get()
+scan_delta = []
+
+# Walk rules — global and per-collection include/exclude patterns; hits are reported after the scan
+walk_rules_config = load_walk_rules(output_folder)
+walk_rules = {}   # collection key → WalkRules
+walk_rule_hits = Counter()
+
+def rules_for(collection_key):
+    if collection_key not in walk_rules:
+        walk_rules[collection_key] = collection_walk_rules(walk_rules_config, collection_key, extensions)
+    return walk_rules[collection_key]
+
+# Work list from a dry run — its collections are the scan scope and its listing replaces the walk
+work_list = None
+if workListVar.get() and not dryRunVar.get():
+    try:
+        work_list = load_scan_plan(workListVar.get(), rootFolder, scanType, extensions)
+    except ValueError as e:
+        sys.exit(f"Work list {workListVar.get()} cannot be used: {e}")
+
+# Chunk-level Merkle manifests — chunk hashes of files hashed this run, by full path
+merkle_enabled = merkleVar.get()
+merkle_fresh = {}
+
+# SHA256SUMS.txt seeds, by collection root — used for new files when SHA-256 is the only checksum
+sha256_seeds = {}
+seed_sums_usable = seedSumsVar.get() and not checksum_audit and set(checksum_algorithms) <= {"sha256"}
+
+# Previous master rows for this scanType, keyed by relativePath
+previous_row_index = {}
+if not master_df.empty and {"relativePath", "scanType", "format"}.issubset(master_df.columns):
+    prev_mask = (master_df["scanType"] == scanType) & (master_df["format"] != "text/csv")
+    previous_row_index = dict(zip(master_df.loc[prev_mask, "relativePath"], master_df.index[prev_mask]))
+
+def previous_row(rel):
+    return {k: ("" if pd.isna(v) else v) for k, v in master_df.loc[previous_row_index[rel]].items()}
+
+def file_digests(full, rel, technical=None, chunks=None):
+    """Checksum columns {column: digest} for a scanned file under the selected profile.
+
+    technical, if a dict, receives the file's technical metadata columns from
+    the same read; chunks, if a ChunkHasher, is fed the same bytes.
+
+    In a fast hash audit only the fast digest is computed; SHA-256 is carried
+    forward from the previous master row while the fast digest still matches,
+    and recomputed (with a warning) when it does not.
+    """
+    algorithms = checksum_algorithms
+    fast_col = CHECKSUM_COLUMNS[FAST_HASH_ALGORITHM]
+    extras = [chunks] if chunks is not None else []
+    if checksum_audit and rel in previous_row_index:
+        prev = previous_row(rel)
+        if prev.get(fast_col) and prev.get("checksumSHA256"):
+            digests = {CHECKSUM_COLUMNS[a]: v for a, v in generate_checksums(full, algorithms, technical=technical, extra_hashers=extras).items()}
+            if not digests or digests[fast_col] == prev[fast_col]:
+                if digests:
+                    digests["checksumSHA256"] = prev["checksumSHA256"]
+                return digests
+            scan_warnings.append({"level": "WARN", "file": full, "issue": "Content changed since last checksum — SHA-256 recomputed"})
+    if "sha256" not in algorithms:
+        algorithms = ("sha256",) + algorithms
+    return {CHECKSUM_COLUMNS[a]: v for a, v in generate_checksums(full, algorithms, technical=technical, extra_hashers=extras).items()}
+
+def technical_overrides(prev, full):
+    """Technical metadata columns for a reused row: carried forward, or read
+    from the header alone when the previous row predates them."""
+    if prev.get("pageCount", "") != "":
+        return {c: prev.get(c, "") for c in TECHNICAL_COLUMNS}
+    if full.lower().endswith(TECHNICAL_EXTENSIONS):
+        return read_technical_metadata_file(full)
+    return {}
+
+def full_walk_due(coll_state):
+    last = coll_state.get("lastFullWalk")
+    if not last:
+        return True
+    return (datetime.now() - datetime.fromisoformat(last)).days >= FULL_WALK_INTERVAL_DAYS
 
 # ==================================================
 # Progress window
@@ -776,19 +4225,34 @@ progress_win = Tk()
 progress_win.title("Scanning…")
 progress_win.resizable(False, False)
 progress_win.geometry("520x90")
+progress_win.protocol("WM_DELETE_WINDOW", lambda: None)  # Closed automatically when the scan finishes
 
 _prog_label = Label(progress_win, text="Starting scan…", anchor="w", padx=12, pady=8)
 _prog_label.pack(fill="x")
 _prog_count = Label(progress_win, text="", anchor="w", padx=12, fg="#555")
 _prog_count.pack(fill="x")
 
-_scanned_total = [0]
-
-def _update_progress(filename, collection):
-    _scanned_total[0] += 1
-    _prog_label.config(text=f"[{collection}]  {filename}")
-    _prog_count.config(text=f"{_scanned_total[0]} file(s) scanned")
-    progress_win.update()
+progress = ProgressAggregator()
+progress_status_path = os.path.join(output_folder, STATE_FOLDER, PROGRESS_STATUS_FILE)
+os.makedirs(os.path.dirname(progress_status_path), exist_ok=True)
+_poll_ticks = [0]
+
+def _poll_progress():
+    snap = progress.snapshot()
+    line, detail = format_progress(snap)
+    _prog_label.config(text=line)
+    _prog_count.config(text=detail)
+    running = scan_thread.is_alive()
+    if _poll_ticks[0] % PROGRESS_POLL_HZ == 0 or not running:
+        try:
+            write_progress_status(progress_status_path, dict(snap, running=running))
+        except OSError:
+            pass
+    _poll_ticks[0] += 1
+    if running:
+        progress_win.after(1000 // PROGRESS_POLL_HZ, _poll_progress)
+    else:
+        progress_win.quit()
 
 # ==================================================
 # Scan, generate subset CSVs, and append newest metadata
@@ -803,6 +4267,7 @@ categories = [
 # Pre-scan mapping check
 # ==================================================
 unmapped = []
+in_scope = []   # (cat, inst, coll) the scan will read — planned by a dry run
 for cat in categories:
     cat_path = os.path.join(rootFolder, cat)
     if not os.path.isdir(cat_path):
@@ -810,16 +4275,33 @@ for cat in categories:
     targets = CATEGORY_TARGETS.get(cat, [])
     for inst in [d for d in os.listdir(cat_path) if os.path.isdir(os.path.join(cat_path, d))]:
         for coll in [d for d in os.listdir(os.path.join(cat_path, inst)) if os.path.isdir(os.path.join(cat_path, inst, d))]:
-            if scanMode == "Single Collection" and (inst != institution or coll != collection):
+            if work_list is not None:
+                if f"{cat}/{inst}/{coll}" not in work_list["collections"]:
+                    continue
+            elif scanMode == "Single Collection" and (inst != institution or coll != collection):
                 continue
-            if scanMode == "All Collections (selected institution)" and inst != institution:
+            elif scanMode == "All Collections (selected institution)" and inst != institution:
                 continue
+            la_missing = False
             if "LA" in targets and mappingDF is not None:
                 if mappingDF[(mappingDF["institutionCode"] == inst) & (mappingDF["collectionCode"] == coll)].empty:
                     unmapped.append(f"[LA] {cat}/{inst}/{coll}")
+                    la_missing = True
             if "AtoM" in targets and atomMappingDF is not None and "institutionCode" in atomMappingDF.columns:
                 if atomMappingDF[(atomMappingDF["institutionCode"] == inst) & (atomMappingDF["collectionCode"] == coll)].empty:
                     unmapped.append(f"[AtoM] {cat}/{inst}/{coll}")
+            # File/byte totals for progress ETA
+            if la_missing:
+                continue
+            in_scope.append((cat, inst, coll))
+            if work_list is not None:
+                planned = work_list["collections"][f"{cat}/{inst}/{coll}"]
+                progress.add_totals(planned["files"], planned["bytes"])
+            elif not dryRunVar.get():
+                progress.add_totals(*estimate_collection_totals(
+                    os.path.join(cat_path, inst, coll), dir_state.get(f"{cat}/{inst}/{coll}", {}), extensions,
+                    rules_for(f"{cat}/{inst}/{coll}"),
+                ))
 
 if unmapped:
     msg = "The following collections have no mapping entry and will be skipped:\n\n" + "\n".join(unmapped)
@@ -827,214 +4309,427 @@ if unmapped:
     if not messagebox.askyesno("Missing Mappings", msg):
         sys.exit(0)
 
-for cat in categories:
-    cat_path = os.path.join(rootFolder, cat)
-    if not os.path.isdir(cat_path):
-        continue
-
-    insts = [d for d in os.listdir(cat_path) if os.path.isdir(os.path.join(cat_path, d))]
-    for inst in insts:
-        inst_path = os.path.join(cat_path, inst)
-        collections = [d for d in os.listdir(inst_path) if os.path.isdir(os.path.join(inst_path, d))]
-        for coll in collections:
-            if scanMode == "Single Collection" and (inst != institution or coll != collection):
-                continue
-            if scanMode == "All Collections (selected institution)" and inst != institution:
-                continue
+# ==================================================
+# Dry run — plan only: counts, time estimate and work list, then stop
+# ==================================================
+if dryRunVar.get():
+    progress_win.withdraw()
+    plan = build_scan_plan(
+        rootFolder, scanType, fileFilterVar.get(), in_scope, dir_state,
+        load_io_overrides(output_folder), load_io_throughput(output_folder), walk_rules_config,
+        reread_all=checksum_audit,
+    )
+    plan_path = os.path.join(output_folder, f"scan_plan_{scan_type_slug(scanType)}_{RUN_TIMESTAMP}")
+    write_scan_plan(plan, plan_path)
+    summary = scan_plan_summary(plan)
+    print("\n".join(summary))
+    print(f"Work list written: {plan_path}.json")
+    messagebox.showinfo("Scan Plan", "\n".join(summary) + f"\n\nWork list: {plan_path}.json")
+    sys.exit(0)
+
+def generate_collection_derivatives(records, collection_root):
+    """Thumbnails and access JPEGs for a collection's image masters, recorded as row overrides.
+
+    derivatives/derivative_index.json remembers the master checksum each
+    derivative was made from; masters with the same checksum keep their
+    derivatives if the files are still there, the rest are rendered on the
+    derivative pool.
+    """
+    index_path = os.path.join(collection_root, DERIVATIVES_FOLDER, DERIVATIVE_INDEX_FILE)
+    index = load_dir_state(index_path)
+    key_column = checksum_columns[0]
+    jobs = {}
+
+    def record_overrides(r, entry):
+        r.overrides = dict(r.overrides or {}, **{
+            "thumbnailPath":   entry["thumbnail"][0],
+            "thumbnailSHA256": entry["thumbnail"][1],
+            "accessPath":      ";".join(path for path, _ in entry["access"]),
+            "accessSHA256":    ";".join(digest for _, digest in entry["access"]),
+        })
 
-            targets = CATEGORY_TARGETS.get(cat, [])
-            la_rows = mappingDF[(mappingDF["institutionCode"] == inst) & (mappingDF["collectionCode"] == coll)] if mappingDF is not None else pd.DataFrame()
-            if "LA" in targets and la_rows.empty:
-                print(f"Skipping {inst}/{coll} — no LA mapping found")
-                continue
-            meta = la_rows.iloc[0] if not la_rows.empty else None
-
-            if clearPreviousMetadataVar.get():
-                meta_folder_pre = os.path.join(inst_path, coll, "metadata")
-                if os.path.isdir(meta_folder_pre):
-                    for old_file in os.listdir(meta_folder_pre):
-                        if old_file.lower().endswith(".csv"):
-                            try:
-                                os.remove(os.path.join(meta_folder_pre, old_file))
-                            except Exception as e:
-                                print(f"Could not delete {old_file}: {e}")
-
-            # Look up AtoM mapping row early so scan_collection can use it
-            atom_meta_pre = {}
-            if atomMappingDF is not None and "institutionCode" in atomMappingDF.columns and "collectionCode" in atomMappingDF.columns:
-                atom_rows_match = atomMappingDF[
-                    (atomMappingDF["institutionCode"] == inst) &
-                    (atomMappingDF["collectionCode"] == coll)
-                ]
-                if not atom_rows_match.empty:
-                    atom_meta_pre = atom_rows_match.iloc[0]
-
-            scanned = scan_collection(cat, inst, coll, meta, atom_meta_pre)
-
-            la_only = "LA" in targets
-            atom_only = targets == ["AtoM"]
-
-            if la_only or not atom_only:
-                all_rows.extend(scanned)
-
-            subset_rows = [
-                r for r in scanned
-                    if (
-                        r["format"] != "text/csv" and
-                        r["scanType"] == scanType
-                    )
-            ]
-            if subset_rows:
-                meta_folder = os.path.join(inst_path, coll, "metadata")
-                os.makedirs(meta_folder, exist_ok=True)
+    for r in records:
+        if not r.fileName.lower().endswith(DERIVATIVE_EXTENSIONS):
+            if r.fileName.lower().endswith(RAW_EXTENSIONS):
+                scan_warnings.append({"level": "INFO", "file": r.fullPath, "type": "Derivative skipped",
+                                      "issue": "RAW derivatives need rawpy (pip install rawpy)"})
+            continue
+        key = os.path.relpath(r.fullPath, collection_root).replace("\\", "/")
+        entry = index.get(key)
+        checksum = r.checksums.get(key_column)
+        if (entry and checksum and entry["source"] == checksum
+                and all(os.path.isfile(os.path.join(rootFolder, p)) for p in [entry["thumbnail"][0]] + [p for p, _ in entry["access"]])):
+            record_overrides(r, entry)
+            derivative_counts["reused"] += 1
+            continue
+        thumb_path, access_path = derivative_paths(r.fullPath, collection_root)
+        jobs[derivative_pool.submit(render_derivatives, r.fullPath, thumb_path, access_path)] = (r, key, checksum, thumb_path)
+
+    for future in concurrent.futures.as_completed(jobs):
+        r, key, checksum, thumb_path = jobs[future]
+        try:
+            result = future.result()
+        except Exception as e:
+            scan_warnings.append({"level": "WARN", "file": r.fullPath, "type": "Derivative failed", "issue": str(e)})
+            derivative_counts["failed"] += 1
+            continue
+        index[key] = {
+            "source": checksum,
+            "thumbnail": [os.path.relpath(thumb_path, rootFolder), result["thumbnail"]],
+            "access": [[os.path.relpath(p, rootFolder), digest] for p, digest in result["access"]],
+        }
+        record_overrides(r, index[key])
+        derivative_counts["rendered"] += 1
+        derivative_counts["pages"] += len(result["access"])
+    if jobs:
+        save_dir_state(index_path, index)
+
+def generate_collection_phashes(records):
+    """Perceptual hashes of a collection's image masters, recorded as row overrides.
+
+    Hashes are kept by checksum in PHASH_INDEX_FILE, so a master already
+    hashed in any collection or storage tier is not decoded again.
+    """
+    images = [r for r in records if r.fileName.lower().endswith(PHASH_EXTENSIONS) and r.checksums.get("checksumSHA256")]
+    known = phash_store.lookup(r.checksums["checksumSHA256"] for r in images)
+    jobs = {r.checksums["checksumSHA256"]: r.fullPath for r in images if r.checksums["checksumSHA256"] not in known}
+    hashed, failed = compute_perceptual_hashes(jobs, phash_pool, phash_store)
+    for path, e in failed:
+        scan_warnings.append({"level": "WARN", "file": path, "type": "Perceptual hash failed", "issue": str(e)})
+    phash_counts["hashed"] += len(hashed)
+    phash_counts["reused"] += len(images) - len(jobs)
+    phash_counts["failed"] += len(failed)
+    known.update(hashed)
+    for r in images:
+        phash = known.get(r.checksums["checksumSHA256"])
+        if phash:
+            r.overrides = dict(r.overrides or {}, **{PHASH_COLUMN: phash})
+
+def write_collection_outputs(cat, inst, coll, inst_path, targets, meta, atom_meta_pre, scanned):
+    """Per-collection output stage: metadata CSVs, the metadata file row and AtoM rows."""
+    la_only = "LA" in targets
+    atom_only = targets == ["AtoM"]
+
+    if derivative_pool is not None:
+        generate_collection_derivatives(scanned, os.path.join(inst_path, coll))
+    if phash_pool is not None:
+        generate_collection_phashes(scanned)
+
+    if la_only or not atom_only:
+        all_rows.extend(scanned)
+
+    if exportSumsVar.get():
+        collection_root = os.path.join(inst_path, coll)
+        entries = {}
+        for r in scanned:
+            rel = os.path.relpath(r.fullPath, collection_root).replace(os.sep, "/")
+            if r.checksums.get("checksumSHA256") and not rel.startswith("metadata/"):
+                entries[rel] = r.checksums["checksumSHA256"]
+        if entries:
+            written = write_sha256sums(collection_root, entries, scanType)
+            print(f"{SHA256SUMS_FILE} written for {inst}/{coll} ({cat}): {written} file(s)")
+
+    subset_rows = [r for r in scanned if r.format != "text/csv"]
+    if subset_rows:
+        meta_folder = os.path.join(inst_path, coll, "metadata")
+        os.makedirs(meta_folder, exist_ok=True)
+        scanDateHuman = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        def write_header_csv(path, df):
+            """Write the CSV and return its checksums, hashed while writing."""
+            with HashingWriter(path, dict.fromkeys(("sha256",) + checksum_algorithms)) as f:
+                f.write(f"scanType,{scanType}\n")
+                f.write(f"scanMode,{scanMode}\n")
+                f.write(f"scanTimestamp,{RUN_TIMESTAMP}\n")
+                f.write(f"scanDate,{scanDateHuman}\n")
+                f.write(f"institutionCode,{inst}\n")
+                f.write(f"collectionCode,{coll}\n\n")
+                df.to_csv(f, index=False, lineterminator='\n')
+            print(f"Collection metadata CSV generated: {path}")
+            return f.checksums()
+
+        # LA format CSV
+        la_checksums = {}
+        if "LA" in targets:
+            subset_path = os.path.join(meta_folder, f"{coll}_{cat}_metadata_la_{RUN_TIMESTAMP}.csv")
+            la_checksums = write_header_csv(subset_path, records_to_frame(subset_rows, collection_meta, checksum_columns))
+
+        # AtoM format CSV — written after AtoM row generation below
+
+        # Use LA path for the master row reference (LA only)
+        subset_path = os.path.join(meta_folder, f"{coll}_{cat}_metadata_la_{RUN_TIMESTAMP}.csv") if "LA" in targets else ""
+
+        now_ts = datetime.now().strftime("%Y:%m:%d %H:%M:%S")
+        if meta is not None:
+            digests = {CHECKSUM_COLUMNS[algorithm]: digest for algorithm, digest in la_checksums.items()}
+            all_rows.append(FileRecord(
+                register_collection(cat, inst, coll, meta, atom_meta_pre),
+                "Text", "text/csv",
+                os.path.splitext(os.path.basename(subset_path))[0],
+                (
+                    f"Metadata file for {inst}_{coll}" if scanMode == "Single Collection"
+                    else f"Metadata file for {inst}" if scanMode == "All Collections (selected institution)"
+                    else "Metadata file for all collections held by NSCF partner institutions"
+                ) + f" [{build_extent_summary(subset_rows)}]",
+                now_ts,
+                document_ids.assign([(metadata_document_id_prefix(inst, coll, cat), os.path.relpath(subset_path, rootFolder))])[0],
+                os.path.basename(subset_path),
+                subset_path,
+                os.path.relpath(subset_path, rootFolder),
+                f"{cat}_metadata",
+                digests,
+                overrides={
+                    "audience": "Data curators; Collection managers",
+                    "source":   f"Original digital assets — {inst}_{coll} ({cat})",
+                    "subject":  "Metadata",
+                },
+            ))
+
+    # --------------------------------------------------
+    # AtoM output — generate parent + item rows
+    # --------------------------------------------------
+    if "AtoM" in CATEGORY_TARGETS.get(cat, []) and atomMappingDF is not None:
+        try:
+            atom_meta = atomMappingDF[
+                (atomMappingDF["institutionCode"] == inst) &
+                (atomMappingDF["collectionCode"] == coll)
+            ].iloc[0]
+        except IndexError:
+            scan_warnings.append({"level": "WARN", "file": "", "issue": f"No AtoM mapping row for {inst}/{coll} — skipped"})
+            atom_meta = {}
+
+        parent_legacy_id = f"{inst}_{coll}_{cat}"
+        inst_name = INSTITUTION_CODE_MAP.get(inst, inst)
+
+        # Parent row
+        parent_row = {col: "" for col in ATOM_COLUMNS}
+        parent_row["legacyId"]           = parent_legacy_id
+        parent_row["title"]              = atom_meta.get("title", f"{inst} {coll}")
+        parent_row["levelOfDescription"] = atom_meta.get("levelOfDescription", "Collection")
+        parent_row["institutionIdentifier"] = inst
+        for col in ATOM_COLUMNS:
+            if col in atom_meta and not parent_row[col]:
+                parent_row[col] = atom_meta.get(col, "")
+        if not parent_row["repository"]:
+            parent_row["repository"] = inst_name
+
+        # Build extentAndMedium summary from child items
+        parent_row["extentAndMedium"] = build_extent_summary(subset_rows)
+
+        atom_rows.append(parent_row)
+
+        # Item rows — one per scanned file in this collection
+        for item in subset_rows:
+            item_row = {col: "" for col in ATOM_COLUMNS}
+            item_row["parentId"]            = parent_legacy_id
+            item_row["identifier"]          = item.documentId.replace(" ", "_")
+            item_row["title"]               = item.title
+            item_row["levelOfDescription"]  = "Item"
+            item_row["repository"]          = atom_meta.get("repository", "") or inst_name
+            item_row["institutionIdentifier"] = inst
+            item_row["digitalObjectPath"]   = item.relativePath
+            item_row["eventDates"]          = item.created
+            item_row["eventStartDates"]     = item.created
+            item_row["eventTypes"]          = atom_meta.get("eventTypes", "creation")
+            item_row["eventActors"]         = atom_meta.get("eventActors", "")
+            item_row["eventActorHistories"] = atom_meta.get("eventActorHistories", "")
+            item_row["language"]            = atom_meta.get("language", "")
+            item_row["script"]              = atom_meta.get("script", "")
+            item_row["accessConditions"]    = atom_meta.get("accessConditions", "")
+            item_row["reproductionConditions"] = atom_meta.get("reproductionConditions", "")
+            item_row["publicationStatus"]   = atom_meta.get("publicationStatus", "")
+            item_row["culture"]             = atom_meta.get("culture", "")
+            item_row["extentAndMedium"]     = f"1 {item.format.split('/')[-1].upper()} file"
+            item_row["checksumSHA256"]      = item.checksums.get("checksumSHA256", "")
+            for col in extra_checksum_columns:
+                item_row[col] = item.checksums.get(col, "")
+            item_row["scanType"]            = scanType
+            atom_rows.append(item_row)
+
+        # Write AtoM per-collection metadata CSV now that rows are generated
+        if subset_rows:
+            meta_folder_atom = os.path.join(inst_path, coll, "metadata")
+            os.makedirs(meta_folder_atom, exist_ok=True)
+            atom_subset_rows = [r for r in atom_rows if str(r.get("parentId", "") or "").startswith(f"{inst}_{coll}_")]
+            if atom_subset_rows:
+                atom_subset_path = os.path.join(meta_folder_atom, f"{coll}_{cat}_metadata_atom_{RUN_TIMESTAMP}.csv")
                 scanDateHuman = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                with open(atom_subset_path, "w", newline="", encoding="utf-8") as f:
+                    f.write(f"scanType,{scanType}\n")
+                    f.write(f"scanMode,{scanMode}\n")
+                    f.write(f"scanTimestamp,{RUN_TIMESTAMP}\n")
+                    f.write(f"scanDate,{scanDateHuman}\n")
+                    f.write(f"institutionCode,{inst}\n")
+                    f.write(f"collectionCode,{coll}\n\n")
+                    pd.DataFrame(atom_subset_rows, columns=atom_output_columns).to_csv(f, index=False, lineterminator='\n')
+                print(f"Collection metadata CSV generated: {atom_subset_path}")
+
+
+scan_errors = []
+scanned_collections = []   # (cat, inst, coll, inst_path, targets, meta, atom_meta_pre) — watch mode scope
+OUTPUT_QUEUE_SIZE = 2  # Scanned collections waiting for the output stage
+output_queue = queue.Queue(maxsize=OUTPUT_QUEUE_SIZE)
+COLLECTIONS_IN_FLIGHT = 4  # Walked collections whose reads may run at once (different drives overlap)
+io_scheduler = DeviceScheduler(load_io_overrides(output_folder))
+# Pillow releases the GIL while decoding, resampling and encoding, so derivative
+# workers are threads: a process pool would re-run this script (and its GUI) per worker
+derivative_pool = (
+    concurrent.futures.ThreadPoolExecutor(DERIVATIVE_WORKERS, thread_name_prefix="damsg-derivative")
+    if derivativesVar.get() else None
+)
+derivative_counts = {"rendered": 0, "reused": 0, "failed": 0, "pages": 0}
+# Perceptual hashes decode on threads for the same reason
+phash_pool = (
+    concurrent.futures.ThreadPoolExecutor(PHASH_WORKERS, thread_name_prefix="damsg-phash")
+    if perceptualHashVar.get() else None
+)
+phash_store = PerceptualHashStore(os.path.join(output_folder, STATE_FOLDER, PHASH_INDEX_FILE)) if phash_pool is not None else None
+phash_counts = {"hashed": 0, "reused": 0, "failed": 0}
+
+def _output_worker():
+    """Write each collection's outputs while the scan moves on to the next collection."""
+    while True:
+        job = output_queue.get()
+        if job is None:
+            return
+        try:
+            write_collection_outputs(*job)
+        except BaseException as e:
+            scan_errors.append(e)
 
-                def write_header_csv(path, df):
-                    with open(path, "w", newline="", encoding="utf-8") as f:
-                        f.write(f"scanType,{scanType}\n")
-                        f.write(f"scanMode,{scanMode}\n")
-                        f.write(f"scanTimestamp,{RUN_TIMESTAMP}\n")
-                        f.write(f"scanDate,{scanDateHuman}\n")
-                        f.write(f"institutionCode,{inst}\n")
-                        f.write(f"collectionCode,{coll}\n\n")
-                        df.to_csv(f, index=False, lineterminator='\n')
-                    print(f"Collection metadata CSV generated: {path}")
-
-                # LA format CSV
-                if "LA" in targets:
-                    subset_path = os.path.join(meta_folder, f"{coll}_{cat}_metadata_la_{RUN_TIMESTAMP}.csv")
-                    write_header_csv(subset_path, pd.DataFrame(subset_rows))
-
-                # AtoM format CSV — written after AtoM row generation below
-
-                # Use LA path for the master row reference (LA only)
-                subset_path = os.path.join(meta_folder, f"{coll}_{cat}_metadata_la_{RUN_TIMESTAMP}.csv") if "LA" in targets else ""
-
-                now_ts = datetime.now().strftime("%Y:%m:%d %H:%M:%S")
-                if meta is not None:
-                    row_data = {
-                        # DwC Simple Multimedia Extension standard fields
-                        "identifier":    "",
-                        "type":          "Text",
-                        "format":        "text/csv",
-                        "title":         os.path.splitext(os.path.basename(subset_path))[0],
-                        "description":   (
-                            f"Metadata file for {inst}_{coll}" if scanMode == "Single Collection"
-                            else f"Metadata file for {inst}" if scanMode == "All Collections (selected institution)"
-                            else "Metadata file for all collections held by NSCF partner institutions"
-                        ) + f" [{build_extent_summary(subset_rows)}]",
-                        "created":       now_ts,
-                        "creator":       meta.get("creator", ""),
-                        "contributor":   meta.get("contributor", ""),
-                        "publisher":     meta.get("publisher", ""),
-                        "audience":      "Data curators; Collection managers",
-                        "source":        f"Original digital assets — {inst}_{coll} ({cat})",
-                        "license":       meta.get("license", ""),
-                        "rightsHolder":  meta.get("rightsHolder", ""),
-                        "references":    "",
-                        # System / archival fields
-                        "fileName":          os.path.basename(subset_path),
-                        "scanType":          scanType,
-                        "documentId":        generate_metadata_document_id(inst, coll, cat, os.path.relpath(subset_path, rootFolder)),
-                        "institutionCode":   inst,
-                        "collectionCode":    coll,
-                        "institutionName":   INSTITUTION_CODE_MAP.get(inst, inst),
-                        "holdingInstitution": meta.get("holdingInstitution", ""),
-                        "dateCreated":       now_ts,
-                        "subject":           "Metadata",
-                        "fullPath":          subset_path,
-                        "relativePath":      os.path.relpath(subset_path, rootFolder),
-                        "assetCategory":     f"{cat}_metadata",
-                        "scanModeApplied":   scanMode,
-                        "additionalNames":   "",
-                        "checksumSHA256":    generate_checksum(subset_path),
-                    }
-                    # Add ALL mapping columns automatically (same as scan_collection)
-                    for col in mappingDF.columns:
-                        if col not in row_data or (col == "additionalNames" and not row_data["additionalNames"].strip()):
-                            row_data[col] = meta.get(col, "")
-                    all_rows.append(row_data)
-
-            # --------------------------------------------------
-            # AtoM output — generate parent + item rows
-            # --------------------------------------------------
-            if "AtoM" in CATEGORY_TARGETS.get(cat, []) and atomMappingDF is not None:
-                try:
-                    atom_meta = atomMappingDF[
+def run_scan():
+    output_thread = threading.Thread(target=_output_worker, name="damsg-output", daemon=True)
+    output_thread.start()
+    try:
+        _scan_categories()
+    finally:
+        output_queue.put(None)
+        output_thread.join()
+        io_scheduler.shutdown()
+        if derivative_pool is not None:
+            derivative_pool.shutdown()
+        if phash_pool is not None:
+            phash_pool.shutdown()
+
+def _scan_categories():
+    def in_scope(cat, inst, coll):
+        if work_list is not None:
+            return f"{cat}/{inst}/{coll}" in work_list["collections"]
+        if scanMode == "Single Collection":
+            return inst == institution and coll == collection
+        if scanMode == "All Collections (selected institution)":
+            return inst == institution
+        return True
+
+    in_flight = deque()
+    for cat in categories:
+        cat_path = os.path.join(rootFolder, cat)
+        if not os.path.isdir(cat_path):
+            continue
+
+        insts = [d for d in os.listdir(cat_path) if os.path.isdir(os.path.join(cat_path, d))]
+        for inst in insts:
+            inst_path = os.path.join(cat_path, inst)
+            collections = [d for d in os.listdir(inst_path) if os.path.isdir(os.path.join(inst_path, d))]
+            for coll in collections:
+                if not in_scope(cat, inst, coll):
+                    continue
+
+                targets = CATEGORY_TARGETS.get(cat, [])
+                la_rows = mappingDF[(mappingDF["institutionCode"] == inst) & (mappingDF["collectionCode"] == coll)] if mappingDF is not None else pd.DataFrame()
+                if "LA" in targets and la_rows.empty:
+                    print(f"Skipping {inst}/{coll} — no LA mapping found")
+                    continue
+                meta = la_rows.iloc[0] if not la_rows.empty else None
+
+                if clearPreviousMetadataVar.get():
+                    meta_folder_pre = os.path.join(inst_path, coll, "metadata")
+                    if os.path.isdir(meta_folder_pre):
+                        for old_file in os.listdir(meta_folder_pre):
+                            if old_file.lower().endswith(".csv"):
+                                try:
+                                    os.remove(os.path.join(meta_folder_pre, old_file))
+                                except Exception as e:
+                                    print(f"Could not delete {old_file}: {e}")
+
+                # Look up AtoM mapping row early so scan_collection can use it
+                atom_meta_pre = {}
+                if atomMappingDF is not None and "institutionCode" in atomMappingDF.columns and "collectionCode" in atomMappingDF.columns:
+                    atom_rows_match = atomMappingDF[
                         (atomMappingDF["institutionCode"] == inst) &
                         (atomMappingDF["collectionCode"] == coll)
-                    ].iloc[0]
-                except IndexError:
-                    scan_warnings.append({"level": "WARN", "file": "", "issue": f"No AtoM mapping row for {inst}/{coll} — skipped"})
-                    atom_meta = {}
-
-                parent_legacy_id = f"{inst}_{coll}_{cat}"
-                inst_name = INSTITUTION_CODE_MAP.get(inst, inst)
-
-                # Parent row
-                parent_row = {col: "" for col in ATOM_COLUMNS}
-                parent_row["legacyId"]           = parent_legacy_id
-                parent_row["title"]              = atom_meta.get("title", f"{inst} {coll}")
-                parent_row["levelOfDescription"] = atom_meta.get("levelOfDescription", "Collection")
-                parent_row["institutionIdentifier"] = inst
-                for col in ATOM_COLUMNS:
-                    if col in atom_meta and not parent_row[col]:
-                        parent_row[col] = atom_meta.get(col, "")
-                if not parent_row["repository"]:
-                    parent_row["repository"] = inst_name
-
-                # Build extentAndMedium summary from child items
-                parent_row["extentAndMedium"] = build_extent_summary(subset_rows)
-
-                atom_rows.append(parent_row)
-
-                # Item rows — one per scanned file in this collection
-                for item in subset_rows:
-                    item_row = {col: "" for col in ATOM_COLUMNS}
-                    item_row["parentId"]            = parent_legacy_id
-                    item_row["identifier"]          = item.get("documentId", "").replace(" ", "_")
-                    item_row["title"]               = item.get("title", "")
-                    item_row["levelOfDescription"]  = "Item"
-                    item_row["repository"]          = atom_meta.get("repository", "") or inst_name
-                    item_row["institutionIdentifier"] = inst
-                    item_row["digitalObjectPath"]   = item.get("relativePath", "")
-                    item_row["eventDates"]          = item.get("dateCreated", "")
-                    item_row["eventStartDates"]     = item.get("dateCreated", "")
-                    item_row["eventTypes"]          = atom_meta.get("eventTypes", "creation")
-                    item_row["eventActors"]         = atom_meta.get("eventActors", "")
-                    item_row["eventActorHistories"] = atom_meta.get("eventActorHistories", "")
-                    item_row["language"]            = atom_meta.get("language", "")
-                    item_row["script"]              = atom_meta.get("script", "")
-                    item_row["accessConditions"]    = atom_meta.get("accessConditions", "")
-                    item_row["reproductionConditions"] = atom_meta.get("reproductionConditions", "")
-                    item_row["publicationStatus"]   = atom_meta.get("publicationStatus", "")
-                    item_row["culture"]             = atom_meta.get("culture", "")
-                    item_row["extentAndMedium"]     = f"1 {item.get('format', '').split('/')[-1].upper()} file"
-                    item_row["checksumSHA256"]      = item.get("checksumSHA256", "")
-                    item_row["scanType"]            = item.get("scanType", "")
-                    atom_rows.append(item_row)
-
-                # Write AtoM per-collection metadata CSV now that rows are generated
-                if subset_rows:
-                    meta_folder_atom = os.path.join(inst_path, coll, "metadata")
-                    os.makedirs(meta_folder_atom, exist_ok=True)
-                    atom_subset_rows = [r for r in atom_rows if str(r.get("parentId", "") or "").startswith(f"{inst}_{coll}_")]
-                    if atom_subset_rows:
-                        atom_subset_path = os.path.join(meta_folder_atom, f"{coll}_{cat}_metadata_atom_{RUN_TIMESTAMP}.csv")
-                        scanDateHuman = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                        with open(atom_subset_path, "w", newline="", encoding="utf-8") as f:
-                            f.write(f"scanType,{scanType}\n")
-                            f.write(f"scanMode,{scanMode}\n")
-                            f.write(f"scanTimestamp,{RUN_TIMESTAMP}\n")
-                            f.write(f"scanDate,{scanDateHuman}\n")
-                            f.write(f"institutionCode,{inst}\n")
-                            f.write(f"collectionCode,{coll}\n\n")
-                            pd.DataFrame(atom_subset_rows, columns=ATOM_OUTPUT_COLUMNS).to_csv(f, index=False, lineterminator='\n')
-                        print(f"Collection metadata CSV generated: {atom_subset_path}")
-
+                    ]
+                    if not atom_rows_match.empty:
+                        atom_meta_pre = atom_rows_match.iloc[0]
+
+                scanned_collections.append((cat, inst, coll, inst_path, targets, meta, atom_meta_pre))
+                in_flight.append(((cat, inst, coll, inst_path, targets, meta, atom_meta_pre), scan_collection(cat, inst, coll, meta, atom_meta_pre)))
+                # Collections reach the output stage in scan order
+                if len(in_flight) >= COLLECTIONS_IN_FLIGHT:
+                    job, finish = in_flight.popleft()
+                    output_queue.put(job + (finish(),))
+    while in_flight:
+        job, finish = in_flight.popleft()
+        output_queue.put(job + (finish(),))
+
+    # Collections in the change-feed state whose folders have since been deleted
+    for state_key in list(dir_state):
+        cat, inst, coll = state_key.split("/")
+        if cat in categories and in_scope(cat, inst, coll) and not os.path.lexists(os.path.join(rootFolder, cat, inst, coll)):
+            forget_collection(state_key)
+
+def _run_scan_thread():
+    try:
+        progress.start()
+        run_scan()
+    except BaseException as e:
+        scan_errors.append(e)
+
+# Scan in a worker thread; the progress window polls the aggregator
+scan_started = time.perf_counter()
+scan_thread = threading.Thread(target=_run_scan_thread, name="damsg-scan", daemon=True)
+scan_thread.start()
+progress_win.after(0, _poll_progress)
+progress_win.mainloop()
+scan_thread.join()
+if scan_errors:
+    progress_win.destroy()
+    raise scan_errors[0]
 
 progress_win.destroy()
 
+for label, kind, workers, ordering, done in io_scheduler.devices():
+    print(f"I/O: {label} — {kind}, {workers} concurrent read(s), {ordering} order, {done} file(s) read")
+record_io_throughput(output_folder, io_scheduler.throughput())
+if walk_rule_hits:
+    print("Walk rules (directories listed this run):")
+    print("\n".join(format_walk_rule_hits(walk_rule_hits)))
+if work_list is not None:
+    print(f"Scan time: {_format_duration(time.perf_counter() - scan_started)} (work list estimate ~{_format_duration(work_list['estimatedSeconds'])})")
+
+if derivative_pool is not None:
+    print(
+        f"Derivatives: {derivative_counts['rendered']} rendered ({derivative_counts['pages']} page(s)), "
+        f"{derivative_counts['reused']} unchanged, {derivative_counts['failed']} failed"
+    )
+if phash_pool is not None:
+    print(f"Perceptual hashes: {phash_counts['hashed']} computed, {phash_counts['reused']} known, {phash_counts['failed']} failed")
+
+# ==================================================
+# Save change-feed state and write scan delta report
+# ==================================================
+save_dir_state(dir_state_path, dir_state)
+if scan_delta:
+    delta_path = os.path.join(output_folder, f"scan_delta_{RUN_TIMESTAMP}.csv")
+    pd.DataFrame(scan_delta).to_csv(delta_path, index=False, encoding='utf-8', lineterminator='\n')
+    delta_counts = {c: sum(1 for d in scan_delta if d["change"] == c) for c in ("added", "removed", "modified")}
+    print(
+        f"Scan delta written ({delta_counts['added']} added, {delta_counts['removed']} removed, "
+        f"{delta_counts['modified']} modified): {delta_path}"
+    )
+else:
+    print("Scan delta: no changes since last run.")
+
 # ==================================================
 # Convert all_rows to DataFrame safely
 # ==================================================
@@ -1049,7 +4744,7 @@ expected_columns = [
     "assetCategory", "dateCreated", "scanModeApplied",
     "institutionCode", "collectionCode", "institutionName",
     "additionalNames", "holdingInstitution", "subject", "checksumSHA256",
-]
+] + extra_checksum_columns
 
 for col in expected_columns:
     if col not in master_df.columns:
@@ -1057,7 +4752,7 @@ for col in expected_columns:
 
 # Create new rows dataframe
 if all_rows:
-    new_rows_df = pd.DataFrame(all_rows)
+    new_rows_df = records_to_frame(all_rows, collection_meta, checksum_columns)
 else:
     new_rows_df = pd.DataFrame(columns=expected_columns)
 
@@ -1072,31 +4767,22 @@ if "documentId" not in new_rows_df.columns:
 if "documentId" not in master_df.columns:
     master_df["documentId"] = ""
 
-# Remove duplicates safely
+# Remove duplicates safely — keys looked up in the persistent master index
 if not new_rows_df.empty:
-    new_rows_df = new_rows_df[
-    ~new_rows_df.set_index(["documentId","scanType"]).index.isin(
-        master_df.set_index(["documentId","scanType"]).index
-    )
-]
+    already_in_master = master_index.known(zip(new_rows_df["documentId"], new_rows_df["scanType"]))
+    new_rows_df = new_rows_df[[not known for known in already_in_master]]
 
 # Preserve description for CSV metadata safely
 required_cols = {"format", "description", "documentId", "institutionCode", "collectionCode"}
 if not new_rows_df.empty and required_cols.issubset(new_rows_df.columns):
     mask_csv = new_rows_df["format"] == "text/csv"
 
-    if not master_df.empty and "documentId" in master_df.columns:
-        existing_desc = master_df.set_index("documentId")["description"].to_dict()
-
-        def preserve_or_generate_desc(row):
-            doc_id = row["documentId"]
-            if doc_id in existing_desc and existing_desc[doc_id].strip():
-                return existing_desc[doc_id]
-            return row.get("description", "")
-
-        new_rows_df.loc[mask_csv, "description"] = new_rows_df.loc[mask_csv].apply(preserve_or_generate_desc, axis=1)
-    else:
-        pass  # description already set on row during scan
+    existing_desc = master_index.descriptions(new_rows_df.loc[mask_csv, "documentId"]) if mask_csv.any() else {}
+    if existing_desc:
+        new_rows_df.loc[mask_csv, "description"] = [
+            existing_desc.get(str(doc_id), desc)
+            for doc_id, desc in zip(new_rows_df.loc[mask_csv, "documentId"], new_rows_df.loc[mask_csv, "description"])
+        ]
 
 # Fill additionalNames if empty
 if not new_rows_df.empty and "additionalNames" in new_rows_df.columns and "additionalNames" in mappingDF.columns:
@@ -1124,8 +4810,8 @@ updated_master_df = pd.concat([master_df, new_rows_df], ignore_index=True)
 mapping_columns = [col for col in mappingDF.columns if col in updated_master_df.columns]
 system_columns = [col for col in [
     "scanType","documentId","title","fileName","relativePath","fullPath",
-    "format","assetCategory","dateCreated","scanModeApplied","checksumSHA256"
-] if col in updated_master_df.columns]
+    "format","assetCategory","dateCreated","scanModeApplied","checksumSHA256",
+] + [c for c in CHECKSUM_COLUMNS.values() if c != "checksumSHA256"] + TECHNICAL_COLUMNS + DERIVATIVE_COLUMNS + [PHASH_COLUMN] if col in updated_master_df.columns]
 
 ordered_columns = system_columns + [col for col in mapping_columns if col not in system_columns]
 updated_master_df = updated_master_df[ordered_columns]
@@ -1139,8 +4825,6 @@ if "checksumSHA256" not in updated_master_df.columns:
 # ==================================================
 # Preservation Audit Report (Revised)
 # ==================================================
-from collections import Counter
-
 def run_preservation_audit(master_df, atom_df=None):
 
     audit_folder = os.path.join(rootFolder, "DAMSG_output")
@@ -1298,22 +4982,38 @@ def run_preservation_audit(master_df, atom_df=None):
 # Write master CSV/Excel
 # ==================================================
 output_choice = outputChoiceVar.get()
-if output_choice in ("CSV only", "Both"):
+if inventory_delta_mode:
+    # Append-only: the CSV delta is the stored inventory whatever the output choice;
+    # Excel, when chosen, holds the same delta rows
+    delta_df = updated_master_df.iloc[len(master_df):]
+    master_csv = os.path.join(output_folder, f"{DELTA_PREFIX['la']}{RUN_TIMESTAMP}.csv")
+    master_xlsx = os.path.join(output_folder, f"{DELTA_PREFIX['la']}{RUN_TIMESTAMP}.xlsx")
+    if not delta_df.empty:
+        delta_df.to_csv(master_csv, index=False, encoding='utf-8', lineterminator='\n')
+        record_inventory_file(inventory_manifest, RUN_TIMESTAMP, "la", "delta", os.path.basename(master_csv), len(delta_df))
+        print(f"Processing complete. Master delta written ({len(delta_df)} new rows): {master_csv}")
+        master_index.append(new_rows_df, len(master_df), os.path.basename(master_csv))
+        inventory_index.append(new_rows_df, len(master_df), os.path.basename(master_csv))
+        document_ids.mark_current(os.path.basename(master_csv), len(updated_master_df))
+    else:
+        print("Processing complete. No new master rows; no delta written.")
+elif output_choice in ("CSV only", "Both"):
     updated_master_df.to_csv(master_csv, index=False, encoding='utf-8', lineterminator='\n')
+    record_inventory_file(inventory_manifest, RUN_TIMESTAMP, "la", "snapshot", os.path.basename(master_csv), len(updated_master_df))
     print(f"Processing complete. Master CSV updated: {master_csv}")
+    # New rows were appended after the previous master's rows, so existing row numbers stay valid
+    master_index.append(new_rows_df, len(master_df), os.path.basename(master_csv))
+    inventory_index.append(new_rows_df, len(master_df), os.path.basename(master_csv))
+    document_ids.mark_current(os.path.basename(master_csv), len(updated_master_df))
+master_index.close()
+inventory_index.close()
+if document_ids.collisions:
+    print(f"{document_ids.collisions} documentId collision(s) resolved with longer hashes (see scan warnings)")
+document_ids.close()
 if output_choice in ("Excel only", "Both"):
-    updated_master_df.to_excel(master_xlsx, index=False, encoding='utf-8', lineterminator='\n')
-    print(f"Processing complete. Master Excel updated: {master_xlsx}")
-
-# ==================================================
-# Write scan warning log
-# ==================================================
-if scan_warnings:
-    log_path = os.path.join(rootFolder, "DAMSG_output", f"scan_warnings_{RUN_TIMESTAMP}.csv")
-    pd.DataFrame(scan_warnings).to_csv(log_path, index=False, encoding='utf-8', lineterminator='\n')
-    print(f"Scan warnings written ({len(scan_warnings)} issues): {log_path}")
-else:
-    print("Scan completed with no warnings.")
+    xlsx_df = updated_master_df.iloc[len(master_df):] if inventory_delta_mode else updated_master_df
+    sheets = write_xlsx_streaming(master_xlsx, xlsx_df, split_column="institutionCode")
+    print(f"Processing complete. Master Excel updated ({len(sheets)} sheet(s)): {master_xlsx}")
 
 # ==================================================
 # Accumulate AtoM master (same pattern as LA)
@@ -1321,24 +5021,30 @@ else:
 atom_csv = None
 updated_atom_df = atom_master_df.copy() if not atom_master_df.empty else pd.DataFrame()
 if atom_rows:
-    new_atom_df = pd.DataFrame(atom_rows, columns=ATOM_OUTPUT_COLUMNS)
-    updated_atom_df = pd.concat([atom_master_df, new_atom_df], ignore_index=True)
+    new_atom_df = pd.DataFrame(atom_rows, columns=atom_output_columns)
     # Deduplicate: use digitalObjectPath+scanType for items, legacyId for parents
-    if "digitalObjectPath" in updated_atom_df.columns and "scanType" in updated_atom_df.columns:
-        updated_atom_df = updated_atom_df.reset_index(drop=True)
-        item_mask = updated_atom_df["levelOfDescription"] == "Item"
-        parent_mask = ~item_mask
-        items_deduped = updated_atom_df[item_mask].drop_duplicates(subset=["digitalObjectPath", "scanType"], keep="last")
-        parents_deduped = updated_atom_df[parent_mask].drop_duplicates(subset=["legacyId"], keep="last")
-        # Rebuild interleaved order: parent then its items, in original row order
-        all_deduped = pd.concat([parents_deduped, items_deduped]).sort_index()
-        updated_atom_df = all_deduped.reset_index(drop=True)
-    atom_csv = os.path.join(rootFolder, "DAMSG_output", f"digital_asset_inventory_atom_{RUN_TIMESTAMP}.csv")
-    updated_atom_df.to_csv(atom_csv, index=False, encoding='utf-8', lineterminator='\n')
-    print(f"AtoM master CSV written ({len(updated_atom_df)} rows): {atom_csv}")
+    updated_atom_df = dedupe_atom_inventory(pd.concat([atom_master_df, new_atom_df], ignore_index=True))
+    if inventory_delta_mode:
+        # Rows superseded by this delta are dropped again whenever the view is rebuilt
+        atom_csv = os.path.join(output_folder, f"{DELTA_PREFIX['atom']}{RUN_TIMESTAMP}.csv")
+        new_atom_df.to_csv(atom_csv, index=False, encoding='utf-8', lineterminator='\n')
+        record_inventory_file(inventory_manifest, RUN_TIMESTAMP, "atom", "delta", os.path.basename(atom_csv), len(new_atom_df))
+        print(f"AtoM master delta written ({len(new_atom_df)} rows): {atom_csv}")
+    else:
+        atom_csv = os.path.join(rootFolder, "DAMSG_output", f"digital_asset_inventory_atom_{RUN_TIMESTAMP}.csv")
+        updated_atom_df.to_csv(atom_csv, index=False, encoding='utf-8', lineterminator='\n')
+        record_inventory_file(inventory_manifest, RUN_TIMESTAMP, "atom", "snapshot", os.path.basename(atom_csv), len(updated_atom_df))
+        print(f"AtoM master CSV written ({len(updated_atom_df)} rows): {atom_csv}")
 else:
     updated_atom_df = atom_master_df
 
+# Periodic compaction keeps rebuilds short; retention only drops snapshots the deltas can replace
+for kind in SNAPSHOT_PREFIX:
+    if deltas_since_snapshot(inventory_manifest, kind) >= COMPACT_AFTER_DELTAS:
+        compact_inventory(output_folder, inventory_manifest, kind)
+apply_snapshot_retention(output_folder, inventory_manifest)
+save_manifest(output_folder, inventory_manifest)
+
 # ==================================================
 # Mandatory field validator
 # ==================================================
@@ -1366,12 +5072,44 @@ if not updated_atom_df.empty and "levelOfDescription" in updated_atom_df.columns
 
 if validation_issues:
     for issue in validation_issues:
-        scan_warnings.append({"level": "WARN", "file": "", "issue": issue})
+        scan_warnings.append({"level": "WARN", "file": "", "issue": issue, "type": "Missing required field"})
     messagebox.showwarning(
         "Validation Issues",
         f"{len(validation_issues)} missing required field(s) found.\nSee scan_warnings CSV for details."
     )
 
+# ==================================================
+# Filename grammar validation — this run's new file rows
+# ==================================================
+filename_report = None
+if not new_rows_df.empty and {"title", "format"}.issubset(new_rows_df.columns):
+    named_rows = new_rows_df[new_rows_df["format"] != "text/csv"]
+    parsed_names = parse_filename_batch(named_rows["title"])
+    unparsed = parsed_names["parseIssue"] != ""
+    if unparsed.any():
+        filename_report = os.path.join(output_folder, f"filename_validation_{RUN_TIMESTAMP}.csv")
+        report_columns = [c for c in ("institutionCode", "collectionCode", "fileName", "relativePath") if c in named_rows.columns]
+        pd.concat(
+            [named_rows.loc[unparsed, report_columns], parsed_names.loc[unparsed, FILENAME_PARSE_COLUMNS[1:]]], axis=1
+        ).to_csv(filename_report, index=False, encoding='utf-8', lineterminator='\n')
+        scan_warnings.append({
+            "level": "WARN", "file": filename_report, "type": "Unparseable file name",
+            "issue": f"{int(unparsed.sum())} file name(s) do not follow SPECIMEN_CODE[_G#][_V#][_S#][_I#]",
+        })
+        print(f"Filename validation: {int(unparsed.sum())} of {len(named_rows)} name(s) not parsed: {filename_report}")
+
+# ==================================================
+# Close scan warning log and write per-issue-type summary
+# ==================================================
+scan_warnings.close()
+if scan_warnings:
+    summary_path = os.path.join(output_folder, f"scan_warnings_summary_{RUN_TIMESTAMP}.csv")
+    scan_warnings.write_summary(summary_path)
+    print(f"Scan warnings written ({len(scan_warnings)} issues, {scan_warnings.duplicates} repeats dropped): {scan_warnings.path}")
+    print(f"Scan warning summary: {summary_path}")
+else:
+    print("Scan completed with no warnings.")
+
 # ==================================================
 # Run preservation audit
 # ==================================================
@@ -1380,6 +5118,19 @@ audit_path = run_preservation_audit(
     updated_atom_df.to_dict("records") if not updated_atom_df.empty else None
 )
 
+# ==================================================
+# Near-duplicate report — perceptual hash clusters within this scanType
+# ==================================================
+if phash_store is not None:
+    tier_df = updated_master_df[(updated_master_df["scanType"] == scanType) & (updated_master_df["format"] != "text/csv")]
+    near_df = near_duplicate_report(tier_df, phash_store.lookup(tier_df["checksumSHA256"].dropna().astype(str)))
+    if near_df.empty:
+        print(f"Near-duplicates: none within {PHASH_MAX_DISTANCE} bit(s)")
+    else:
+        near_path = os.path.join(output_folder, f"near_duplicates_{RUN_TIMESTAMP}.csv")
+        near_df.to_csv(near_path, index=False, encoding='utf-8', lineterminator='\n')
+        print(f"Near-duplicate report ({near_df['clusterId'].nunique()} cluster(s), {len(near_df)} file(s)): {near_path}")
+
 # ==================================================
 # Optionally, open files automatically
 # ==================================================
@@ -1400,4 +5151,226 @@ for f in sorted(os.listdir(damsg_output_folder)):
     if f.endswith(".csv"):
         open_file(os.path.join(damsg_output_folder, f))
 if outputChoiceVar.get() in ("Both", "Excel only"):
-    open_file(master_xlsx)
\ No newline at end of file
+    open_file(master_xlsx)
+# ==================================================
+# Watch mode — keep ingesting new and changed files into the LA inventory
+# (master deltas) and a per-collection metadata CSV for this watch session
+# ==================================================
+def _next_timestamp(after):
+    """A run timestamp later than after, so every watch batch gets its own delta file."""
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    while stamp <= after:
+        time.sleep(0.2)
+        stamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return stamp
+
+if watchModeVar.get():
+    WATCH_TIMESTAMP = _next_timestamp(RUN_TIMESTAMP)
+    merkle_enabled = False   # Manifests are brought up to date by the next scan
+    watch_collections = {}
+    for cat, inst, coll, inst_path, targets, meta, atom_meta_pre in scanned_collections:
+        if "LA" in targets:
+            watch_collections[(cat, inst, coll)] = (inst_path, meta, atom_meta_pre)
+        else:
+            print(f"Watch mode: {inst}/{coll} ({cat}) is AtoM-only and is not watched; the next scan picks up its new files")
+    watch_roots = {os.path.join(inst_path, coll): (cat, inst, coll) for (cat, inst, coll), (inst_path, _, _) in watch_collections.items()}
+
+    watch_stop = threading.Event()
+    watch_errors = []
+    watch_stats = {"batches": 0, "failed": 0, "files": 0, "rows": 0, "pending": 0, "last": ""}
+    watch_metadata_columns = {}   # session metadata CSV path → column order fixed by its first batch
+    watch_debouncer = WatchDebouncer()
+    watch_backend = "filesystem events (watchdog)" if WATCHDOG_AVAILABLE else f"polling every {WATCH_POLL_SECONDS}s"
+    scan_warnings.open(os.path.join(output_folder, f"scan_warnings_{WATCH_TIMESTAMP}.csv"))
+    document_ids = DocumentIdIndex(os.path.join(output_folder, STATE_FOLDER, DOCUMENT_ID_INDEX_FILE))
+    io_scheduler = DeviceScheduler(load_io_overrides(output_folder))
+    if derivativesVar.get():
+        derivative_pool = concurrent.futures.ThreadPoolExecutor(DERIVATIVE_WORKERS, thread_name_prefix="damsg-derivative")
+    if phash_store is not None:
+        phash_pool = concurrent.futures.ThreadPoolExecutor(PHASH_WORKERS, thread_name_prefix="damsg-phash")
+
+    def append_watch_metadata(cat, inst, coll, inst_path, records):
+        """Append a batch's rows to the collection's metadata CSV for this watch session."""
+        meta_folder = os.path.join(inst_path, coll, "metadata")
+        os.makedirs(meta_folder, exist_ok=True)
+        path = os.path.join(meta_folder, f"{coll}_{cat}_metadata_la_{WATCH_TIMESTAMP}.csv")
+        df = records_to_frame(records, collection_meta, checksum_columns)
+        columns = watch_metadata_columns.get(path)
+        first = columns is None
+        if first:
+            columns = list(df.columns) + [c for c in TECHNICAL_COLUMNS if c not in df.columns]
+            watch_metadata_columns[path] = columns
+        with open(path, "a", newline="", encoding="utf-8") as f:
+            if first:
+                f.write(f"scanType,{scanType}\n")
+                f.write("scanMode,Watch\n")
+                f.write(f"scanTimestamp,{WATCH_TIMESTAMP}\n")
+                f.write(f"scanDate,{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"institutionCode,{inst}\n")
+                f.write(f"collectionCode,{coll}\n\n")
+            df.reindex(columns=columns).to_csv(f, index=False, header=first, lineterminator='\n')
+
+    def ingest_watch_batch(batch, indexes, state):
+        """Hash and describe one batch of settled files, then append the new rows as a master delta.
+
+        Returns the number of files described."""
+        master_keys, inventory, master_columns = indexes
+        grouped = {}
+        for full, size in batch:
+            for collection_root, key in watch_roots.items():
+                if full.startswith(collection_root + os.sep):
+                    grouped.setdefault(key, []).append((full, size))
+                    break
+
+        batch_records = []
+        for (cat, inst, coll), files in grouped.items():
+            inst_path, meta, atom_meta_pre = watch_collections[(cat, inst, coll)]
+            collection_key = register_collection(cat, inst, coll, meta, atom_meta_pre)
+            records, id_requests = [], []
+            futures = [
+                io_scheduler.submit(full, describe_file, cat, inst, coll, collection_key, meta, full, os.path.relpath(full, rootFolder), size)
+                for full, size in files
+            ]
+            for future in futures:
+                record, id_prefix = future.result()
+                records.append(record)
+                id_requests.append((id_prefix, record.relativePath))
+            for record, doc_id in zip(records, document_ids.assign(id_requests)):
+                record.documentId = doc_id
+            if derivative_pool is not None:
+                generate_collection_derivatives(records, os.path.join(inst_path, coll))
+            if phash_pool is not None:
+                generate_collection_phashes(records)
+            append_watch_metadata(cat, inst, coll, inst_path, records)
+            batch_records.extend(records)
+        if not batch_records:
+            return 0
+
+        # Changed files keep their documentId, so only new files reach the master
+        new_df = records_to_frame(batch_records, collection_meta, checksum_columns)
+        new_df = new_df[[not known for known in master_keys.known(zip(new_df["documentId"], new_df["scanType"]))]]
+        if new_df.empty:
+            return len(batch_records)
+        new_df = new_df[[c for c in master_columns if c in new_df.columns] + [c for c in new_df.columns if c not in master_columns]]
+        state["stamp"] = _next_timestamp(state["stamp"])
+        delta_name = f"{DELTA_PREFIX['la']}{state['stamp']}.csv"
+        new_df.to_csv(os.path.join(output_folder, delta_name), index=False, encoding='utf-8', lineterminator='\n')
+        record_inventory_file(inventory_manifest, state["stamp"], "la", "delta", delta_name, len(new_df))
+        master_keys.append(new_df, state["rows"], delta_name)
+        inventory.append(new_df, state["rows"], delta_name)
+        state["rows"] += len(new_df)
+        document_ids.mark_current(delta_name, state["rows"])
+        if deltas_since_snapshot(inventory_manifest, "la") >= COMPACT_AFTER_DELTAS:
+            compact_inventory(output_folder, inventory_manifest, "la")
+            apply_snapshot_retention(output_folder, inventory_manifest)
+        save_manifest(output_folder, inventory_manifest)
+        watch_stats["rows"] += len(new_df)
+        print(f"Watch: {len(new_df)} new row(s) appended to the master: {delta_name}")
+        return len(batch_records)
+
+    def _run_watch():
+        # SQLite connections stay in the thread that uses them
+        view_df, view_name = read_inventory_view(output_folder, inventory_manifest, "la")
+        master_keys = MasterKeyIndex(os.path.join(output_folder, STATE_FOLDER, MASTER_INDEX_FILE))
+        inventory = InventoryIndex(os.path.join(output_folder, INVENTORY_INDEX_FILE))
+        for index in (master_keys, inventory):
+            if not index.is_current(view_name, len(view_df)):
+                index.rebuild(view_df, view_name)
+        if not document_ids.is_current(view_name, len(view_df)):
+            document_ids.seed(view_df, view_name)
+        master_columns = list(view_df.columns) or list(updated_master_df.columns)
+        state = {"rows": len(view_df), "stamp": WATCH_TIMESTAMP}
+        del view_df
+
+        if WATCHDOG_AVAILABLE:
+            source = Observer()
+            for collection_root, key in watch_roots.items():
+                source.schedule(WatchEventHandler(watch_debouncer, collection_root, rules_for("/".join(key))), collection_root, recursive=True)
+        else:
+            source = ChangeFeedPoller(
+                watch_debouncer,
+                {collection_root: dir_state.get("/".join(key), {}).get("dirs", {}) for collection_root, key in watch_roots.items()},
+                rootFolder, {collection_root: rules_for("/".join(key)) for collection_root, key in watch_roots.items()},
+            )
+        source.start()
+        try:
+            while not watch_stop.is_set():
+                watch_debouncer.wait(1.0)
+                batch = watch_debouncer.ready()
+                while batch and not watch_stop.is_set():
+                    try:
+                        ingested = ingest_watch_batch(batch, (master_keys, inventory, master_columns), state)
+                    except Exception as e:
+                        # One bad batch (locked file, full disk) does not end the session;
+                        # its files are not retried here, the next scan picks them up
+                        watch_stats["failed"] += 1
+                        scan_warnings.append({
+                            "level": "ERROR", "file": os.path.commonpath([full for full, _ in batch]),
+                            "type": "Watch batch failed", "issue": f"{len(batch)} file(s) not ingested: {e}",
+                        })
+                        print(f"Watch: batch of {len(batch)} file(s) failed, still watching: {e}")
+                    else:
+                        watch_stats["batches"] += 1
+                        watch_stats["files"] += ingested
+                    watch_stats["last"] = datetime.now().strftime("%H:%M:%S")
+                    batch = watch_debouncer.ready()
+                watch_stats["pending"] = len(watch_debouncer)
+        except BaseException as e:
+            watch_errors.append(e)
+        finally:
+            source.stop()
+            source.join()
+            master_keys.close()
+            inventory.close()
+
+    watch_thread = threading.Thread(target=_run_watch, name="damsg-watch", daemon=True)
+    watch_win = Tk()
+    watch_win.title("Watching for new files…")
+    watch_win.resizable(False, False)
+    watch_win.geometry("520x130")
+    watch_win.protocol("WM_DELETE_WINDOW", watch_stop.set)
+    _watch_label = Label(watch_win, text=f"Watching {len(watch_roots)} collection(s) — {watch_backend}", anchor="w", padx=12, pady=8)
+    _watch_label.pack(fill="x")
+    _watch_count = Label(watch_win, text="", anchor="w", padx=12, fg="#555")
+    _watch_count.pack(fill="x")
+    Button(watch_win, text="Stop watching", command=watch_stop.set).pack(pady=8)
+
+    def _poll_watch():
+        _watch_count.config(text=(
+            f"{watch_stats['batches']} batch(es), {watch_stats['files']} file(s) ingested, "
+            + (f"{watch_stats['failed']} batch(es) failed, " if watch_stats["failed"] else "")
+            + f"{watch_stats['rows']} new master row(s), {watch_stats['pending']} settling"
+            + (f" — last batch {watch_stats['last']}" if watch_stats["last"] else "")
+        ))
+        if watch_thread.is_alive():
+            watch_win.after(500, _poll_watch)
+        else:
+            watch_win.quit()
+
+    print(f"Watch mode: {len(watch_roots)} collection(s), {watch_backend}. Close the watch window to stop.")
+    watch_thread.start()
+    watch_win.after(0, _poll_watch)
+    watch_win.mainloop()
+    watch_thread.join()
+    watch_win.destroy()
+    io_scheduler.shutdown()
+    if derivative_pool is not None:
+        derivative_pool.shutdown()
+    if phash_pool is not None:
+        phash_pool.shutdown()
+    document_ids.close()
+    scan_warnings.close()
+    print(
+        f"Watch mode stopped: {watch_stats['files']} file(s) ingested in {watch_stats['batches']} batch(es), "
+        f"{watch_stats['rows']} new master row(s); {len(watch_debouncer)} file(s) still settling are left for the next scan"
+        + (f"; {watch_stats['failed']} failed batch(es) are listed in the warnings log" if watch_stats["failed"] else "")
+    )
+    if scan_warnings:
+        summary_path = os.path.join(output_folder, f"scan_warnings_summary_{WATCH_TIMESTAMP}.csv")
+        scan_warnings.write_summary(summary_path)
+        print(f"Watch warnings written ({len(scan_warnings)} issues, {scan_warnings.duplicates} repeats dropped): {scan_warnings.path}")
+        print(f"Watch warning summary: {summary_path}")
+    if watch_errors:
+        raise watch_errors[0]
+if phash_store is not None:
+    phash_store.close()
@@ -0,0 +1,84 @@
+import hashlib
+
+import pandas as pd
+import pytest
+
+import damsg_core
+from damsg_core import DocumentIdIndex, ScanWarningLog
+
+
+def sha1(rel):
+    return hashlib.sha1(rel.encode("utf-8")).hexdigest()
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = DocumentIdIndex(str(tmp_path / "state" / "document_ids.sqlite"))
+    yield index
+    index.close()
+
+
+@pytest.fixture
+def warnings(monkeypatch):
+    log = ScanWarningLog()
+    monkeypatch.setattr(damsg_core, "scan_warnings", log)
+    return log
+
+
+def fake_digests(monkeypatch, digests):
+    """Give chosen paths chosen digests (40 hex characters, like SHA-1)."""
+    monkeypatch.setattr(damsg_core, "_path_digest", lambda rel: digests[rel].ljust(40, "f"))
+
+
+def test_new_paths_get_prefix_and_short_hash(index):
+    ids = index.assign([("ISAMMamTM1", "Mam\\TM1_HV.tif"), ("ISAMMamTM2", "Mam/TM2_HV.tif")])
+    assert ids == ["ISAMMamTM1" + sha1("Mam/TM1_HV.tif")[:8], "ISAMMamTM2" + sha1("Mam/TM2_HV.tif")[:8]]
+
+
+def test_a_path_keeps_its_id_across_batches_and_reopening(tmp_path):
+    path = str(tmp_path / "document_ids.sqlite")
+    index = DocumentIdIndex(path)
+    first = index.assign([("P", "a.tif")])
+    assert index.assign([("P", "a.tif"), ("P", "a.tif")]) == first * 2
+    index.close()
+    reopened = DocumentIdIndex(path)
+    assert reopened.assign([("P", "a.tif")]) == first
+    reopened.close()
+
+
+def test_seeded_ids_are_kept(index):
+    master = pd.DataFrame({"relativePath": ["Mam\\old.tif"], "documentId": ["LEGACY1"]})
+    index.seed(master, "digital_asset_inventory_la_1.csv")
+    assert index.assign([("P", "Mam/old.tif")]) == ["LEGACY1"]
+    assert index.is_current("digital_asset_inventory_la_1.csv", 1)
+
+
+def test_colliding_paths_get_longer_ids_in_path_order(index, warnings, monkeypatch):
+    fake_digests(monkeypatch, {"a.tif": "00000000aaaa", "b.tif": "00000000bbbb"})
+    assert index.assign([("P", "b.tif"), ("P", "a.tif")]) == ["P00000000bbbb", "P00000000"]
+    assert index.collisions == 1
+    assert warnings.summary[("WARN", "documentId collision")]["samples"] == ["b.tif"]
+
+
+def test_assignment_does_not_depend_on_request_order(tmp_path, monkeypatch):
+    fake_digests(monkeypatch, {p: "12345678" + str(n) * 4 for n, p in enumerate(["x.tif", "y.tif", "z.tif"])})
+    results = []
+    for name, order in (("forward", ["x.tif", "y.tif", "z.tif"]), ("reverse", ["z.tif", "y.tif", "x.tif"])):
+        index = DocumentIdIndex(str(tmp_path / name / "ids.sqlite"))
+        results.append(dict(zip(order, index.assign([("P", p) for p in order]))))
+        index.close()
+    assert results[0] == results[1]
+
+
+def test_id_taken_in_an_earlier_batch_is_extended(index, warnings, monkeypatch):
+    fake_digests(monkeypatch, {"a.tif": "00000000aaaa", "b.tif": "00000000bbbb"})
+    assert index.assign([("P", "a.tif")]) == ["P00000000"]
+    assert index.assign([("P", "b.tif")]) == ["P00000000bbbb"]
+
+
+def test_first_choice_taken_by_a_longer_id_from_the_same_batch(index, warnings, monkeypatch):
+    # b.tif is extended to P00000000abcd, which is exactly c.tif's first choice
+    fake_digests(monkeypatch, {"a.tif": "00000000aaaa", "b.tif": "00000000abcd", "c.tif": "0000abcd1234"})
+    ids = index.assign([("P", "a.tif"), ("P", "b.tif"), ("P0000", "c.tif")])
+    assert ids == ["P00000000", "P00000000abcd", "P00000000abcd1234"]
+    assert len(set(ids)) == 3
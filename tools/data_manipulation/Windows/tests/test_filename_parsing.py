@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from damsg_core import FILENAME_PARSE_COLUMNS, parse_filename_batch, parse_filename_description
+
+
+@pytest.mark.parametrize("stem, description", [
+    ("TM1235_HV", "Ventral view of specimen head"),
+    ("TM1235_HLL", "Left lateral view of specimen head"),
+    ("TM1235_label", "Close-up view of specimen label"),
+    ("TM1234_PU", "Unspecified view of specimen postcranium"),
+    ("TM1234_PU_G1_V1", "Unspecified view of specimen postcranium; group 1, view 1"),
+    ("TM1_HRDV", "Right dorso-ventral view of specimen head"),
+])
+def test_descriptions(stem, description):
+    assert parse_filename_description(stem) == description
+    assert parse_filename_batch([stem]).loc[0, "description"] == description
+
+
+def test_fields_and_issues():
+    out = parse_filename_batch(["TM1_HV_V2_G3_V4", "TM1_HV_X9", "TM1_QZ", "TM1_label_G2", "noUnderscore"])
+    assert list(out.columns) == FILENAME_PARSE_COLUMNS
+    assert out.loc[0, ["specimenCode", "structureCode", "viewCode", "group", "view", "section", "image"]].tolist() == \
+        ["TM1", "H", "V", 3, 4, None, None]
+    assert out.loc[0, "description"] == "Ventral view of specimen head; group 3, view 4"
+    assert out.loc[0, "parseIssue"] == ""
+    assert out.loc[1, "parseIssue"] == "unrecognised suffix 'X9'"
+    assert out.loc[2, "parseIssue"] == "unknown structure code 'Q'; unknown view code 'Z'"
+    # Label close-ups keep their fixed description; the group is still parsed
+    assert out.loc[3, ["structureCode", "viewCode", "group", "description"]].tolist() == \
+        ["", "", 2, "Close-up view of specimen label"]
+    assert out.loc[4, ["description", "parseIssue"]].tolist() == ["", "no structure/view code"]
+
+
+def test_blank_and_missing_stems_do_not_parse():
+    out = parse_filename_batch(["", None])
+    assert out["stem"].tolist() == ["", ""]
+    assert out["parseIssue"].tolist() == ["no structure/view code"] * 2
+
+
+def test_keeps_the_series_index_and_matches_the_single_parser():
+    stems = pd.Series(["TM1_HV", "TM2_HLL_G1", "TM1_HV", "bad"], index=[10, 20, 30, 40])
+    out = parse_filename_batch(stems)
+    assert out.index.tolist() == [10, 20, 30, 40]
+    assert out["stem"].tolist() == stems.tolist()
+    assert out["description"].tolist() == [parse_filename_description(s) for s in stems]
+    assert out.loc[10].drop("stem").equals(out.loc[30].drop("stem"))
@@ -0,0 +1,79 @@
+import pytest
+
+import damsg_core
+from damsg_core import ScanWarningLog, diff_manifests, read_sha256sums
+
+A, B, C, D = "a" * 64, "b" * 64, "c" * 64, "d" * 64
+
+
+def run_diff(left, right, tmp_dir):
+    tmp_dir.mkdir(exist_ok=True)
+    return sorted(diff_manifests(iter(left), iter(right), str(tmp_dir)))
+
+
+def test_same_changed_removed_added(tmp_path):
+    left = [("x/1.tif", A), ("x/2.tif", B), ("x/3.tif", C)]
+    right = [("x/1.tif", A), ("x/2.tif", D), ("x/4.tif", "e" * 64)]
+    assert run_diff(left, right, tmp_path) == [
+        ("added", "x/4.tif", "e" * 64, ""),
+        ("changed", "x/2.tif", B, D),
+        ("removed", "x/3.tif", C, ""),
+        ("same", "x/1.tif", A, A),
+    ]
+
+
+def test_renamed_file_is_reported_as_moved(tmp_path):
+    left = [("old/1.tif", A), ("keep.tif", B)]
+    right = [("new/1.tif", A), ("keep.tif", B)]
+    assert run_diff(left, right, tmp_path) == [
+        ("moved", "old/1.tif", A, "new/1.tif"),
+        ("same", "keep.tif", B, B),
+    ]
+
+
+def test_files_without_checksum_are_not_matched_as_moves(tmp_path):
+    assert run_diff([("a.tif", "")], [("b.tif", "")], tmp_path) == [
+        ("added", "b.tif", "", ""),
+        ("removed", "a.tif", "", ""),
+    ]
+
+
+def test_last_entry_of_a_repeated_path_wins(tmp_path):
+    left = [("a.tif", A), ("a.tif", B)]
+    right = [("a.tif", B)]
+    assert run_diff(left, right, tmp_path) == [("same", "a.tif", B, B)]
+
+
+def test_spilled_sort_runs_give_the_same_result(tmp_path, monkeypatch):
+    left = [(f"f{i:03d}.tif", f"{i:064x}") for i in range(50)]
+    right = [(f"f{i:03d}.tif", f"{i + (i % 7 == 0):064x}") for i in range(5, 55)]
+    expected = run_diff(left, right, tmp_path / "memory")
+    monkeypatch.setattr(damsg_core, "MANIFEST_SORT_RUN", 4)
+    assert run_diff(left, right, tmp_path / "spilled") == expected
+
+
+def test_read_sha256sums_formats_bom_and_skipped_lines(tmp_path):
+    sums = tmp_path / "SHA256SUMS.txt"
+    spaced = " ".join(A[i:i + 2] for i in range(0, 64, 2))
+    sums.write_text(
+        "\ufeff" + A.upper() + " *ISAM\\Mam\\1.tif\r\n"
+        + "# comment\r\n\r\n"
+        + spaced + "  ISAM/Mam/2.tif\r\n"
+        + B + "  ISAM/Mam/Thumbs.db\r\n"
+        + "not a checksum line\r\n"
+        + C + "  Other/3.tif\r\n",
+        encoding="utf-8",
+    )
+    warnings = ScanWarningLog()
+    rows = list(read_sha256sums(str(sums), under="ISAM", warnings=warnings))
+    assert rows == [("Mam/1.tif", A), ("Mam/2.tif", A)]
+    assert len(warnings) == 1
+    assert list(warnings.summary) == [("WARN", damsg_core.SHA256SUMS_SKIPPED)]
+
+
+@pytest.mark.parametrize("under", ["", "ISAM/"])
+def test_read_sha256sums_strips_a_bom_the_encoding_keeps(tmp_path, under):
+    sums = tmp_path / "SHA256SUMS.txt"
+    sums.write_bytes("\ufeff".encode("utf-8") + f"{A}  ISAM/1.tif\n".encode("utf-8"))
+    rows = list(read_sha256sums(str(sums), under=under, encoding="utf-8", warnings=ScanWarningLog()))
+    assert rows == [("1.tif" if under else "ISAM/1.tif", A)]
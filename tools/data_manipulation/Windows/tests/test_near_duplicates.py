@@ -0,0 +1,82 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import damsg_core
+from damsg_core import near_duplicate_clusters, near_duplicate_pairs, near_duplicate_report
+
+
+def brute_force_pairs(hashes, max_distance):
+    found = set()
+    for i in range(len(hashes)):
+        for j in range(i + 1, len(hashes)):
+            d = bin(int(hashes[i]) ^ int(hashes[j])).count("1")
+            if d <= max_distance:
+                found.add((i, j, d))
+    return found
+
+
+def random_hashes(seed, n=300):
+    """Random hashes plus copies of some of them with a few bits flipped, so
+    there are pairs at every distance up to 10."""
+    rng = np.random.default_rng(seed)
+    base = rng.integers(0, 2**64, size=n, dtype=np.uint64, endpoint=False)
+    near = []
+    for k in range(n // 2):
+        h = int(base[k])
+        for bit in rng.choice(64, size=k % 11, replace=False):
+            h ^= 1 << int(bit)
+        near.append(h)
+    return np.concatenate([base, np.array(near, dtype=np.uint64)])
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("max_distance", [0, 3, 6, 9])
+def test_pairs_match_brute_force(seed, max_distance):
+    hashes = random_hashes(seed)
+    i, j, d = near_duplicate_pairs(hashes, max_distance)
+    found = list(zip(i.tolist(), j.tolist(), d.tolist()))
+    assert len(found) == len(set(found))
+    assert set(found) == brute_force_pairs(hashes, max_distance)
+
+
+def test_pairs_across_batches(monkeypatch):
+    monkeypatch.setattr(damsg_core, "PHASH_BATCH", 7)
+    hashes = random_hashes(3, n=60)
+    i, j, d = near_duplicate_pairs(hashes, 6)
+    assert set(zip(i.tolist(), j.tolist(), d.tolist())) == brute_force_pairs(hashes, 6)
+
+
+def test_pairs_of_no_hashes():
+    i, j, d = near_duplicate_pairs(np.array([], dtype=np.uint64), 6)
+    assert len(i) == len(j) == len(d) == 0
+
+
+def test_clusters_link_chains_and_keep_shared_hashes():
+    a = "0000000000000000"
+    b = "000000000000000f"      # 4 bits from a
+    c = "00000000000000ff"      # 4 bits from b, 8 from a
+    far = "ffffffffffffffff"
+    lone = "0f0f0f0f0f0f0f0f"
+    clusters = near_duplicate_clusters([a, b, c, far, lone], max_distance=4, shared=[lone])
+    assert clusters[a] == (1, 0)
+    assert clusters[b] == (1, 4)
+    assert clusters[c] == (1, 8)
+    assert far not in clusters
+    assert clusters[lone][1] == 0 and clusters[lone][0] != 1
+
+
+def test_report_needs_two_different_checksums_per_cluster():
+    df = pd.DataFrame({
+        "checksumSHA256": ["s1", "s1", "s2", "s3"],
+        "relativePath": ["a.tif", "copy/a.tif", "b.tif", "c.tif"],
+        "scanType": "Working Drive", "institutionCode": "ISAM", "collectionCode": "Mam",
+    })
+    phashes = {"s1": "0000000000000000", "s2": "0000000000000001", "s3": "ffffffffffffffff"}
+    report = near_duplicate_report(df, phashes, max_distance=2)
+    assert list(report.columns) == damsg_core.NEAR_DUPLICATE_COLUMNS
+    assert report["relativePath"].tolist() == ["a.tif", "copy/a.tif", "b.tif"]
+    assert report["distance"].tolist() == [0, 0, 1]
+
+    # Exact copies alone are the preservation audit's business, not a cluster
+    assert near_duplicate_report(df[df["checksumSHA256"] == "s1"], phashes).empty
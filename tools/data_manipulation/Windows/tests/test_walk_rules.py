@@ -0,0 +1,92 @@
+import pytest
+
+import damsg_core
+from damsg_core import OTHER_FILE_TYPES_RULE, ScanWarningLog, WalkRules, collection_walk_rules
+
+TIFF = (".tif", ".tiff")
+
+
+@pytest.mark.parametrize("path, is_dir, expected", [
+    ("Mam/TM1_HV.tif", False, (True, None)),
+    ("Mam/TM1_HV.TIFF", False, (True, None)),
+    ("Mam/notes.txt", False, (False, OTHER_FILE_TYPES_RULE)),
+    ("Mam", True, (True, None)),
+    ("Mam/@eaDir", True, (False, "exclude @eaDir/ (built-in)")),
+    ("$RECYCLE.BIN", True, (False, "exclude $RECYCLE.BIN/ (built-in)")),
+    ("Mam/THUMBS.DB", False, (False, "exclude thumbs.db (built-in)")),
+    ("Mam/.hidden.tif", False, (False, "exclude .* (built-in)")),
+    (".git", True, (True, None)),
+])
+def test_built_in_rules(path, is_dir, expected):
+    assert WalkRules(TIFF).match(path, is_dir) == expected
+
+
+def test_folder_glob_matches_at_any_depth_and_anchored_glob_at_the_root():
+    rules = WalkRules(TIFF, exclude=[("scratch/", "global"), ("/top/", "global")])
+    assert rules.match("scratch", True) == (False, "exclude scratch/ (global)")
+    assert rules.match("a/b/scratch", True)[0] is False
+    assert rules.match("top", True)[0] is False
+    assert rules.match("a/top", True) == (True, None)
+    # A folder rule never matches a file of that name
+    assert rules.match("scratch.tif", False) == (True, None)
+
+
+@pytest.mark.parametrize("pattern, path, excluded", [
+    ("*_old.tif", "a/b/x_old.tif", True),
+    ("*_old.tif", "a/b/x_new.tif", False),
+    ("/a/*.tif", "a/x.tif", True),
+    ("/a/*.tif", "a/b/x.tif", False),
+    ("/a/**/x.tif", "a/b/c/x.tif", True),
+    ("TM?_HV.tif", "TM1_HV.tif", True),
+    ("TM?_HV.tif", "TM10_HV.tif", False),
+    ("TM[!1]_HV.tif", "TM1_HV.tif", False),
+    ("TM[!1]_HV.tif", "TM2_HV.tif", True),
+    (r"re:.*_v\d+\.tif", "a/x_v2.tif", True),
+])
+def test_exclude_patterns(pattern, path, excluded):
+    keep, rule = WalkRules(TIFF, exclude=[(pattern, "global")]).match(path, False)
+    assert keep is not excluded
+    assert (rule == f"exclude {pattern} (global)") is excluded
+
+
+def test_include_overrides_exclude_but_not_the_file_filter():
+    rules = WalkRules(TIFF, include=[("keep/*", "global")], exclude=[("keep/", "global"), ("*.tif", "global")])
+    assert rules.match("keep", True) == (True, "include keep/* (global)")
+    assert rules.match("keep/a.tif", False) == (True, "include keep/* (global)")
+    assert rules.match("keep/a.txt", False)[0] is False
+    assert rules.match("other/a.tif", False) == (False, "exclude *.tif (global)")
+
+
+def test_collection_rules_come_before_global_ones():
+    config = {
+        "exclude": ["*.tif"],
+        "collections": {"specimen_labels/ISAM/Mam": {"exclude": ["TM*"]}},
+    }
+    rules = collection_walk_rules(config, "specimen_labels/ISAM/Mam", TIFF)
+    assert rules.match("TM1.tif", False) == (False, "exclude TM* (specimen_labels/ISAM/Mam)")
+    assert rules.match("X1.tif", False) == (False, "exclude *.tif (global)")
+    other = collection_walk_rules(config, "specimen_labels/ISAM/Bird", TIFF)
+    assert other.match("TM1.tif", False) == (False, "exclude *.tif (global)")
+
+
+def test_invalid_regex_is_ignored_with_a_warning(monkeypatch):
+    log = ScanWarningLog()
+    monkeypatch.setattr(damsg_core, "scan_warnings", log)
+    rules = WalkRules(TIFF, exclude=[("re:(", "global"), ("*_old.tif", "global")])
+    assert len(log) == 1
+    assert rules.match("x_old.tif", False)[0] is False
+    assert rules.match("x.tif", False) == (True, None)
+
+
+def test_wanted_checks_every_folder_on_the_way():
+    rules = WalkRules(TIFF, exclude=[("scratch/", "global")])
+    assert rules.wanted("a/b/x.tif")
+    assert not rules.wanted("a/scratch/b/x.tif")
+    assert not rules.wanted("a/@eaDir/x.tif")
+    assert not rules.wanted("a/b/x.txt")
+
+
+def test_signature_changes_with_the_rules():
+    assert WalkRules(TIFF).signature == WalkRules(TIFF).signature
+    assert WalkRules(TIFF).signature != WalkRules(TIFF, exclude=[("x/", "global")]).signature
+    assert WalkRules(TIFF).signature != WalkRules((".tif",)).signature